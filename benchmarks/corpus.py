@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Synthetic .strings files for the benchmarks.
+
+Each kind of corpus stresses a different part of the reader and writer:
+
+  ascii      plain English keys and translations
+  cjk        Chinese and Japanese translations
+  escapes    strings full of quotes, backslashes, control and \\U escapes
+  comments   long block comments and runs of // comments before each entry
+  multiline  keys and translations with raw line breaks in them
+
+Run with:  python benchmarks/corpus.py KIND COUNT [ENCODING] > out.strings
+"""
+from __future__ import unicode_literals, print_function
+import random
+import sys
+
+KINDS = ('ascii', 'cjk', 'escapes', 'comments', 'multiline')
+
+WORDS = ['Settings', 'window', 'Open', 'file', 'the', 'Save', 'changes',
+         'before', 'closing', 'Delete', 'selected', 'items', 'account',
+         'Cancel', 'download', 'network', 'unavailable', 'Try', 'again']
+
+CJK = ['設定', 'ウィンドウ', '開く', 'ファイル', '保存', '変更', '閉じる',
+       '删除', '选定', '项目', '帐户', '取消', '下载', '网络', '不可用',
+       '再试一次', '확인', '취소']
+
+ESCAPES = ['\\"', '\\\\', '\\n', '\\t', '\\r', '\\u2026', '\\U0001F600',
+           '\\101', '\\x41']
+
+def _words(rng, words, lo, hi, sep=' '):
+    return sep.join(rng.choice(words) for _ in range(rng.randint(lo, hi)))
+
+def _entry(rng, kind, n):
+    key = '%s %d' % (_words(rng, WORDS, 1, 4), n)
+    if kind == 'cjk':
+        return ('/* %s */\n"%s" = "%s";\n'
+                % (_words(rng, WORDS, 2, 6), key, _words(rng, CJK, 1, 6, '')))
+    elif kind == 'escapes':
+        target = ''.join(rng.choice(WORDS) + rng.choice(ESCAPES)
+                         for _ in range(rng.randint(1, 5)))
+        return '"%s\\t%s" = "%s";\n' % (key, rng.choice(ESCAPES), target)
+    elif kind == 'comments':
+        lines = ['// %s' % _words(rng, WORDS, 3, 10)
+                 for _ in range(rng.randint(1, 3))]
+        block = '\n   '.join(_words(rng, WORDS, 5, 12)
+                              for _ in range(rng.randint(1, 4)))
+        return ('/* %s */\n%s\n"%s" = "%s";\n'
+                % (block, '\n'.join(lines), key, _words(rng, WORDS, 1, 6)))
+    elif kind == 'multiline':
+        return ('"%s\n%s" = "%s\n%s\\\n%s";\n'
+                % (key, _words(rng, WORDS, 1, 3), _words(rng, WORDS, 1, 4),
+                   _words(rng, WORDS, 1, 4), _words(rng, WORDS, 1, 4)))
+    return ('/* %s */\n"%s" = "%s";\n'
+            % (_words(rng, WORDS, 2, 6), key, _words(rng, WORDS, 1, 8)))
+
+# Returns the text of a .strings file holding count entries of the given kind
+def make_corpus(kind, count, seed=0):
+    if kind not in KINDS:
+        raise ValueError('Unknown corpus kind %r' % kind)
+    rng = random.Random(seed)
+    return '\n'.join(_entry(rng, kind, n) for n in range(count))
+
+# Returns the corpus encoded as it would be on disk, with a BOM for UTF-16
+def make_corpus_bytes(kind, count, encoding='utf_8', seed=0):
+    return make_corpus(kind, count, seed).encode(encoding)
+
+def main(argv):
+    if len(argv) < 3:
+        print(__doc__.strip(), file=sys.stderr)
+        return 1
+    encoding = argv[3] if len(argv) > 3 else 'utf_8'
+    data = make_corpus_bytes(argv[1], int(argv[2]), encoding)
+    out = getattr(sys.stdout, 'buffer', sys.stdout)
+    out.write(data)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -1 +1,18 @@
-from .store import StringTable, LocalizedString
+__version__ = '0.2.0'
+
+from .store import (StringTable, LocalizedString, ENGINES, iterparse,
+                    ParseError)
+from .tree import load_tree, find_strings_files, LoadedTree
+from .cache import ParseCache
+from .lazy import LazyStringTable
+from .compact import CompactStringTable
+from .catalog import StringCatalog
+from .stats import ParseStats
+from .shared import ConcurrentStringTable
+from .watch import WatchedStringTable
+from .formats import format_signature
+from .recover import Diagnostic
+
+import sys
+if sys.version_info >= (3, 6):
+    from .aio import aiterparse, aread_many
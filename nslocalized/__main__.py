@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import sys
+
+from .cli import main
+
+sys.exit(main())
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import asyncio
+import io
+from itertools import islice
+
+import six
+
+from .store import (StringTable, ENGINES, _parse_buffer, _buffer_types,
+                    _CHUNK_SIZE)
+
+# asyncio versions of StringTable.read() and write().  Files are read and
+# written in the event loop's default executor, and the parser runs in the
+# coroutine, but gives up control after every _BATCH_SIZE entries so that it
+# doesn't hold up the other tasks on the loop for long.
+
+_BATCH_SIZE = 256
+
+# Returns the loop running the current coroutine; get_event_loop() does the
+# same inside a coroutine, but is deprecated for that since Python 3.10, and
+# get_running_loop() only arrived in 3.7
+try:
+    _running_loop = asyncio.get_running_loop
+except AttributeError:
+    _running_loop = asyncio.get_event_loop
+
+def _read_file(name):
+    with io.open(name, 'rb') as f:
+        return f.read()
+
+async def _read_data(file_or_name):
+    if isinstance(file_or_name, _buffer_types):
+        return file_or_name
+    loop = _running_loop()
+    if isinstance(file_or_name, six.string_types):
+        return await loop.run_in_executor(None, _read_file, file_or_name)
+    return await loop.run_in_executor(None, file_or_name.read)
+
+# Yields lists of up to _BATCH_SIZE parsed items, letting other tasks run
+# between them
+async def _batches(file_or_name, process_escapes, engine, positions,
+                   encoding):
+    data = await _read_data(file_or_name)
+    items = _parse_buffer(data, process_escapes, engine, positions,
+                          _CHUNK_SIZE, encoding)
+    try:
+        while True:
+            batch = list(islice(items, _BATCH_SIZE))
+            if batch:
+                yield batch
+            if len(batch) < _BATCH_SIZE:
+                break
+            await asyncio.sleep(0)
+    finally:
+        items.close()
+
+# An asynchronous version of iterparse(), for use with "async for"
+async def aiterparse(file_or_name, process_escapes=True, engine='regex',
+                     positions=False, encoding=None):
+    if engine not in ENGINES:
+        raise ValueError('Unknown parser engine %r' % engine)
+    async for batch in _batches(file_or_name, process_escapes, engine,
+                                positions, encoding):
+        for item in batch:
+            yield item
+
+async def aread(st, file_or_name, process_escapes=True, engine='regex',
+                encoding=None):
+    async for batch in _batches(file_or_name, process_escapes, engine,
+                                False, encoding):
+        st.update_many(batch)
+    return st
+
+async def awrite(st, file_or_name, encoding='utf_16', escape_strings=True):
+    loop = _running_loop()
+    if isinstance(file_or_name, six.string_types):
+        f = await loop.run_in_executor(None, io.open, file_or_name, 'wb')
+    else:
+        f = file_or_name
+    try:
+        # Formatting each block takes a bounded amount of time, and writing
+        # it gives other tasks a chance to run
+        for block in st.write_iter(encoding, escape_strings):
+            await loop.run_in_executor(None, f.write, block)
+    finally:
+        if f is not file_or_name:
+            await loop.run_in_executor(None, f.close)
+
+# Reads many files concurrently, with at most limit of them in progress at
+# a time, returning a list of StringTable objects in the same order as
+# files_or_names.  If return_exceptions is set, files that fail to load
+# give the exception instead of it being raised, as for asyncio.gather().
+async def aread_many(files_or_names, limit=8, process_escapes=True,
+                     engine='regex', return_exceptions=False, encoding=None):
+    if engine not in ENGINES:
+        raise ValueError('Unknown parser engine %r' % engine)
+    semaphore = asyncio.Semaphore(limit)
+
+    async def read_one(file_or_name):
+        async with semaphore:
+            return await aread(StringTable(), file_or_name, process_escapes,
+                               engine, encoding)
+
+    return await asyncio.gather(*[read_one(f) for f in files_or_names],
+                                return_exceptions=return_exceptions)
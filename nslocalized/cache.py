@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import hashlib
+import io
+import marshal
+import mmap
+import os
+import sys
+
+from . import __version__
+from .store import StringTable, LocalizedString, _iterparse, _read_data
+
+# Bump this if the format of the cache files, or the parser's output, changes
+_CACHE_FORMAT = 1
+
+_replace = getattr(os, 'replace', os.rename)
+
+# A directory of previously parsed string tables, keyed by a hash of the
+# file contents, the process_escapes flag, the encoding (if one was given)
+# and the library version.  Once the files in the directory add up to more
+# than max_size bytes, the least recently used ones are deleted.
+#
+# Use it by passing it to StringTable.read(), e.g.
+#
+#   cache = ParseCache('/path/to/cache')
+#   st = StringTable.read('/path/to/Localizable.strings', cache=cache)
+class ParseCache(object):
+    def __init__(self, directory, max_size=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+        self._size = None
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+
+    def _path(self, data, process_escapes, encoding=None):
+        h = hashlib.sha1()
+        h.update(('nslocalized %s/%d/%d.%d/%d/%d;'
+                  % (__version__, _CACHE_FORMAT, sys.version_info[0],
+                     sys.version_info[1], marshal.version,
+                     bool(process_escapes))).encode('ascii'))
+        if encoding is not None:
+            h.update(('encoding=%s;' % encoding).encode('ascii'))
+        h.update(data)
+        return os.path.join(self.directory, h.hexdigest() + '.cache')
+
+    # Returns the parsed table as a tuple of three lists,
+    #
+    #   (sources, targets, comments)
+    #
+    # or None if the data isn't in the cache.
+    def get(self, data, process_escapes=True, encoding=None):
+        path = self._path(data, process_escapes, encoding)
+        try:
+            with io.open(path, 'rb') as f:
+                columns = marshal.loads(f.read())
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            return None
+        if not isinstance(columns, tuple) or len(columns) != 3:
+            return None
+
+        # Record the access for LRU eviction
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+        return columns
+
+    # Stores a parsed table; returns False if it couldn't be written (e.g.
+    # because the directory is read-only or the disk is full), in which case
+    # the cache is simply left as it was
+    def put(self, data, process_escapes, columns, encoding=None):
+        path = self._path(data, process_escapes, encoding)
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        blob = marshal.dumps(tuple(list(column) for column in columns))
+        try:
+            with io.open(tmp_path, 'wb') as f:
+                f.write(blob)
+            _replace(tmp_path, path)
+        except (IOError, OSError):
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            return False
+
+        # Only look at the whole directory when our running total says we
+        # might have gone over max_size; files written by other processes
+        # are picked up the next time we do
+        if self._size is None:
+            self._size = self._scan()[1]
+        else:
+            self._size += len(blob)
+        if self._size > self.max_size:
+            try:
+                self.evict()
+            except OSError:
+                pass
+        return True
+
+    def _scan(self):
+        files = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith('.cache'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+        return files, total
+
+    # Deletes least recently used entries until the cache fits in max_size
+    def evict(self):
+        files, total = self._scan()
+        self._size = total
+        if total <= self.max_size:
+            return
+
+        files.sort()
+        for mtime, size, path in files:
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_size:
+                break
+        self._size = total
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.cache'):
+                os.unlink(os.path.join(self.directory, name))
+        self._size = 0
+
+    # Used by StringTable.read(); reads the strings into the table st
+    def read_into(self, st, file_or_name, process_escapes=True,
+                  engine='regex', encoding=None, use_mmap=False):
+        data = _read_data(file_or_name, use_mmap)
+        try:
+            columns = self.get(data, process_escapes, encoding)
+            if columns is None:
+                # Wrap the data, since _iterparse() would take a Python 2
+                # str for a file name
+                parsed = StringTable()
+                for ls in _iterparse(memoryview(data), process_escapes,
+                                     engine, False, False, None, encoding):
+                    parsed.store(ls)
+                values = parsed.strings.values()
+                columns = ([ls.source for ls in values],
+                           [ls.target for ls in values],
+                           [ls.comment for ls in values])
+                self.put(data, process_escapes, columns, encoding)
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+        # Strings merge in the same way whether we store them one at a time
+        # as they're parsed, or store the already merged results
+        if not st.strings:
+            st.strings.update(zip(columns[0], map(LocalizedString, *columns)))
+        else:
+            for ls in map(LocalizedString, *columns):
+                st.store(ls)
+
+        return st
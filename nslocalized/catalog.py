@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from array import array
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+import six
+
+from .store import StringTable, LocalizedString
+
+_NO_COMMENT = -1
+
+# Holds the string tables for many locales in columns.  Each key is stored
+# once, in keys, and has the same index in every locale; each locale has a
+# list of targets (None where it has no entry for a key) and an array of
+# indices into a pool of comments shared by all of the locales, since most
+# comments are the same in every locale.
+#
+# Use it like this:
+#
+#   catalog = StringCatalog.from_tables({'en': en_table, 'fr': fr_table})
+#   print(catalog['fr']['Cancel'])
+#   print(catalog.missing('fr'))
+class StringCatalog(object):
+    def __init__(self):
+        self.keys = []
+        self._key_index = {}
+        self._comments = []
+        self._comment_index = {}
+        self._targets = {}
+        self._comment_refs = {}
+
+    # Builds a catalog from a mapping of locale to StringTable
+    @classmethod
+    def from_tables(cls, tables):
+        catalog = cls()
+        for locale, st in sorted(six.iteritems(tables)):
+            catalog.add_table(locale, st)
+        return catalog
+
+    # Builds a catalog of one table (e.g. 'Localizable') from the result of
+    # load_tree()
+    @classmethod
+    def from_tree(cls, tree, table='Localizable'):
+        return cls.from_tables(dict((locale, st)
+                                    for (locale, name), st in tree.items()
+                                    if name == table))
+
+    def __contains__(self, locale):
+        return locale in self._targets
+
+    def __getitem__(self, locale):
+        if locale not in self._targets:
+            raise KeyError(locale)
+        return CatalogLocale(self, locale)
+
+    def __len__(self):
+        return len(self._targets)
+
+    def locales(self):
+        return sorted(self._targets)
+
+    def _intern_key(self, key):
+        ndx = self._key_index.get(key)
+        if ndx is None:
+            ndx = self._key_index[key] = len(self.keys)
+            self.keys.append(key)
+        return ndx
+
+    def _intern_comment(self, comment):
+        if comment is None:
+            return _NO_COMMENT
+        ndx = self._comment_index.get(comment)
+        if ndx is None:
+            ndx = self._comment_index[comment] = len(self._comments)
+            self._comments.append(comment)
+        return ndx
+
+    # Adds the entries of a StringTable to the catalog under locale,
+    # replacing any that the locale already has for the same keys.
+    def add_table(self, locale, st):
+        targets = self._targets.setdefault(locale, [])
+        refs = self._comment_refs.setdefault(locale, array(str('l')))
+        intern_key = self._intern_key
+        intern_comment = self._intern_comment
+
+        for key, ls in six.iteritems(st.strings):
+            ndx = intern_key(key)
+            if ndx >= len(targets):
+                targets.extend([None] * (ndx + 1 - len(targets)))
+            if ndx >= len(refs):
+                refs.extend([_NO_COMMENT] * (ndx + 1 - len(refs)))
+            targets[ndx] = ls.target
+            refs[ndx] = intern_comment(ls.comment)
+
+    def remove_locale(self, locale):
+        del self._targets[locale]
+        del self._comment_refs[locale]
+
+    def _column(self, locale):
+        return (self._targets[locale], self._comment_refs[locale])
+
+    def _get(self, locale, key):
+        ndx = self._key_index.get(key)
+        targets = self._targets[locale]
+        if ndx is None or ndx >= len(targets):
+            return None
+        return targets[ndx]
+
+    def _lookup(self, locale, key):
+        ndx = self._key_index.get(key)
+        targets, refs = self._column(locale)
+        if ndx is None or ndx >= len(targets) or targets[ndx] is None:
+            return None
+        ref = refs[ndx]
+        return LocalizedString(self.keys[ndx], targets[ndx],
+                               None if ref == _NO_COMMENT
+                               else self._comments[ref])
+
+    # Returns the keys that locale has entries for, in catalog order
+    def keys_for(self, locale):
+        keys = self.keys
+        return [keys[ndx] for ndx, target in enumerate(self._targets[locale])
+                if target is not None]
+
+    # Returns the keys that are in the catalog (or in the locale base, if
+    # given) but that locale has no entry for, in catalog order
+    def missing(self, locale, base=None):
+        targets = self._targets[locale]
+        count = len(targets)
+        if base is None:
+            candidates = range(len(self.keys))
+        else:
+            candidates = [ndx for ndx, target
+                          in enumerate(self._targets[base])
+                          if target is not None]
+        keys = self.keys
+        return [keys[ndx] for ndx in candidates
+                if ndx >= count or targets[ndx] is None]
+
+    # Returns a StringTable holding the entries for locale
+    def to_table(self, locale):
+        targets, refs = self._column(locale)
+        keys = self.keys
+        comments = self._comments
+        st = StringTable()
+        st.strings = dict((keys[ndx],
+                           LocalizedString(keys[ndx], target,
+                                           None if refs[ndx] == _NO_COMMENT
+                                           else comments[refs[ndx]]))
+                          for ndx, target in enumerate(targets)
+                          if target is not None)
+        return st
+
+# A read-only view of one locale of a StringCatalog; like a StringTable,
+# indexing it gives targets, and lookup() gives LocalizedString objects.
+class CatalogLocale(Mapping):
+    def __init__(self, catalog, locale):
+        self.catalog = catalog
+        self.locale = locale
+
+    def __getitem__(self, key):
+        target = self.catalog._get(self.locale, key)
+        if target is None:
+            raise KeyError(key)
+        return target
+
+    def __contains__(self, key):
+        return self.catalog._get(self.locale, key) is not None
+
+    def __iter__(self):
+        return iter(self.catalog.keys_for(self.locale))
+
+    def __len__(self):
+        return sum(1 for target in self.catalog._targets[self.locale]
+                   if target is not None)
+
+    def lookup(self, key):
+        return self.catalog._lookup(self.locale, key)
+
+    def to_table(self):
+        return self.catalog.to_table(self.locale)
@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import sys
+import timeit
+
+from .store import StringTable, ENGINES
+from .stats import ParseStats
+from .convert import (FORMATS, convert, convert_tree, format_for_path,
+                      _default_extensions)
+
+# The command line interface, installed as the nslocalized script, e.g.
+#
+#   nslocalized check -j 8 /path/to/My.app
+#   nslocalized normalize --encoding utf_8 Base.lproj/Localizable.strings
+#   nslocalized stats --json /path/to/My.app
+#   nslocalized convert --to json en.lproj json/en
+#
+# check, normalize and stats accept any number of files and directories
+# (which are searched for .strings files), and process the files in a pool
+# of worker processes, each of which handles many files.
+
+# Below this many files, we don't bother starting a process pool
+_MIN_PARALLEL_FILES = 16
+
+def _find_files(paths):
+    found = []
+    for path in paths:
+        if not os.path.isdir(path):
+            found.append(path)
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename.endswith('.strings'):
+                    found.append(os.path.join(dirpath, filename))
+    return found
+
+# Calls func(path, *args) for each file, in worker processes if there are
+# enough files, yielding (path, ok, result, seconds) tuples in order.  func
+# must return something that can be pickled; if it raises an exception,
+# result is the exception's message.
+def _run(func, files, args, jobs):
+    if jobs is None:
+        jobs = multiprocessing.cpu_count()
+    try:
+        from concurrent.futures import ProcessPoolExecutor
+    except ImportError:
+        # Python 2 without the futures backport
+        jobs = 1
+    work = [(func, path, args) for path in files]
+    if jobs <= 1 or len(files) < _MIN_PARALLEL_FILES:
+        for item in work:
+            yield _timed(item)
+        return
+    chunksize = max(1, len(work) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for result in executor.map(_timed, work, chunksize=chunksize):
+            yield result
+
+def _timed(item):
+    func, path, args = item
+    start = timeit.default_timer()
+    try:
+        ok, result = True, func(path, *args)
+    except Exception as e:
+        ok, result = False, '%s' % e
+    return (path, ok, result, timeit.default_timer() - start)
+
+def _ms(seconds):
+    return '%.1fms' % (seconds * 1000)
+
+# .. check .....................................................................
+
+# Returns the number of entries and a list of (location, message) pairs;
+# if the file can't be read, it's read again collecting diagnostics, so that
+# every problem with it can be reported at once
+def _check_file(path, engine, formats):
+    problems = []
+    try:
+        st = StringTable.read(path, engine=engine)
+    except ValueError:
+        diagnostics = []
+        st = StringTable.read(path, diagnostics=diagnostics)
+        for d in diagnostics:
+            problems.append((':%d:%d' % (d.line, d.column),
+                             'error: %s' % d.message))
+    if formats:
+        for m in st.check_format_consistency():
+            problems.append(('', 'format mismatch for %r: source has %s, '
+                             'target has %s' % (m.source, m.source_signature,
+                                                m.target_signature)))
+    return (len(st.strings), problems)
+
+def _check(args):
+    failed = 0
+    total = 0
+    for path, ok, result, seconds in _run(_check_file, _find_files(args.paths),
+                                          (args.engine, args.formats),
+                                          args.jobs):
+        total += 1
+        if not ok:
+            failed += 1
+            print('%s: error: %s (%s)' % (path, result, _ms(seconds)))
+            continue
+        count, problems = result
+        if problems:
+            failed += 1
+        for location, problem in problems:
+            print('%s%s: %s' % (path, location, problem))
+        if not args.quiet:
+            print('%s: %s, %d entries (%s)'
+                  % (path, 'FAILED' if problems else 'ok', count,
+                     _ms(seconds)))
+    print('Checked %d files, %d failed' % (total, failed))
+    return 1 if failed else 0
+
+# .. normalize .................................................................
+
+def _normalize_file(path, encoding, dry_run):
+    with io.open(path, 'rb') as f:
+        data = f.read()
+    # On Python 2, data is a str, which read() would take for a file name
+    st = StringTable.read(memoryview(data))
+    normalized = st.dumps_bytes(encoding)
+    if normalized == data:
+        return False
+    if not dry_run:
+        with io.open(path, 'wb') as f:
+            f.write(normalized)
+    return True
+
+def _normalize(args):
+    changed = 0
+    failed = 0
+    total = 0
+    for path, ok, result, seconds in _run(_normalize_file,
+                                          _find_files(args.paths),
+                                          (args.encoding, args.check),
+                                          args.jobs):
+        total += 1
+        if not ok:
+            failed += 1
+            print('%s: error: %s (%s)' % (path, result, _ms(seconds)))
+            continue
+        if result:
+            changed += 1
+        if result or not args.quiet:
+            if not result:
+                state = 'unchanged'
+            elif args.check:
+                state = 'not normalized'
+            else:
+                state = 'normalized'
+            print('%s: %s (%s)' % (path, state, _ms(seconds)))
+    print('%d files, %d %s, %d failed'
+          % (total, changed, 'not normalized' if args.check
+             else 'normalized', failed))
+    if failed or (args.check and changed):
+        return 1
+    return 0
+
+# .. stats .....................................................................
+
+def _stats_file(path, engine):
+    stats = ParseStats()
+    StringTable.read(path, engine=engine, stats=stats)
+    return stats.as_dict()
+
+def _stats(args):
+    failed = 0
+    totals = {'bytes': 0, 'entries': 0, 'time': 0.0}
+    if not args.json:
+        print('%-50s %10s %8s %8s %9s %9s' % ('file', 'bytes', 'entries',
+                                              'escapes', 'parse', 'total'))
+    for path, ok, result, seconds in _run(_stats_file,
+                                          _find_files(args.paths),
+                                          (args.engine,), args.jobs):
+        if not ok:
+            failed += 1
+            if args.json:
+                print(json.dumps({'name': path, 'error': result}))
+            else:
+                print('%s: error: %s' % (path, result))
+            continue
+        totals['bytes'] += result['bytes']
+        totals['entries'] += result['entries']
+        totals['time'] += seconds
+        if args.json:
+            result['wall_time'] = seconds
+            print(json.dumps(result, sort_keys=True))
+        else:
+            print('%-50s %10d %8d %8d %9s %9s'
+                  % (path, result['bytes'], result['entries'],
+                     result['escapes'], _ms(result['times']['parse']),
+                     _ms(seconds)))
+    if not args.json:
+        print('%-50s %10d %8d %8s %9s %9s'
+              % ('total', totals['bytes'], totals['entries'], '', '',
+                 _ms(totals['time'])))
+    return 1 if failed else 0
+
+# .. convert ...................................................................
+
+def _writer_options(args, fmt):
+    options = {}
+    if fmt == 'strings' and args.encoding:
+        options['encoding'] = args.encoding
+    elif fmt == 'xliff':
+        options['source_language'] = args.source_language
+        if args.target_language:
+            options['target_language'] = args.target_language
+    elif fmt == 'json' and args.no_comments:
+        options['comments'] = False
+    return options
+
+def _convert(args):
+    if os.path.isdir(args.src):
+        if args.to_format is None:
+            print('nslocalized: --to is needed to convert a directory',
+                  file=sys.stderr)
+            return 2
+        result = convert_tree(args.src, args.dst, args.to_format,
+                              args.from_format or 'strings', args.jobs,
+                              **_writer_options(args, args.to_format))
+        for path, e in sorted(result.errors.items()):
+            print('%s: %s' % (path, e), file=sys.stderr)
+        print('Converted %d files (%d entries), %d failed'
+              % (len(result), sum(result.values()), len(result.errors)))
+        return 1 if result.errors else 0
+
+    try:
+        to_format = args.to_format or format_for_path(args.dst)
+        if os.path.isdir(args.dst):
+            base = os.path.splitext(os.path.basename(args.src))[0]
+            dst = os.path.join(args.dst, base + _default_extensions[to_format])
+        else:
+            dst = args.dst
+        count = convert(args.src, dst, args.from_format, to_format,
+                        **_writer_options(args, to_format))
+    except (IOError, OSError, ValueError) as e:
+        print('%s: %s' % (args.src, e), file=sys.stderr)
+        return 1
+    print('Converted %d entries' % count)
+    return 0
+
+def _add_common(p, engine=True):
+    p.add_argument('paths', nargs='+', metavar='path',
+                   help='.strings file, or directory to search for them')
+    p.add_argument('-j', '--jobs', type=int, default=None,
+                   help='number of worker processes (default: one per CPU)')
+    if engine:
+        p.add_argument('--engine', choices=ENGINES, default='regex',
+                       help='parser to use (default: regex)')
+
+def make_parser():
+    parser = argparse.ArgumentParser(
+        prog='nslocalized',
+        description='Work with Mac OS X .strings files.')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    p = commands.add_parser(
+        'check', help='check that files can be read',
+        description='Check that .strings files can be read, and optionally '
+        'that their translations use the right format specifiers.')
+    _add_common(p)
+    p.add_argument('--formats', action='store_true',
+                   help='check format specifiers in translations')
+    p.add_argument('-q', '--quiet', action='store_true',
+                   help='only report problems')
+    p.set_defaults(func=_check)
+
+    p = commands.add_parser(
+        'normalize', help='rewrite files in the standard form',
+        description='Rewrite .strings files with their entries sorted, in '
+        'the given encoding.')
+    _add_common(p, engine=False)
+    p.add_argument('--encoding', default='utf_16',
+                   help='encoding to write (default: utf_16)')
+    p.add_argument('--check', action='store_true',
+                   help="don't change anything; fail if any file would "
+                   "be changed")
+    p.add_argument('-q', '--quiet', action='store_true',
+                   help='only report files that are changed')
+    p.set_defaults(func=_normalize)
+
+    p = commands.add_parser(
+        'stats', help='report statistics and timings',
+        description='Report the size, number of entries and time taken '
+        'to read each .strings file.')
+    _add_common(p)
+    p.add_argument('--json', action='store_true',
+                   help='print the figures for each file as a line of JSON')
+    p.set_defaults(func=_stats)
+
+    p = commands.add_parser(
+        'convert', help='convert files to or from .strings',
+        description='Convert a file, or every file in a directory, between '
+        '.strings, JSON, XLIFF and .stringsdict.')
+    p.add_argument('src', help='file or directory to convert')
+    p.add_argument('dst', help='file or directory to write')
+    p.add_argument('--from', dest='from_format', choices=FORMATS,
+                   help='format to read (default: from the extension, or '
+                   'strings for a directory)')
+    p.add_argument('--to', dest='to_format', choices=FORMATS,
+                   help='format to write (default: from the extension)')
+    p.add_argument('-j', '--jobs', type=int, default=None,
+                   help='number of worker processes (default: one per CPU)')
+    p.add_argument('--encoding', help='encoding for .strings files '
+                   '(default: utf_16)')
+    p.add_argument('--source-language', default='en',
+                   help='source language for XLIFF (default: en)')
+    p.add_argument('--target-language', help='target language for XLIFF')
+    p.add_argument('--no-comments', action='store_true',
+                   help='write just the targets to JSON files')
+    p.set_defaults(func=_convert)
+
+    return parser
+
+def main(argv=None):
+    args = make_parser().parse_args(argv)
+    return args.func(args)
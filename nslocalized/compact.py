@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import sys
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
+from .store import StringTable, LocalizedString
+
+if hasattr(sys, 'intern'):
+    def _intern(s):
+        # sys.intern() won't take subclasses of str
+        if type(s) is str:
+            return sys.intern(s)
+        return s
+else:
+    # Python 2 can only intern byte strings
+    def _intern(s):
+        return s
+
+# A mapping that can stand in for StringTable.strings, which doesn't keep a
+# LocalizedString for each entry.  Instead, targets maps each source string
+# to its target, and comments maps each source string that has a comment to
+# the comment.  The keys and comments are interned, so tables for different
+# locales share their keys, and entries with the same comment (such as "No
+# description") share one copy of it.
+#
+# Looking up an entry makes a new LocalizedString for it; changing that
+# doesn't change the table unless it's assigned back.
+class CompactStrings(MutableMapping):
+    def __init__(self):
+        self.targets = {}
+        self.comments = {}
+
+    # Stores an entry as StringTable.store() does, replacing the target of
+    # any existing entry for source and appending comment to its comment
+    def add(self, source, target, comment=None):
+        targets = self.targets
+        if source not in targets:
+            source = _intern(source)
+            if comment is not None:
+                self.comments[source] = _intern(comment)
+        elif comment:
+            cur = self.comments.get(source)
+            if cur:
+                comment = cur + '\n' + comment
+            self.comments[source] = _intern(comment)
+        targets[source] = target
+
+    # Returns (target, comment) for source, or None if there's no entry
+    def entry(self, source):
+        try:
+            return (self.targets[source], self.comments.get(source))
+        except KeyError:
+            return None
+
+    def get(self, source, default=None):
+        try:
+            target = self.targets[source]
+        except KeyError:
+            return default
+        return LocalizedString(source, target, self.comments.get(source))
+
+    def __getitem__(self, source):
+        return LocalizedString(source, self.targets[source],
+                               self.comments.get(source))
+
+    def __setitem__(self, source, ls):
+        targets = self.targets
+        if source not in targets:
+            source = _intern(source)
+        targets[source] = ls.target
+        if ls.comment is None:
+            self.comments.pop(source, None)
+        else:
+            self.comments[source] = _intern(ls.comment)
+
+    def __delitem__(self, source):
+        del self.targets[source]
+        self.comments.pop(source, None)
+
+    def __contains__(self, source):
+        return source in self.targets
+
+    def __iter__(self):
+        return iter(self.targets)
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __repr__(self):
+        return '%r' % dict(self.items())
+
+# A StringTable that keeps its entries in a CompactStrings rather than a
+# dictionary of LocalizedString objects, which uses much less memory when
+# holding many tables at once (for instance, every locale of a large app).
+# It's used just like a StringTable, except that lookup() returns a copy of
+# the entry, so modify the table using store() or item assignment.
+class CompactStringTable(StringTable):
+    def __init__(self, include_empty_comments=False):
+        super(CompactStringTable, self).__init__(include_empty_comments)
+        self.strings = CompactStrings()
+
+    def __getitem__(self, source):
+        strings = self.strings
+        if isinstance(strings, CompactStrings):
+            return strings.targets[source]
+        return strings[source].target
+
+    def store(self, localized_string):
+        strings = self.strings
+        if not isinstance(strings, CompactStrings):
+            return super(CompactStringTable, self).store(localized_string)
+        source = localized_string.source
+        index = self._index
+        if index is not None:
+            old = strings.entry(source)
+        strings.add(source, localized_string.target, localized_string.comment)
+        if index is not None:
+            if index.strings is strings:
+                index.update(source, old)
+            else:
+                self._index = None
@@ -0,0 +1,547 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import codecs
+import io
+import json
+import multiprocessing
+import os
+import plistlib
+import re
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape as _xml_escape, quoteattr
+
+import six
+
+from .store import (LocalizedString, iterparse, _write_entries, _CHUNK_SIZE,
+                    _WRITE_CHUNK)
+
+# Conversion between .strings files and other formats.  Each format has a
+# reader, which yields LocalizedString objects, and a writer, which writes
+# them to a binary file object; apart from .stringsdict, which is always
+# small, both work a block at a time, so memory use doesn't depend on the
+# size of the file.  Entries are written in the order they're read.
+#
+#   strings      .strings files
+#   json         a JSON object mapping each key to either its target, or an
+#                object with "target" and (optionally) "comment" members
+#   xliff        XLIFF 1.2, with one trans-unit per entry whose id is the key
+#   stringsdict  plist .stringsdict files; see _flatten() for how they're
+#                mapped to entries
+FORMATS = ('strings', 'json', 'xliff', 'stringsdict')
+
+_extensions = {
+    '.strings': 'strings',
+    '.json': 'json',
+    '.xliff': 'xliff',
+    '.xlf': 'xliff',
+    '.stringsdict': 'stringsdict',
+}
+
+_default_extensions = {
+    'strings': '.strings',
+    'json': '.json',
+    'xliff': '.xliff',
+    'stringsdict': '.stringsdict',
+}
+
+# Below this many files, convert_tree() doesn't bother starting a process pool
+_MIN_PARALLEL_FILES = 16
+
+# Returns the format of a file, judging by its extension
+def format_for_path(path):
+    fmt = _extensions.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        raise ValueError('Unknown file format for %s' % path)
+    return fmt
+
+def _check_format(fmt):
+    if fmt not in FORMATS:
+        raise ValueError('Unknown format %r' % fmt)
+
+# .. JSON ......................................................................
+
+_json_ws_re = re.compile(r'[ \t\n\r]*')
+_json_string_re = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.S)
+_json_outside_re = re.compile(r'[^"{}]*')
+
+# Decodes the top level object of a JSON file a member at a time, using the
+# json module to decode each key and value
+class _JSONReader(object):
+    def __init__(self, f):
+        self.f = f
+        self.decoder = codecs.getincrementaldecoder('utf_8_sig')()
+        self.raw_decode = json.JSONDecoder().raw_decode
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def _read(self):
+        data = self.f.read(_CHUNK_SIZE)
+        if data:
+            return self.decoder.decode(data)
+        self.eof = True
+        return self.decoder.decode(b'', True)
+
+    def _fill(self):
+        self.text = self.text[self.pos:] + self._read()
+        self.pos = 0
+
+    # Skips whitespace, returning the next character, or '' at the end
+    def peek(self):
+        while True:
+            self.pos = _json_ws_re.match(self.text, self.pos).end(0)
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if self.eof:
+                return ''
+            self._fill()
+
+    def expect(self, ch):
+        if self.peek() != ch:
+            raise ValueError('Bad JSON file')
+        self.pos += 1
+
+    # Looks for the end of the string or object that starts at or before
+    # pos, carrying on from where the last call left off; returns where it
+    # ends, or None if that isn't in text yet
+    def _scan(self, text, pos):
+        end = len(text)
+        while pos < end:
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                    pos += 1
+                    continue
+                pos = _json_string_re.match(text, pos).end(0)
+                if pos == end:
+                    break
+                pos += 1
+                if text[pos - 1] == '\\':
+                    # A backslash at the very end of text
+                    self.escaped = True
+                    continue
+                self.in_string = False
+                if not self.depth:
+                    return pos
+            else:
+                pos = _json_outside_re.match(text, pos).end(0)
+                if pos == end:
+                    break
+                ch = text[pos]
+                pos += 1
+                if ch == '"':
+                    self.in_string = True
+                elif ch == '{':
+                    self.depth += 1
+                else:
+                    self.depth -= 1
+                    if not self.depth:
+                        return pos
+        return None
+
+    # Decodes the value at the current position.  Only strings and objects
+    # are allowed, and neither of those can be cut short and still decode.
+    # If the value isn't all in text, we find where it ends by scanning for
+    # the closing quote or brace (looking at each character once, however
+    # many reads that takes) and then decode it in one go.
+    def value(self):
+        if self.peek() not in ('"', '{'):
+            raise ValueError('Bad JSON file')
+        try:
+            value, self.pos = self.raw_decode(self.text, self.pos)
+            return value
+        except ValueError:
+            pass
+
+        self.in_string = False
+        self.escaped = False
+        self.depth = 0
+        if self._scan(self.text, self.pos) is None:
+            pieces = [self.text[self.pos:]]
+            while True:
+                if self.eof:
+                    raise ValueError('Bad JSON file')
+                chunk = self._read()
+                pieces.append(chunk)
+                if self._scan(chunk, 0) is not None:
+                    break
+            self.text = ''.join(pieces)
+            self.pos = 0
+        try:
+            value, self.pos = self.raw_decode(self.text, self.pos)
+        except ValueError:
+            raise ValueError('Bad JSON file')
+        return value
+
+def _json_entry(key, value):
+    if isinstance(value, six.string_types):
+        return LocalizedString(key, value)
+    if isinstance(value, dict):
+        target = value.get('target')
+        comment = value.get('comment')
+        if isinstance(target, six.string_types) \
+           and (comment is None or isinstance(comment, six.string_types)):
+            return LocalizedString(key, target, comment)
+    raise ValueError('Bad JSON entry for %r' % key)
+
+def read_json(f):
+    reader = _JSONReader(f)
+    reader.expect('{')
+    if reader.peek() == '}':
+        reader.pos += 1
+    else:
+        while True:
+            if reader.peek() != '"':
+                raise ValueError('Bad JSON file')
+            key = reader.value()
+            reader.expect(':')
+            yield _json_entry(key, reader.value())
+            ch = reader.peek()
+            reader.pos += 1
+            if ch == '}':
+                break
+            elif ch != ',':
+                raise ValueError('Bad JSON file')
+    if reader.peek() != '':
+        raise ValueError('Unexpected garbage in input')
+
+# If comments is set, each entry is written as an object with "target" and
+# "comment" members; otherwise just the targets are written.
+def write_json(entries, f, comments=True):
+    quote = json.JSONEncoder(ensure_ascii=False).encode
+    pieces = ['{']
+    size = 0
+    sep = '\n  '
+    for ls in entries:
+        if not comments:
+            value = quote(ls.target)
+        elif ls.comment is None:
+            value = '{"target": %s}' % quote(ls.target)
+        else:
+            value = '{"target": %s, "comment": %s}' % (quote(ls.target),
+                                                       quote(ls.comment))
+        piece = '%s%s: %s' % (sep, quote(ls.source), value)
+        sep = ',\n  '
+        pieces.append(piece)
+        size += len(piece)
+        if size >= _WRITE_CHUNK:
+            f.write(''.join(pieces).encode('utf_8'))
+            pieces = []
+            size = 0
+    pieces.append('\n}\n' if sep != '\n  ' else '}\n')
+    f.write(''.join(pieces).encode('utf_8'))
+
+# .. XLIFF .....................................................................
+
+_XLIFF_NS = 'urn:oasis:names:tc:xliff:document:1.2'
+
+# Characters that can't appear in an XML document at all
+_xml_invalid_re = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+# XML parsers turn '\r' into '\n', so it has to be written as a reference
+_xml_entities = {'\r': '&#13;'}
+
+def _xml_text(s):
+    if _xml_invalid_re.search(s):
+        raise ValueError('Cannot write %r to an XML file' % s)
+    return _xml_escape(s, _xml_entities)
+
+def _xml_attr(s):
+    if _xml_invalid_re.search(s):
+        raise ValueError('Cannot write %r to an XML file' % s)
+    return quoteattr(s, _xml_entities)
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+# Yields an entry for each trans-unit that has a target.  The key is the
+# trans-unit's id, or its source text if it has no id, and the comment is
+# made from its notes.
+def read_xliff(f):
+    stack = []
+    for event, elem in ElementTree.iterparse(f, events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            continue
+        stack.pop()
+        if _local_name(elem.tag) != 'trans-unit':
+            continue
+
+        source = target = None
+        notes = []
+        for child in elem:
+            name = _local_name(child.tag)
+            if name == 'source':
+                source = ''.join(child.itertext())
+            elif name == 'target':
+                target = ''.join(child.itertext())
+            elif name == 'note':
+                notes.append(''.join(child.itertext()))
+        key = elem.get('id', source)
+        if key is not None and target is not None:
+            yield LocalizedString(key, target,
+                                  '\n'.join(notes) if notes else None)
+
+        # Throw away the entries we've finished with
+        if stack:
+            stack[-1].remove(elem)
+
+def write_xliff(entries, f, source_language='en', target_language=None,
+                original='Localizable.strings'):
+    if target_language is None:
+        target = ''
+    else:
+        target = ' target-language=%s' % _xml_attr(target_language)
+    pieces = ['<?xml version="1.0" encoding="UTF-8"?>\n'
+              '<xliff xmlns="%s" version="1.2">\n'
+              '  <file original=%s source-language=%s%s'
+              ' datatype="plaintext">\n'
+              '    <body>\n' % (_XLIFF_NS, _xml_attr(original),
+                                _xml_attr(source_language), target)]
+    size = 0
+    for ls in entries:
+        if ls.comment is None:
+            note = ''
+        else:
+            note = '        <note>%s</note>\n' % _xml_text(ls.comment)
+        piece = ('      <trans-unit id=%s xml:space="preserve">\n'
+                 '        <source>%s</source>\n'
+                 '        <target>%s</target>\n'
+                 '%s'
+                 '      </trans-unit>\n'
+                 % (_xml_attr(ls.source), _xml_text(ls.source),
+                    _xml_text(ls.target), note))
+        pieces.append(piece)
+        size += len(piece)
+        if size >= _WRITE_CHUNK:
+            f.write(''.join(pieces).encode('utf_8'))
+            pieces = []
+            size = 0
+    pieces.append('    </body>\n  </file>\n</xliff>\n')
+    f.write(''.join(pieces).encode('utf_8'))
+
+# .. .stringsdict ..............................................................
+
+# Each key in a .stringsdict file maps to a dictionary, e.g.
+#
+#   "%d files" = {
+#       NSStringLocalizedFormatKey = "%#@files@";
+#       files = {
+#           NSStringFormatSpecTypeKey = NSStringPluralRuleType;
+#           NSStringFormatValueTypeKey = d;
+#           one = "%d file";
+#           other = "%d files";
+#       };
+#   };
+#
+# which becomes an entry for the key itself, whose target is the
+# NSStringLocalizedFormatKey, and one for each of the other strings, whose
+# keys are the path to them joined with STRINGSDICT_SEPARATOR, e.g.
+# "%d files|files|one".
+STRINGSDICT_SEPARATOR = '|'
+_FORMAT_KEY = 'NSStringLocalizedFormatKey'
+
+def _flatten(prefix, value, entries, top=True):
+    for name, item in sorted(value.items()):
+        name = six.text_type(name)
+        if isinstance(item, dict):
+            _flatten(prefix + STRINGSDICT_SEPARATOR + name, item, entries,
+                     False)
+        elif isinstance(item, six.string_types):
+            if top and name == _FORMAT_KEY:
+                entries.append(LocalizedString(prefix,
+                                               six.text_type(item)))
+            else:
+                entries.append(LocalizedString(
+                    prefix + STRINGSDICT_SEPARATOR + name,
+                    six.text_type(item)))
+        else:
+            raise ValueError('Bad .stringsdict entry for %r' % prefix)
+
+def _plist_load(f):
+    if six.PY2:
+        return plistlib.readPlist(f)
+    return plistlib.load(f)
+
+def _plist_dump(value, f):
+    if six.PY2:
+        plistlib.writePlist(value, f)
+    else:
+        plistlib.dump(value, f)
+
+def read_stringsdict(f):
+    plist = _plist_load(f)
+    if not isinstance(plist, dict):
+        raise ValueError('Bad .stringsdict file')
+    entries = []
+    for key, value in sorted(plist.items()):
+        if not isinstance(value, dict):
+            raise ValueError('Bad .stringsdict entry for %r' % key)
+        _flatten(six.text_type(key), value, entries)
+    return iter(entries)
+
+def write_stringsdict(entries, f):
+    entries = list(entries)
+    keys = set(ls.source for ls in entries)
+    plist = {}
+    for ls in entries:
+        parts = ls.source.split(STRINGSDICT_SEPARATOR)
+
+        # Find the longest prefix that is itself a key
+        for n in range(len(parts) - 1, 0, -1):
+            key = STRINGSDICT_SEPARATOR.join(parts[:n])
+            if key in keys:
+                path = [key] + parts[n:]
+                break
+        else:
+            path = [ls.source, _FORMAT_KEY]
+
+        node = plist
+        for name in path[:-1]:
+            node = node.setdefault(name, {})
+            if not isinstance(node, dict):
+                raise ValueError('Conflicting .stringsdict entries for %r'
+                                 % ls.source)
+        if isinstance(node.get(path[-1]), dict):
+            raise ValueError('Conflicting .stringsdict entries for %r'
+                             % ls.source)
+        node[path[-1]] = ls.target
+    _plist_dump(plist, f)
+
+# .. Converting ................................................................
+
+def read_strings(f, process_escapes=True):
+    return iterparse(f, process_escapes)
+
+def write_strings(entries, f, encoding='utf_16', escape_strings=True,
+                  include_empty_comments=False):
+    for block in _write_entries(entries, encoding, escape_strings,
+                                include_empty_comments):
+        f.write(block)
+
+_readers = {
+    'strings': read_strings,
+    'json': read_json,
+    'xliff': read_xliff,
+    'stringsdict': read_stringsdict,
+}
+
+_writers = {
+    'strings': write_strings,
+    'json': write_json,
+    'xliff': write_xliff,
+    'stringsdict': write_stringsdict,
+}
+
+# Yields the entries in a file (or binary file object) in the given format
+def read_entries(file_or_name, fmt):
+    _check_format(fmt)
+    if isinstance(file_or_name, six.string_types):
+        with io.open(file_or_name, 'rb') as f:
+            for ls in _readers[fmt](f):
+                yield ls
+    else:
+        for ls in _readers[fmt](file_or_name):
+            yield ls
+
+# Writes entries to a file (or binary file object) in the given format;
+# options are passed to the format's writer, e.g. encoding for .strings
+# files, or target_language for XLIFF.
+def write_entries(entries, file_or_name, fmt, **options):
+    _check_format(fmt)
+    if isinstance(file_or_name, six.string_types):
+        with io.open(file_or_name, 'wb') as f:
+            _writers[fmt](entries, f, **options)
+    else:
+        _writers[fmt](entries, file_or_name, **options)
+
+# Converts one file to another format, returning the number of entries
+# converted.  If the formats aren't given, they're worked out from the
+# extensions of the filenames.
+def convert(src, dst, from_format=None, to_format=None, **options):
+    if from_format is None:
+        from_format = format_for_path(src)
+    if to_format is None:
+        to_format = format_for_path(dst)
+    _check_format(from_format)
+    _check_format(to_format)
+
+    counter = [0]
+    def counted(entries):
+        for ls in entries:
+            counter[0] += 1
+            yield ls
+    write_entries(counted(read_entries(src, from_format)), dst, to_format,
+                  **options)
+    return counter[0]
+
+# The result of convert_tree(); maps the path of each file written to the
+# number of entries in it.  Files that couldn't be converted are listed in
+# the errors dictionary, which maps their paths to the exceptions raised.
+class ConvertedTree(dict):
+    def __init__(self):
+        super(ConvertedTree, self).__init__()
+        self.errors = {}
+
+def _convert_file(args):
+    src, dst, from_format, to_format, options = args
+    try:
+        parent = os.path.dirname(dst)
+        if parent and not os.path.isdir(parent):
+            try:
+                os.makedirs(parent)
+            except OSError:
+                if not os.path.isdir(parent):
+                    raise
+        return (True, convert(src, dst, from_format, to_format, **options))
+    except Exception as e:
+        return (False, e)
+
+# Converts every file in from_format under src_root to to_format, writing
+# the results to the same relative paths under dst_root (with the new
+# format's extension).  If workers is None, uses one worker process per
+# CPU; if it is 1 or less, or there are only a few files, converts them in
+# this process instead.
+def convert_tree(src_root, dst_root, to_format, from_format='strings',
+                 workers=None, **options):
+    _check_format(from_format)
+    _check_format(to_format)
+
+    jobs = []
+    for dirpath, dirnames, filenames in os.walk(src_root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            base, ext = os.path.splitext(filename)
+            if _extensions.get(ext.lower()) != from_format:
+                continue
+            rel = os.path.relpath(os.path.join(dirpath, base), src_root)
+            jobs.append((os.path.join(dirpath, filename),
+                         os.path.join(dst_root, rel
+                                      + _default_extensions[to_format]),
+                         from_format, to_format, options))
+
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    workers = min(workers, len(jobs))
+
+    try:
+        from concurrent.futures import ProcessPoolExecutor
+    except ImportError:
+        # Python 2 without the futures backport
+        workers = 1
+
+    if workers <= 1 or len(jobs) < _MIN_PARALLEL_FILES:
+        results = [_convert_file(job) for job in jobs]
+    else:
+        chunksize = max(1, len(jobs) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_convert_file, jobs,
+                                        chunksize=chunksize))
+
+    result = ConvertedTree()
+    for job, (ok, value) in zip(jobs, results):
+        if ok:
+            result[job[1]] = value
+        else:
+            result.errors[job[0]] = value
+    return result
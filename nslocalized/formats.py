@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import re
+from collections import namedtuple
+
+# Matches a printf-style format specifier, including the Objective-C %@ and
+# positional arguments (e.g. %1$@, %2$*1$d); %% is matched so that it can be
+# skipped.
+_format_re = re.compile(r'%(?:(\d+)\$)?[-+ #0\']*'
+                        r'(\*(?:\d+\$)?|\d+)?'
+                        r'(?:\.(\*(?:\d+\$)?|\d*))?'
+                        r'(hh|h|ll|l|q|L|z|t|j)?'
+                        r'([diouxXfFeEgGaAcCsSpn@%])')
+
+# Conversions that take the same type of argument are treated as the same
+_conversion_types = {
+    'd': 'd', 'i': 'd', 'o': 'd', 'u': 'd', 'x': 'd', 'X': 'd',
+    'f': 'f', 'F': 'f', 'e': 'f', 'E': 'f', 'g': 'f', 'G': 'f',
+    'a': 'f', 'A': 'f',
+}
+
+# The result of StringTable.check_format_consistency(); the signatures are
+# as returned by format_signature()
+FormatMismatch = namedtuple('FormatMismatch', ['source', 'source_signature',
+                                               'target_signature'])
+
+def _star_position(star, counter):
+    if len(star) > 1:
+        return (int(star[1:-1]), counter)
+    counter += 1
+    return (counter, counter)
+
+# Returns the format specifiers in s as a tuple of (position, type) pairs,
+# sorted by position, where position is the (1-based) number of the
+# argument the specifier uses and type is the argument's type, e.g. 'd' for
+# an integer, 'ld' for a long, '@' for an object.  A width or precision of
+# '*' counts as an integer argument.  If a position is used twice, it
+# appears twice only if the types are different.
+def format_signature(s):
+    if '%' not in s:
+        return ()
+    args = set()
+    counter = 0
+    for m in _format_re.finditer(s):
+        position, width, precision, length, conversion = m.groups()
+        if conversion == '%':
+            continue
+        if width and width[0] == '*':
+            pos, counter = _star_position(width, counter)
+            args.add((pos, 'd'))
+        if precision and precision[0] == '*':
+            pos, counter = _star_position(precision, counter)
+            args.add((pos, 'd'))
+        if position:
+            pos = int(position)
+        else:
+            counter += 1
+            pos = counter
+        args.add((pos, (length or '') + _conversion_types.get(conversion,
+                                                              conversion)))
+    return tuple(sorted(args))
+
+# Signatures of the strings that _cached_signature() has been asked about,
+# so that checking a table again doesn't parse them again.  This is keyed by
+# the string, so changing an entry's source or target can't leave a stale
+# signature behind, and it's emptied when it gets to _MAX_SIGNATURES.
+_signatures = {}
+_MAX_SIGNATURES = 65536
+
+def _cached_signature(s):
+    if '%' not in s:
+        return ()
+    try:
+        return _signatures[s]
+    except KeyError:
+        pass
+    signature = format_signature(s)
+    if len(_signatures) >= _MAX_SIGNATURES:
+        _signatures.clear()
+    _signatures[s] = signature
+    return signature
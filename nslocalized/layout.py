@@ -0,0 +1,596 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import io
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+
+import six
+
+from .store import (StringTable, _parse_regex, _read_text, _format_entry,
+                    _entry_re, _line_comments_re, _ws_re)
+from .utils import escape_string
+
+# Size of the pieces of text fed to the parser when re-parsing after an edit
+_EDIT_CHUNK = 4096
+
+# Number of entries kept together in each _Block
+_BLOCK_SIZE = 256
+
+# A run of consecutive entries.  text holds their text, entry n finishes at
+# ends[n] (relative to the start of the block) and its key is keys[n], and
+# counts maps each key to the number of entries it has in the block.
+class _Block(object):
+    __slots__ = ['text', 'ends', 'keys', 'counts']
+
+    def __init__(self, text, ends, keys):
+        self.text = text
+        self.ends = ends
+        self.keys = keys
+        counts = {}
+        for key in keys:
+            counts[key] = counts.get(key, 0) + 1
+        self.counts = counts
+
+    def start(self, n):
+        if n:
+            return self.ends[n - 1]
+        return 0
+
+    def parse(self, n, process_escapes):
+        return next(_parse_regex((self.text[self.start(n):self.ends[n]],),
+                                 process_escapes))
+
+# Splits text, whose entries end at ends and have the given keys, into
+# blocks of about _BLOCK_SIZE entries; returns the blocks and where each
+# starts in text
+def _make_blocks(text, ends, keys):
+    blocks = []
+    starts = []
+    count = len(keys)
+    nblocks = (count + _BLOCK_SIZE - 1) // _BLOCK_SIZE
+    pos = 0
+    lo = 0
+    for b in range(nblocks):
+        hi = count * (b + 1) // nblocks
+        block_ends = array(str('l'), [end - pos for end in ends[lo:hi]])
+        blocks.append(_Block(text[pos:pos + block_ends[-1]], block_ends,
+                             keys[lo:hi]))
+        starts.append(pos)
+        pos += block_ends[-1]
+        lo = hi
+    return blocks, starts
+
+# Records where each entry of a .strings file is, so that the table read
+# from it can be updated when the file is edited (see StringTable.reread()).
+#
+# The entries are kept in blocks (see _Block), and block b starts at
+# starts[b] in the text; anything after the last entry is in tail.  Because
+# each entry starts where the last one finished, the parser is in the same
+# state at the start of every entry, and each can be parsed on its own.  An
+# edit only rebuilds the blocks it touches and moves the starts of the ones
+# after them, so it takes time in proportion to the size of the edit plus
+# the number of blocks; the whole text is only put back together when it's
+# asked for, as text.
+class Layout(object):
+    def __init__(self, text, encoding, bom_len, process_escapes):
+        self.encoding = encoding
+        self.bom_len = bom_len
+        self.process_escapes = process_escapes
+        self.blocks = []
+        self.starts = array(str('l'))
+        self.tail = text
+        self.counts = {}
+        self._text = text
+
+        # The (target, comment) that the file gives each key, so that we can
+        # tell which entries have been changed since
+        self.values = {}
+
+        # The file that text was read from or last written to, if it was
+        # given by name, and its modification time and size at the time;
+        # see _file_stamp()
+        self.path = None
+        self.stamp = None
+
+        # The encoding passed to read(), if there was one, so that reread()
+        # decodes the file in the same way
+        self.explicit_encoding = None
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = ''.join([block.text for block in self.blocks]
+                                 + [self.tail])
+        return self._text
+
+    def __len__(self):
+        return sum(len(block.keys) for block in self.blocks)
+
+    # Returns (block, n) for entry number entry
+    def _locate(self, entry):
+        for b, block in enumerate(self.blocks):
+            if entry < len(block.keys):
+                return (b, entry)
+            entry -= len(block.keys)
+        raise IndexError('Entry out of range')
+
+    def span(self, entry):
+        b, n = self._locate(entry)
+        block = self.blocks[b]
+        return (self.starts[b] + block.start(n), self.starts[b] + block.ends[n])
+
+    # Parses an entry again
+    def parse(self, entry):
+        b, n = self._locate(entry)
+        return self.blocks[b].parse(n, self.process_escapes)
+
+    # Where the last entry finishes
+    def _entries_end(self):
+        if not self.blocks:
+            return 0
+        return self.starts[-1] + len(self.blocks[-1].text)
+
+    # Returns the keys of all of the entries, and where each finishes
+    def _entries(self):
+        keys = []
+        ends = array(str('l'))
+        for start, block in zip(self.starts, self.blocks):
+            keys.extend(block.keys)
+            ends.extend([start + end for end in block.ends])
+        return keys, ends
+
+    # Replaces all of the entries
+    def _set_entries(self, text, ends, keys):
+        blocks, starts = _make_blocks(text, ends, keys)
+        self.blocks = blocks
+        self.starts = array(str('l'), starts)
+        self.tail = text[ends[-1]:] if keys else text
+        counts = {}
+        for key in keys:
+            counts[key] = counts.get(key, 0) + 1
+        self.counts = counts
+        self._text = text
+
+    # If pos is where an entry starts or finishes (or, at the end of the
+    # entries, where the last one finishes), returns (b, n) such that it is
+    # where entry n of block b starts, or n is the number of entries in b;
+    # otherwise returns None
+    def _boundary(self, pos):
+        if not self.blocks or pos > self._entries_end():
+            return None
+        b = max(bisect_right(self.starts, pos) - 1, 0)
+        rel = pos - self.starts[b]
+        if not rel:
+            return (b, 0)
+        ends = self.blocks[b].ends
+        n = bisect_left(ends, rel)
+        if n < len(ends) and ends[n] == rel:
+            return (b, n + 1)
+        return None
+
+    # Yields the text from pos to stop (or the end) in pieces of at most
+    # _EDIT_CHUNK characters
+    def _pieces(self, pos, stop=None):
+        blocks = self.blocks
+        b = max(bisect_right(self.starts, pos) - 1, 0)
+        while True:
+            if b < len(blocks):
+                start = self.starts[b]
+                text = blocks[b].text
+            else:
+                start = self._entries_end()
+                text = self.tail
+            if stop is not None and start >= stop:
+                return
+            lo = max(pos - start, 0)
+            hi = len(text) if stop is None else min(stop - start, len(text))
+            for n in range(lo, hi, _EDIT_CHUNK):
+                yield text[n:min(n + _EDIT_CHUNK, hi)]
+            if b >= len(blocks):
+                return
+            b += 1
+
+# Returns (path, stamp) for file_or_name if it's the name of a file, where
+# path is its real path and stamp its modification time and size, or
+# (None, None) otherwise.  If the file changes, its stamp will too (unless
+# it keeps the same size and the filesystem's clock doesn't tick).
+def _file_stamp(file_or_name):
+    if not isinstance(file_or_name, six.string_types):
+        return (None, None)
+    try:
+        st = os.stat(file_or_name)
+    except OSError:
+        return (None, None)
+    return (os.path.realpath(file_or_name),
+            (getattr(st, 'st_mtime_ns', st.st_mtime), st.st_size))
+
+# Reads a file into the empty table st, recording its layout
+def read_with_layout(st, file_or_name, process_escapes, use_mmap,
+                     encoding=None):
+    # Stamp the file before reading it, so that any change after this is
+    # noticed
+    path, stamp = _file_stamp(file_or_name)
+    explicit_encoding = encoding
+    text, encoding, bom_len = _read_text(file_or_name, use_mmap, encoding)
+    layout = Layout(text, encoding, bom_len, process_escapes)
+    layout.explicit_encoding = explicit_encoding
+    layout.path = path
+    layout.stamp = stamp
+    parsed = StringTable()
+    keys = []
+    ends = array(str('l'))
+    for ls, start, end in _parse_regex((text,), process_escapes, spans=True):
+        keys.append(ls.source)
+        ends.append(end)
+        parsed.store(ls)
+    layout._set_entries(text, ends, keys)
+    st.strings.update(parsed.strings)
+    layout.values = dict((key, (ls.target, ls.comment))
+                         for key, ls in parsed.strings.items())
+    st.layout = layout
+    return st
+
+# Merges all of the entries for key, in file order
+def _merge_entries(layout, key):
+    merged = StringTable()
+    for block in layout.blocks:
+        if key in block.counts:
+            for n, k in enumerate(block.keys):
+                if k == key:
+                    merged.store(block.parse(n, layout.process_escapes))
+    return merged.strings.get(key)
+
+# Replaces text[start:end] with replacement, re-parsing only the entries
+# that the edit touches, and updates st.strings to match.  Returns the set
+# of keys whose entries were added, removed or re-parsed.
+def apply_edit(st, start, end, replacement):
+    layout = st.layout
+    blocks = layout.blocks
+    starts = layout.starts
+    size = layout._entries_end() + len(layout.tail)
+    if not 0 <= start <= end <= size:
+        raise ValueError('Bad edit range')
+    if not replacement and start == end:
+        return set()
+    delta = len(replacement) - (end - start)
+
+    # The entry containing start is the first that can change.  Parse from
+    # there until an entry finishes at one of the old boundaries after the
+    # edit, after which everything parses as it did before.
+    if blocks:
+        bi = max(bisect_right(starts, start) - 1, 0)
+        first = bisect_right(blocks[bi].ends, start - starts[bi])
+        base = starts[bi] + blocks[bi].start(first)
+    else:
+        bi = first = base = 0
+        blocks = [_Block('', array(str('l')), [])]
+        starts = array(str('l'), [0])
+
+    def new_text():
+        for piece in layout._pieces(base, start):
+            yield piece
+        yield replacement
+        for piece in layout._pieces(end):
+            yield piece
+
+    new_ends = []
+    new_entries = []
+    resync = None
+    for ls, s, e in _parse_regex(new_text(), layout.process_escapes,
+                                 spans=True):
+        new_ends.append(e)
+        new_entries.append(ls)
+        old_end = base + e - delta
+        if old_end >= end:
+            resync = layout._boundary(old_end)
+            if resync is not None:
+                break
+
+    # Work out the text of the new entries (and, if we parsed to the end,
+    # the new tail) and the entries after them in the last block touched
+    mid_len = new_ends[-1] if new_ends else 0
+    if resync is None:
+        bj = len(blocks) - 1
+        last = len(blocks[bj].keys)
+        rest = ''.join(new_text())
+        middle = rest[:mid_len]
+        tail = rest[mid_len:]
+        after = ('', [], [])
+    else:
+        bj, last = resync
+        middle = ''.join(list(layout._pieces(base, start)) + [replacement]
+                         + list(layout._pieces(end, base + mid_len - delta)))
+        tail = layout.tail
+        block = blocks[bj]
+        pos = block.start(last)
+        after = (block.text[pos:], [e - pos for e in block.ends[last:]],
+                 block.keys[last:])
+
+    old_keys = []
+    for b in range(bi, bj + 1):
+        keys = blocks[b].keys
+        old_keys.extend(keys[first if b == bi else 0:
+                             last if b == bj else len(keys)])
+    new_keys = [ls.source for ls in new_entries]
+
+    # Don't leave lots of small blocks behind
+    if first + len(new_keys) + len(after[2]) < _BLOCK_SIZE // 2 \
+       and bj + 1 < len(blocks):
+        bj += 1
+        after = (after[0] + blocks[bj].text,
+                 after[1] + [len(after[0]) + e for e in blocks[bj].ends],
+                 after[2] + blocks[bj].keys)
+
+    # Rebuild the blocks from bi to bj, and move the ones after them
+    block = blocks[bi]
+    pos = block.start(first)
+    text = block.text[:pos] + middle + after[0]
+    ends = (list(block.ends[:first]) + [pos + e for e in new_ends]
+            + [pos + mid_len + e for e in after[1]])
+    new_blocks, new_starts = _make_blocks(text, ends,
+                                          block.keys[:first] + new_keys
+                                          + after[2])
+    region = starts[bi]
+    shift = len(text) - (starts[bj] + len(blocks[bj].text) - region)
+    layout.blocks = blocks[:bi] + new_blocks + blocks[bj + 1:]
+    layout.starts = (starts[:bi]
+                     + array(str('l'), [region + s for s in new_starts])
+                     + array(str('l'), [s + shift for s in starts[bj + 1:]]))
+    layout.tail = tail
+    layout._text = None
+
+    counts = layout.counts
+    touched = {}
+    for key in old_keys:
+        counts[key] -= 1
+        touched[key] = touched.get(key, 0) - 1
+    new_counts = {}
+    for key in new_keys:
+        counts[key] = counts.get(key, 0) + 1
+        touched[key] = touched.get(key, 0) + 1
+        new_counts[key] = new_counts.get(key, 0) + 1
+
+    # Keys that only appear in the re-parsed entries can be merged from
+    # those; ones that also appear elsewhere need all of their entries.
+    merged = StringTable()
+    for ls in new_entries:
+        merged.store(ls)
+    strings = st.strings
+    values = layout.values
+    for key in touched:
+        count = counts[key]
+        if not count:
+            del counts[key]
+            del values[key]
+            strings.pop(key, None)
+            continue
+        elif count == new_counts.get(key, 0):
+            ls = merged.strings[key]
+        else:
+            ls = _merge_entries(layout, key)
+        strings[key] = ls
+        values[key] = (ls.target, ls.comment)
+
+    return set(touched)
+
+def _common_prefix(a, b, limit):
+    pos = 0
+    step = _EDIT_CHUNK
+    while pos < limit and a[pos:pos + step] == b[pos:pos + step]:
+        pos += step
+    if pos >= limit:
+        return limit
+    lo, hi = pos, min(pos + step, limit)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[pos:mid] == b[pos:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def _common_suffix(a, b, limit):
+    la = len(a)
+    lb = len(b)
+    pos = 0
+    step = _EDIT_CHUNK
+    while pos < limit and a[max(la - pos - step, la - limit):la - pos] \
+          == b[max(lb - pos - step, lb - limit):lb - pos]:
+        pos += step
+    if pos >= limit:
+        return limit
+    lo, hi = pos, min(pos + step, limit)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[la - mid:la - pos] == b[lb - mid:lb - pos]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+# Reads the new contents of the file the table was read from, and updates
+# the table from whichever part of it has changed.  If an encoding was given
+# to read(), the file is decoded with that again.
+def reread(st, file_or_name, use_mmap):
+    layout = st.layout
+    path, stamp = _file_stamp(file_or_name)
+    text, encoding, bom_len = _read_text(file_or_name, use_mmap,
+                                         layout.explicit_encoding)
+    old_text = layout.text
+    limit = min(len(old_text), len(text))
+    prefix = _common_prefix(old_text, text, limit)
+    suffix = _common_suffix(old_text, text, limit - prefix)
+    changed = apply_edit(st, prefix, len(old_text) - suffix,
+                         text[prefix:len(text) - suffix])
+    layout.encoding = encoding
+    layout.bom_len = bom_len
+    layout.path = path
+    layout.stamp = stamp
+    return changed
+
+# Returns the new text for an entry whose target or comment has changed.  If
+# only the target has, just the target is replaced; otherwise the whole
+# entry is written again, after the whitespace that preceded it.
+def _rewrite_entry(span, ls, value, single, escape, include_empty_comments):
+    if single and ls.comment == value[1]:
+        m = _line_comments_re.match(span)
+        m = _entry_re.match(span, m.end(0) if m else 0)
+        if m and m.end(0) == len(span):
+            return span[:m.start(5)] + escape(ls.target) + span[m.end(5):]
+    ws = _ws_re.match(span).end(0)
+    return span[:ws] + _format_entry(escape(ls.source), escape(ls.target),
+                                     ls.comment, include_empty_comments)
+
+def _common_length(a, b):
+    n = 0
+    for ca, cb in zip(a, b):
+        if ca != cb:
+            break
+        n += 1
+    return n
+
+# Writes st back out, keeping the text of every entry that hasn't changed
+# since it was read.  Changed entries are rewritten in place (duplicates of
+# them are removed), entries whose keys have been removed from the table are
+# deleted, and new keys are added in sorted order after the last entry (but
+# before any comment that follows it).  If file_or_name is the name of the
+# file the table was read from (or last written to), and its modification
+# time and size show that it hasn't been changed since, only the part of the
+# file from the first change onwards is written; otherwise the whole file is.
+#
+# Returns the set of keys whose entries were written or removed.
+def write_changes(st, file_or_name, escape_strings):
+    layout = st.layout
+    text = layout.text
+    keys, ends = layout._entries()
+    bounds = array(str('l'), [0]) + ends
+    counts = layout.counts
+    values = layout.values
+    strings = st.strings
+    process_escapes = layout.process_escapes
+    include_empty_comments = st.include_empty_comments
+
+    if escape_strings:
+        escape = escape_string
+    else:
+        escape = lambda s: s
+
+    # Find the keys that have been changed or removed, and their entries
+    dirty = set()
+    get = strings.get
+    for key, value in six.iteritems(values):
+        ls = get(key)
+        if ls is None or ls.target != value[0] or ls.comment != value[1]:
+            dirty.add(key)
+    if dirty:
+        positions = [n for n, key in enumerate(keys) if key in dirty]
+    else:
+        positions = []
+
+    pieces = []
+    new_bounds = array(str('l'), [0])
+    new_keys = []
+    new_values = {}
+    changed = set()
+    first_change = None
+    run_start = 0
+    delta = 0
+    copied = 0
+
+    def copy_entries(upto):
+        ends = bounds[copied + 1:upto + 1]
+        if delta:
+            ends = array(str('l'), [end + delta for end in ends])
+        new_bounds.extend(ends)
+        new_keys.extend(keys[copied:upto])
+
+    for n in positions:
+        copy_entries(n)
+        copied = n + 1
+
+        key = keys[n]
+        start = bounds[n]
+        end = bounds[n + 1]
+        ls = strings.get(key)
+        span = text[start:end]
+        if ls is None or key in changed:
+            piece = ''
+        else:
+            piece = _rewrite_entry(span, ls, values[key], counts[key] == 1,
+                                   escape, include_empty_comments)
+            parsed = next(_parse_regex((piece,), process_escapes))
+            new_values[key] = (parsed.target, parsed.comment)
+        changed.add(key)
+
+        if first_change is None:
+            first_change = start + _common_length(span, piece)
+        pieces.append(text[run_start:start])
+        if piece:
+            pieces.append(piece)
+            new_bounds.append(start + delta + len(piece))
+            new_keys.append(key)
+        delta += len(piece) - (end - start)
+        run_start = end
+
+    copy_entries(len(keys))
+    pieces.append(text[run_start:bounds[-1]])
+    tail = text[bounds[-1]:]
+
+    added = sorted(key for key in strings if key not in values)
+    if added:
+        pos = bounds[-1] + delta
+        if first_change is None:
+            first_change = pos
+        for key in added:
+            ls = strings[key]
+            piece = _format_entry(escape(ls.source), escape(ls.target),
+                                  ls.comment, include_empty_comments)
+            if pos:
+                piece = '\n\n' + piece
+            parsed = next(_parse_regex((piece,), process_escapes))
+            new_values[key] = (parsed.target, parsed.comment)
+            pieces.append(piece)
+            pos += len(piece)
+            new_bounds.append(pos)
+            new_keys.append(key)
+            changed.add(key)
+        # Anything after the last entry (such as a trailing comment) stays
+        # after the new ones, on a line of its own
+        if not tail[:1].isspace():
+            tail = '\n' + tail
+    pieces.append(tail)
+
+    new_text = ''.join(pieces)
+    encoding = layout.encoding
+    if layout.bom_len:
+        bom = '\ufeff'.encode(encoding)
+    else:
+        bom = b''
+
+    if isinstance(file_or_name, six.string_types):
+        path, stamp = _file_stamp(file_or_name)
+        if path is not None and path == layout.path \
+           and stamp == layout.stamp \
+           and stamp[1] == len(bom) + len(text.encode(encoding)):
+            if first_change is not None:
+                offset = len(bom) + len(new_text[:first_change]
+                                        .encode(encoding))
+                with io.open(file_or_name, 'r+b') as f:
+                    f.seek(offset)
+                    f.write(new_text[first_change:].encode(encoding))
+                    f.truncate()
+        else:
+            with io.open(file_or_name, 'wb') as f:
+                f.write(bom + new_text.encode(encoding))
+        layout.path, layout.stamp = _file_stamp(file_or_name)
+    else:
+        file_or_name.write(bom + new_text.encode(encoding))
+        layout.path = layout.stamp = None
+
+    for key in changed:
+        values.pop(key, None)
+    values.update(new_values)
+    layout._set_entries(new_text, new_bounds[1:], new_keys)
+
+    return changed
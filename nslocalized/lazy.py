@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import codecs
+import mmap
+import sys
+from array import array
+from collections import OrderedDict
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
+from .store import (StringTable, ENGINES, _iterparse, _parse_regex,
+                    _read_data, _decode_data, alsoconstruct)
+
+# A mapping that can stand in for StringTable.strings, where the entries are
+# only turned into LocalizedString objects when they're asked for.  index
+# maps each source string to a token, and load(source, token) returns the
+# LocalizedString for it.
+#
+# If cache_size is None, loaded entries are kept forever; otherwise only the
+# cache_size most recently used ones are, and the rest are loaded again when
+# needed.  Entries that are assigned (including by StringTable.store()) are
+# always kept.
+#
+# If load() reads from something that needs to be let go of (such as a
+# mapped file), close is called to do that when the mapping is closed.
+class LazyStrings(MutableMapping):
+    def __init__(self, index, load, cache_size=None, close=None):
+        self._index = index
+        self._load = load
+        self._close = close
+        self._objects = {}
+        self.cache_size = cache_size
+        if cache_size is None:
+            self._cache = self._objects
+        else:
+            self._cache = OrderedDict()
+
+    def get(self, source, default=None):
+        ls = self._objects.get(source)
+        if ls is not None:
+            return ls
+
+        cache = self._cache
+        if cache is not self._objects:
+            ls = cache.pop(source, None)
+            if ls is not None:
+                cache[source] = ls
+                return ls
+
+        token = self._index.get(source)
+        if token is None:
+            return default
+        ls = self._load(source, token)
+        cache[source] = ls
+        if self.cache_size is not None and len(cache) > self.cache_size:
+            cache.popitem(last=False)
+        return ls
+
+    def __getitem__(self, source):
+        ls = self.get(source)
+        if ls is None:
+            raise KeyError(source)
+        return ls
+
+    def __setitem__(self, source, ls):
+        if self._cache is not self._objects:
+            self._cache.pop(source, None)
+        self._objects[source] = ls
+
+    def __delitem__(self, source):
+        found = self._objects.pop(source, None) is not None
+        if self._cache is not self._objects:
+            self._cache.pop(source, None)
+        if self._index.pop(source, None) is None and not found:
+            raise KeyError(source)
+
+    def __contains__(self, source):
+        return source in self._index or source in self._objects
+
+    def __iter__(self):
+        for source in self._index:
+            yield source
+        for source in self._objects:
+            if source not in self._index:
+                yield source
+
+    def __len__(self):
+        return len(self._index) + sum(1 for source in self._objects
+                                      if source not in self._index)
+
+    def __repr__(self):
+        return '%r' % dict(self.items())
+
+    # Lets go of whatever load() reads from; entries that haven't been
+    # loaded yet can't be looked up after this
+    def close(self):
+        close = self._close
+        if close is not None:
+            self._close = None
+            close()
+
+# A StringTable that, when it reads a file into an empty table, only builds
+# an index of where each entry is in the file.  Either the decoded text or
+# the file's contents (mapped rather than read, if use_mmap is set) are
+# kept, and each entry is decoded and parsed again the first time it's
+# looked up, so that only the entries that are used ever become
+# LocalizedString objects.
+#
+# If cache_size is given, at most that many of the parsed entries are kept
+# (see LazyStrings).  Modify such tables using store() or item assignment,
+# since changes made directly to LocalizedString objects that are dropped
+# from the cache are lost.
+class LazyStringTable(StringTable):
+    def __init__(self, include_empty_comments=False, cache_size=None):
+        super(LazyStringTable, self).__init__(include_empty_comments)
+        self.cache_size = cache_size
+
+    def store(self, localized_string):
+        source = localized_string.source
+        cur = self.strings.get(source, None)
+        super(LazyStringTable, self).store(localized_string)
+        if cur and isinstance(self.strings, LazyStrings):
+            self.strings[source] = cur
+
+    # As StringTable.read(), except that there are no cache, keep_layout,
+    # stats or diagnostics arguments, and the index is always built by the
+    # regex engine (both engines give the same results).
+    @alsoconstruct
+    def read(self, file_or_name, process_escapes=True, engine='regex',
+             use_mmap=False, encoding=None):
+        if engine not in ENGINES:
+            raise ValueError('Unknown parser engine %r' % engine)
+        self._index = None
+
+        if self.strings:
+            for ls in _iterparse(file_or_name, process_escapes, engine,
+                                 use_mmap, False, None, encoding):
+                self.store(ls)
+            return self
+
+        data = _read_data(file_or_name, use_mmap)
+        if not isinstance(data, (bytes, mmap.mmap)):
+            # Don't hold on to a buffer that the caller might change
+            data = memoryview(data).tobytes()
+        text, encoding, bom_len = _decode_data(data, encoding)
+
+        # Keep whichever of the decoded text and the file's contents takes
+        # less memory (a mapped file takes none).  Each entry runs from the
+        # end of the previous one to the start of the next, so entry n is
+        # kept[bounds[n]:bounds[n + 1]].  If every character takes the same
+        # number of bytes (as when a UTF-8 file is all ASCII), byte offsets
+        # follow from character offsets; otherwise each entry is encoded
+        # again to find its length.
+        keep_text = (not isinstance(data, mmap.mmap)
+                     and sys.getsizeof(text) < len(data))
+        if keep_text:
+            kept, base, width, uniform = text, 0, 1, True
+        else:
+            kept, base = data, bom_len
+            width = len('a'.encode(encoding))
+            uniform = len(data) - bom_len == width * len(text)
+        bounds = array(str('l'), [base])
+        index = {}
+        done = 0
+        for ls, start, end in _parse_regex((text,), process_escapes,
+                                           spans=True):
+            n = len(bounds) - 1
+            if uniform:
+                bounds.append(base + width * end)
+            else:
+                bounds.append(bounds[-1]
+                              + len(text[done:end].encode(encoding)))
+                done = end
+            prev = index.get(ls.source)
+            if prev is None:
+                index[ls.source] = n
+            elif isinstance(prev, list):
+                prev.append(n)
+            else:
+                index[ls.source] = [prev, n]
+        del text, data
+
+        def parse(n):
+            entry = kept[bounds[n]:bounds[n + 1]]
+            if not keep_text:
+                entry = codecs.decode(entry, encoding)
+            return next(_parse_regex((entry,), process_escapes))
+
+        def load(source, token):
+            if not isinstance(token, list):
+                return parse(token)
+            merged = StringTable()
+            for n in token:
+                merged.store(parse(n))
+            return merged.strings[source]
+
+        if isinstance(kept, mmap.mmap):
+            close = kept.close
+        else:
+            close = None
+        self.strings = LazyStrings(index, load, self.cache_size, close)
+        return self
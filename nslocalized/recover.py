@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import re
+from collections import namedtuple
+
+from .store import (ParseError, _parse_regex, _read_text, _newline_re, _ws_re,
+                    _CHUNK_SIZE, EXPECTING_ITEM, EXPECTING_KEY,
+                    EXPECTING_EQUALS, EXPECTING_TARGET, EXPECTING_SEMICOLON)
+
+# A problem found by StringTable.read() with diagnostics; line and column
+# are 1-based, offset is the byte offset in the file (including any BOM),
+# and state describes what the parser was expecting, or is None if that
+# isn't known.
+Diagnostic = namedtuple('Diagnostic', ['line', 'column', 'offset', 'state',
+                                       'message'])
+
+_state_names = {
+    EXPECTING_ITEM: 'expecting an entry',
+    EXPECTING_KEY: 'expecting a key',
+    EXPECTING_EQUALS: 'expecting equals',
+    EXPECTING_TARGET: 'expecting a target',
+    EXPECTING_SEMICOLON: 'expecting a semicolon',
+}
+
+# After a problem, parsing starts again after the next semicolon, or at the
+# next line that starts with a key or a comment, whichever comes first.
+_resync_re = re.compile(r';|^[ \t]*(?="|/[*/])', re.MULTILINE)
+
+def _chunks(text, start):
+    for pos in range(start, len(text), _CHUNK_SIZE):
+        yield text[pos:pos + _CHUNK_SIZE]
+
+# Returns the position at or after start at which to carry on parsing, which
+# must be after the start of the entry that had the problem, or None if
+# there's nowhere
+def _resync(text, start, entry_start, semicolon_only):
+    for m in _resync_re.finditer(text, start):
+        if semicolon_only and m.group(0) != ';':
+            continue
+        if m.end(0) > entry_start:
+            return m.end(0)
+    return None
+
+# Reads a file into st as StringTable.read() does, but rather than stopping
+# at the first problem, records a Diagnostic for it in diagnostics, skips to
+# the next place an entry might start and carries on.  Entries that have
+# problems are left out of the table.
+def read_tolerant(st, file_or_name, process_escapes, use_mmap, diagnostics,
+                  encoding=None):
+    text, encoding, bom_len = _read_text(file_or_name, use_mmap, encoding)
+
+    found = []
+    pos = 0
+    while pos is not None:
+        entry_start = pos
+        try:
+            for ls, start, end in _parse_regex(_chunks(text, pos),
+                                               process_escapes, spans=True):
+                st.store(ls)
+                entry_start = pos + end
+            break
+        except ParseError as e:
+            offset = pos + e.offset
+            state = _state_names.get(e.state)
+            message = '%s' % e
+            if message == 'Bad strings file':
+                if text.startswith('/*', offset):
+                    message = 'Unterminated comment'
+                    state = 'in a comment'
+                elif text.startswith('"', offset):
+                    message = 'Unterminated string'
+                    state = 'in a string'
+                elif offset >= len(text):
+                    message = 'Unexpected end of file'
+            # If something was missing, what's at offset may be the start
+            # of the next entry; otherwise, what's there is the problem
+            if message.startswith('Missing'):
+                pos = _resync(text, offset, entry_start, False)
+            else:
+                pos = _resync(text, offset + 1, entry_start, False)
+        except ValueError as e:
+            # Bad escapes are found after the entry has been parsed, so we
+            # only know which entry they're in
+            offset = _ws_re.match(text, entry_start).end(0)
+            state = None
+            message = '%s' % e
+            pos = _resync(text, offset, entry_start, True)
+        found.append((offset, state, message))
+
+    # Work out the line, column and byte offset of each problem
+    line = 1
+    line_start = 0
+    last = 0
+    byte_offset = bom_len
+    for offset, state, message in found:
+        scan_from = last
+        if last and text[last - 1] == '\r' and text.startswith('\n', last):
+            scan_from += 1
+        for m in _newline_re.finditer(text, scan_from, offset):
+            line += 1
+            line_start = m.end(0)
+        byte_offset += len(text[last:offset].encode(encoding))
+        last = offset
+        diagnostics.append(Diagnostic(line, offset - line_start + 1,
+                                      byte_offset, state, message))
+    return st
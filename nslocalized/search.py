@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from bisect import bisect_left, insort
+
+import six
+
+# Length of the substrings that the inverted index is built from
+_GRAM = 3
+
+def _text(target, comment):
+    if comment:
+        return ('%s\n%s' % (target, comment)).lower()
+    return target.lower()
+
+def _grams(text):
+    return set([text[n:n + _GRAM] for n in range(len(text) - _GRAM + 1)])
+
+# An index of the entries of a StringTable, for StringTable.search() and
+# keys_with_prefix().  The keys are kept in a sorted list, so that the keys
+# with a given prefix can be found with a binary search, and there's an
+# inverted index mapping each three character substring of the lower-cased
+# targets and comments to the set of keys whose entries contain it.  A
+# search only has to look at the entries containing every three character
+# substring of the text being searched for.
+#
+# StringTable builds this the first time it's needed, keeps it up to date
+# when entries are stored or deleted, and builds it again if the number of
+# entries changes some other way.  Keys that have been removed from the
+# table are skipped, but keys added directly without changing the number of
+# entries, and changes made directly to LocalizedString objects, aren't
+# noticed.
+class SearchIndex(object):
+    def __init__(self, strings):
+        self.strings = strings
+        self.keys = sorted(strings)
+        self.grams = {}
+        for key, ls in six.iteritems(strings):
+            self._add(key, _text(ls.target, ls.comment))
+
+    def _add(self, key, text):
+        grams = self.grams
+        for gram in _grams(text):
+            keys = grams.get(gram)
+            if keys is None:
+                grams[gram] = set([key])
+            else:
+                keys.add(key)
+
+    def _remove(self, key, text):
+        grams = self.grams
+        for gram in _grams(text):
+            keys = grams.get(gram)
+            if keys is None:
+                continue
+            keys.discard(key)
+            if not keys:
+                del grams[gram]
+
+    # Called after the entry for key has been stored (or removed); old is
+    # the entry's (target, comment) before that, or None if it's a new key
+    def update(self, key, old):
+        ls = self.strings.get(key)
+        if ls is None:
+            if old is not None:
+                self._remove(key, _text(*old))
+                keys = self.keys
+                ndx = bisect_left(keys, key)
+                if ndx < len(keys) and keys[ndx] == key:
+                    del keys[ndx]
+            return
+        text = _text(ls.target, ls.comment)
+        if old is None:
+            insort(self.keys, key)
+        else:
+            old_text = _text(*old)
+            if old_text == text:
+                return
+            self._remove(key, old_text)
+        self._add(key, text)
+
+    def prefix(self, prefix):
+        keys = self.keys
+        strings = self.strings
+        result = []
+        for ndx in range(bisect_left(keys, prefix), len(keys)):
+            key = keys[ndx]
+            if not key.startswith(prefix):
+                break
+            if key in strings:
+                result.append(key)
+        return result
+
+    def search(self, text, comments=True, ignore_case=True):
+        query = text.lower()
+        if len(query) < _GRAM:
+            candidates = self.keys
+        else:
+            postings = []
+            for gram in _grams(query):
+                keys = self.grams.get(gram)
+                if keys is None:
+                    return []
+                postings.append(keys)
+            postings.sort(key=len)
+            candidates = set(postings[0])
+            for keys in postings[1:]:
+                candidates &= keys
+
+        # The index is case-insensitive, and a match might span the target
+        # and comment, so check each candidate
+        strings = self.strings
+        result = []
+        for key in candidates:
+            ls = strings.get(key)
+            if ls is None:
+                continue
+            if ignore_case:
+                if query in ls.target.lower() \
+                   or (comments and ls.comment
+                       and query in ls.comment.lower()):
+                    result.append(key)
+            elif text in ls.target \
+                 or (comments and ls.comment and text in ls.comment):
+                result.append(key)
+        result.sort()
+        return result
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import threading
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+import six
+
+from .store import StringTable, LocalizedString
+
+# A string table for sharing between threads, where lookups are frequent
+# and updates are rare (e.g. a server that occasionally reloads its
+# translations).
+#
+# The entries are held in a dictionary that is never changed once it has
+# been published; updates build a new dictionary, with new LocalizedString
+# objects for the entries that change, and then publish it by replacing the
+# reference to the old one, which is atomic.  Lookups therefore don't need a
+# lock and always see either all or none of an update.  Updates are
+# serialized by a lock of their own.
+#
+# Because each update copies the dictionary, it's much better to make
+# changes in batches with update_many() or swap() than to call store() for
+# each entry.
+class ConcurrentStringTable(object):
+    def __init__(self, st=None):
+        self._lock = threading.Lock()
+        self._strings = {}
+
+        # Incremented each time an update is published
+        self.version = 0
+        if st is not None:
+            self.swap(st)
+
+    # The currently published entries.  This must not be modified.
+    @property
+    def strings(self):
+        return self._strings
+
+    def __eq__(self, other):
+        return self._strings == other.strings
+
+    def __ne__(self, other):
+        return self._strings != other.strings
+
+    def __getitem__(self, source):
+        return self._strings[source].target
+
+    def __setitem__(self, source, target):
+        self.update_many([LocalizedString(source, target)])
+
+    def __contains__(self, source):
+        return source in self._strings
+
+    def __len__(self):
+        return len(self._strings)
+
+    def __repr__(self):
+        return '%r' % self._strings
+
+    def lookup(self, source):
+        return self._strings.get(source, None)
+
+    # Returns a read-only view of the entries as they are now, which won't
+    # change if the table is updated; use this to make several lookups that
+    # must be consistent with each other.
+    def snapshot(self):
+        return TableSnapshot(self._strings)
+
+    def _publish(self, strings):
+        self._strings = strings
+        self.version += 1
+
+    def store(self, localized_string):
+        self.update_many([localized_string])
+
+    # Stores a batch of LocalizedString objects, or (source, target) or
+    # (source, target, comment) tuples, with the same result as calling
+    # StringTable.store() on each of them in turn, and publishes the result
+    # in one go.
+    def update_many(self, iterable):
+        items = [ls if isinstance(ls, LocalizedString)
+                 else LocalizedString(*ls) for ls in iterable]
+        with self._lock:
+            strings = dict(self._strings)
+            for ls in items:
+                cur = strings.get(ls.source)
+                comment = ls.comment
+                if cur is not None:
+                    if not comment:
+                        comment = cur.comment
+                    elif cur.comment:
+                        comment = cur.comment + '\n' + comment
+                strings[ls.source] = LocalizedString(ls.source, ls.target,
+                                                     comment)
+            self._publish(strings)
+
+    # Removes the entries for the given keys, if there are any
+    def remove_many(self, sources):
+        with self._lock:
+            strings = dict(self._strings)
+            for source in sources:
+                strings.pop(source, None)
+            self._publish(strings)
+
+    # Replaces all of the entries with those of the StringTable st.  st
+    # itself is published, rather than a copy of it, so it must not be
+    # modified afterwards.
+    def swap(self, st):
+        strings = st.strings
+        if not isinstance(strings, dict):
+            strings = dict(strings)
+        with self._lock:
+            self._publish(strings)
+
+    # Reads a .strings file into a new table (the arguments are as for
+    # StringTable.read()), then swaps it in.
+    def reload(self, file_or_name, **kwargs):
+        self.swap(StringTable.read(file_or_name, **kwargs))
+
+    # Returns a copy of the entries as an ordinary StringTable
+    def to_table(self, include_empty_comments=False):
+        st = StringTable(include_empty_comments)
+        st.strings = dict((k, LocalizedString(ls.source, ls.target,
+                                              ls.comment))
+                          for k, ls in six.iteritems(self._strings))
+        return st
+
+# A read-only view of the entries of a ConcurrentStringTable at one moment;
+# indexing it gives targets, and lookup() gives LocalizedString objects.
+class TableSnapshot(Mapping):
+    def __init__(self, strings):
+        self.strings = strings
+
+    def __getitem__(self, source):
+        return self.strings[source].target
+
+    def __contains__(self, source):
+        return source in self.strings
+
+    def __iter__(self):
+        return iter(self.strings)
+
+    def __len__(self):
+        return len(self.strings)
+
+    def lookup(self, source):
+        return self.strings.get(source, None)
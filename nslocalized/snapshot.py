@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import io
+import mmap
+import operator
+import os
+import struct
+import sys
+from array import array
+
+import six
+
+from .store import LocalizedString, _buffer_types
+from .lazy import LazyStrings
+
+# Snapshot files look like this (all integers are little endian):
+#
+#   Header
+#     magic           4s    b'NSLS'
+#     version         H     SNAPSHOT_VERSION
+#     flags           H     FLAG_INCLUDE_EMPTY_COMMENTS
+#     string_count    I
+#     entry_count     I
+#     index_offset    I
+#     entries_offset  I
+#
+#   String pool, starting straight after the header; every distinct source,
+#   target and comment appears once, as
+#     length          I
+#     data            UTF-8
+#
+#   String index, at index_offset; for each string in the pool
+#     offset          I     (of the UTF-8 data)
+#     length          I
+#
+#   Entries, at entries_offset, sorted by source; for each entry
+#     source          I     (index into the string index)
+#     target          I
+#     comment         I     (NO_COMMENT if there isn't one)
+
+SNAPSHOT_MAGIC = b'NSLS'
+SNAPSHOT_VERSION = 1
+
+FLAG_INCLUDE_EMPTY_COMMENTS = 0x0001
+
+NO_COMMENT = 0xffffffff
+
+_header = struct.Struct(str('<4sHHIIII'))
+_length = struct.Struct(str('<I'))
+
+def _u32_array(data, offset, count):
+    values = array(str('I'))
+    if values.itemsize != 4:
+        values = array(str('L'))
+    chunk = data[offset:offset + 4 * count]
+    if six.PY2:
+        values.fromstring(bytes(chunk))
+    else:
+        values.frombytes(chunk)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+def dump_snapshot(st, f):
+    pool = {}
+    strings = []
+    entries = []
+
+    def intern(s):
+        ndx = pool.get(s)
+        if ndx is None:
+            ndx = pool[s] = len(strings)
+            strings.append(s)
+        return ndx
+
+    for source in sorted(st.strings.keys()):
+        ls = st.strings[source]
+        if ls.comment is None:
+            comment = NO_COMMENT
+        else:
+            comment = intern(ls.comment)
+        entries.append((intern(source), intern(ls.target), comment))
+
+    chunks = []
+    index = []
+    offset = _header.size
+    for s in strings:
+        data = s.encode('utf_8')
+        chunks.append(_length.pack(len(data)))
+        chunks.append(data)
+        index.append(offset + 4)
+        index.append(len(data))
+        offset += 4 + len(data)
+
+    index_offset = offset
+    entries_offset = index_offset + 4 * len(index)
+
+    flags = 0
+    if st.include_empty_comments:
+        flags |= FLAG_INCLUDE_EMPTY_COMMENTS
+
+    f.write(_header.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, flags,
+                         len(strings), len(entries), index_offset,
+                         entries_offset))
+    f.write(b''.join(chunks))
+    f.write(struct.pack(str('<%dI' % len(index)), *index))
+    f.write(struct.pack(str('<%dI' % (3 * len(entries))),
+                        *[n for entry in entries for n in entry]))
+
+class _Snapshot(object):
+    def __init__(self, data):
+        if len(data) < _header.size:
+            raise ValueError('Bad snapshot file')
+        (magic, version, self.flags, self.string_count, self.entry_count,
+         index_offset, entries_offset) = _header.unpack_from(data, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError('Not a snapshot file')
+        if version != SNAPSHOT_VERSION:
+            raise ValueError('Unsupported snapshot version %d' % version)
+        if entries_offset + 12 * self.entry_count > len(data) \
+           or index_offset + 8 * self.string_count > entries_offset:
+            raise ValueError('Bad snapshot file')
+
+        self.data = data
+        self.index = _u32_array(data, index_offset, 2 * self.string_count)
+        self.entries = _u32_array(data, entries_offset, 3 * self.entry_count)
+
+        # Make sure that every string is inside the file, and every entry
+        # refers to a string that exists, so that a damaged file can't
+        # give us garbage
+        index = self.index
+        if self.string_count:
+            if min(index[0::2]) < _header.size \
+               or max(map(operator.add, index[0::2], index[1::2])) \
+               > len(data):
+                raise ValueError('Bad snapshot file')
+        entries = self.entries
+        if self.entry_count:
+            comments = [n for n in entries[2::3] if n != NO_COMMENT]
+            if max(max(entries[0::3]), max(entries[1::3]),
+                   max(comments) if comments else 0) >= self.string_count:
+                raise ValueError('Bad snapshot file')
+
+    def string(self, ndx):
+        if ndx == NO_COMMENT:
+            return None
+        if self.data is None:
+            raise ValueError('Snapshot file has been closed')
+        offset = self.index[2 * ndx]
+        return self.data[offset:offset + self.index[2 * ndx + 1]] \
+                   .decode('utf_8')
+
+    def all_strings(self):
+        data = self.data
+        index = self.index
+        return [data[offset:offset + length].decode('utf_8')
+                for offset, length in zip(index[0::2], index[1::2])]
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.data = None
+
+def _open_snapshot(file_or_name, lazy):
+    if isinstance(file_or_name, memoryview):
+        return _Snapshot(file_or_name.tobytes())
+    if isinstance(file_or_name, _buffer_types):
+        return _Snapshot(file_or_name)
+    if isinstance(file_or_name, six.string_types):
+        with io.open(file_or_name, 'rb') as f:
+            if lazy and os.fstat(f.fileno()).st_size:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    return _Snapshot(mapped)
+                except ValueError:
+                    mapped.close()
+                    raise
+            return _Snapshot(f.read())
+    return _Snapshot(file_or_name.read())
+
+def load_snapshot(st, file_or_name, lazy=False):
+    snapshot = _open_snapshot(file_or_name, lazy)
+
+    if snapshot.flags & FLAG_INCLUDE_EMPTY_COMMENTS:
+        st.include_empty_comments = True
+
+    # Only the sources are decoded up front when loading lazily; the file
+    # stays open until the table is closed
+    if lazy and not st.strings:
+        entries = snapshot.entries
+        try:
+            index = dict((snapshot.string(entries[n]), n)
+                         for n in range(0, len(entries), 3))
+        except ValueError:
+            snapshot.close()
+            raise
+
+        def load(source, n):
+            return LocalizedString(source, snapshot.string(entries[n + 1]),
+                                   snapshot.string(entries[n + 2]))
+
+        st.strings = LazyStrings(index, load, close=snapshot.close)
+        return st
+
+    try:
+        strings = snapshot.all_strings()
+        entries = snapshot.entries
+        sources = [strings[n] for n in entries[0::3]]
+        targets = [strings[n] for n in entries[1::3]]
+        comments = [strings[n] if n != NO_COMMENT else None
+                    for n in entries[2::3]]
+    finally:
+        snapshot.close()
+
+    if not st.strings:
+        st.strings.update(zip(sources, map(LocalizedString, sources, targets,
+                                           comments)))
+    else:
+        for ls in map(LocalizedString, sources, targets, comments):
+            st.store(ls)
+
+    return st
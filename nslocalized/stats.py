@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import codecs
+import io
+import mmap
+import timeit
+
+import six
+
+from .store import (_parse_regex, _parse_state, _read_data, _decode_data,
+                    _format_entry, _unescape_re, _unescape_match,
+                    _newline_re, _release)
+from .utils import escape_string, _esc_re
+
+_clock = timeit.default_timer
+
+# Figures collected by StringTable.read() or write() when given a stats
+# object, for finding out why a particular file is slow.  After a read:
+#
+#   bytes            size of the file, including any BOM
+#   chars            number of characters the file decoded to
+#   lines            number of lines
+#   entries          number of entries parsed
+#   duplicates       number of entries whose key had already been seen
+#   comments_merged  number of those whose comment was added to the earlier
+#                    entry's comment
+#   escapes          number of escape sequences in keys and targets
+#
+# and times gives the time in seconds spent on each phase: 'read' (I/O),
+# 'decode', 'parse', 'unescape' and 'store'.  After a write, bytes, chars,
+# entries and escapes describe the output, and the phases are 'sort',
+# 'escape', 'format', 'encode' and 'write'.
+#
+# Instrumented reads and writes process the whole file in one go, so that
+# each phase can be timed on its own; they give the same results as normal
+# ones, but use more memory.  Without a stats object, nothing is counted.
+#
+# If callback is given, it's called with the stats object at the end of
+# each read or write, e.g. to send the figures to a telemetry service.
+class ParseStats(object):
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.reset()
+
+    def reset(self, operation=None, name=None):
+        self.operation = operation
+        self.name = name
+        self.encoding = None
+        self.bytes = 0
+        self.chars = 0
+        self.lines = 0
+        self.entries = 0
+        self.duplicates = 0
+        self.comments_merged = 0
+        self.escapes = 0
+        self.times = {}
+
+    @property
+    def total_time(self):
+        return sum(self.times.values())
+
+    def as_dict(self):
+        return {
+            'operation': self.operation,
+            'name': self.name,
+            'encoding': self.encoding,
+            'bytes': self.bytes,
+            'chars': self.chars,
+            'lines': self.lines,
+            'entries': self.entries,
+            'duplicates': self.duplicates,
+            'comments_merged': self.comments_merged,
+            'escapes': self.escapes,
+            'times': dict(self.times),
+            'total_time': self.total_time,
+        }
+
+    def __repr__(self):
+        phases = ', '.join('%s=%.3fms' % (phase, seconds * 1000)
+                           for phase, seconds in self.times.items())
+        return ('<ParseStats %s %d bytes, %d entries, %d escapes (%s)>'
+                % (self.operation, self.bytes, self.entries, self.escapes,
+                   phases))
+
+    def _finish(self):
+        if self.callback is not None:
+            self.callback(self)
+
+def _name_of(file_or_name):
+    if isinstance(file_or_name, six.string_types):
+        return file_or_name
+    name = getattr(file_or_name, 'name', None)
+    if isinstance(name, six.string_types):
+        return name
+    return None
+
+def _count_lines(text):
+    lines = len(_newline_re.findall(text))
+    if text and not _newline_re.match(text[-1]):
+        lines += 1
+    return lines
+
+# Does the same as StringTable.read() (with no cache or layout), filling in
+# stats as it goes.  The file is parsed without processing escapes, and they
+# are then processed separately, which gives the same result.
+def read_with_stats(st, file_or_name, process_escapes, engine, use_mmap,
+                    stats, encoding=None):
+    stats.reset('read', _name_of(file_or_name))
+    times = stats.times
+
+    t0 = _clock()
+    data = _read_data(file_or_name, use_mmap)
+    try:
+        t1 = _clock()
+        view = memoryview(data)
+        stats.bytes = len(view) * view.itemsize
+        _release(view)
+        text, encoding, bom_len = _decode_data(data, encoding)
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
+    t2 = _clock()
+    times['read'] = t1 - t0
+    times['decode'] = t2 - t1
+    stats.encoding = encoding
+    stats.chars = len(text)
+
+    if engine == 'regex':
+        items = list(_parse_regex((text,), False))
+    else:
+        items = list(_parse_state(text.splitlines(True), False))
+    t3 = _clock()
+    times['parse'] = t3 - t2
+
+    escapes = 0
+    if process_escapes:
+        subn = _unescape_re.subn
+        for ls in items:
+            if '\\' in ls.source:
+                ls.source, count = subn(_unescape_match, ls.source)
+                escapes += count
+            if '\\' in ls.target:
+                ls.target, count = subn(_unescape_match, ls.target)
+                escapes += count
+    else:
+        findall = _unescape_re.findall
+        for ls in items:
+            escapes += len(findall(ls.source)) + len(findall(ls.target))
+    t4 = _clock()
+    times['unescape'] = t4 - t3
+
+    strings = st.strings
+    duplicates = 0
+    merged = 0
+    for ls in items:
+        cur = strings.get(ls.source)
+        if cur is not None:
+            duplicates += 1
+            if ls.comment and cur.comment:
+                merged += 1
+        st.store(ls)
+    times['store'] = _clock() - t4
+
+    stats.lines = _count_lines(text)
+    stats.entries = len(items)
+    stats.duplicates = duplicates
+    stats.comments_merged = merged
+    stats.escapes = escapes
+    stats._finish()
+    return st
+
+# Does the same as StringTable.write(), filling in stats as it goes
+def write_with_stats(st, file_or_name, encoding, escape_strings, stats):
+    stats.reset('write', _name_of(file_or_name))
+    stats.encoding = encoding
+    times = stats.times
+
+    t0 = _clock()
+    keys = sorted(st.strings)
+    t1 = _clock()
+    times['sort'] = t1 - t0
+
+    strings = st.strings
+    entries = [strings[k] for k in keys]
+    sources = [ls.source for ls in entries]
+    targets = [ls.target for ls in entries]
+    escapes = 0
+    if escape_strings:
+        findall = _esc_re.findall
+        for strs in (sources, targets):
+            for n, s in enumerate(strs):
+                escaped = escape_string(s)
+                if escaped != s:
+                    escapes += len(findall(s))
+                    strs[n] = escaped
+    t2 = _clock()
+    times['escape'] = t2 - t1
+
+    pieces = []
+    if encoding in ('utf_16_be', 'utf_16_le'):
+        pieces.append('\ufeff')
+    include_empty_comments = st.include_empty_comments
+    for n, ls in enumerate(entries):
+        piece = _format_entry(sources[n], targets[n], ls.comment,
+                              include_empty_comments) + '\n'
+        pieces.append('\n' + piece if n else piece)
+    text = ''.join(pieces)
+    t3 = _clock()
+    times['format'] = t3 - t2
+
+    data = codecs.encode(text, encoding) if text else b''
+    t4 = _clock()
+    times['encode'] = t4 - t3
+
+    if isinstance(file_or_name, six.string_types):
+        with io.open(file_or_name, 'wb') as f:
+            f.write(data)
+    else:
+        file_or_name.write(data)
+    times['write'] = _clock() - t4
+
+    stats.bytes = len(data)
+    stats.chars = len(text)
+    stats.lines = _count_lines(text)
+    stats.entries = len(entries)
+    stats.escapes = escapes
+    stats._finish()
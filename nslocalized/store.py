@@ -2,11 +2,15 @@
 from __future__ import unicode_literals
 import codecs
 import io
+import mmap
+import os
 import re
+from collections import namedtuple
 
 import six
 
 from .utils import uchr, escape_string
+from .formats import FormatMismatch, _cached_signature
 
 # Read states
 EXPECTING_ITEM = 0
@@ -18,6 +22,15 @@ EXPECTING_TARGET = 5
 IN_TARGET = 6
 EXPECTING_SEMICOLON = 7
 
+# Raised by the regex engine when it finds a problem with a file; offset is
+# the character offset in the decoded text (from where the parser started)
+# at which it was found, and state the parser's state at the time.
+class ParseError(ValueError):
+    def __init__(self, message, offset=None, state=None):
+        super(ParseError, self).__init__(message)
+        self.offset = offset
+        self.state = state
+
 _c_escapes = {
     'a': '\x07',
     'b': '\x08',
@@ -40,6 +53,124 @@ _u8_re = re.compile(r'[A-Fa-f0-9]{8}')
 _equals_re = re.compile(r'\s*=\s*')
 _semi_re = re.compile(r'\s*;\s*')
 
+# Parser engines accepted by StringTable.read()
+ENGINES = ('regex', 'state')
+
+# Regular expressions for the regex engine, which works on the whole
+# document rather than line by line.  The line break characters are the
+# ones str.splitlines() recognises, since that's what the codecs reader
+# uses to split lines for the state machine.
+_lb = '\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029'
+_string = r'"([^"\\]*(?:\\.[^"\\]*)*)"'
+_pair = (r'(?:%(string)s|([A-Za-z][A-Za-z0-9_]*))'
+         r'[^\S%(lb)s]*=\s*%(string)s[^\S%(lb)s]*;'
+         % { 'string': _string, 'lb': _lb })
+# An entry may be preceded by a run of // comments, which are joined to make
+# its comment, and/or a block comment, which replaces them; // comments after
+# the block comment are ignored.  The run of // comments is matched on its
+# own by _line_comments_re, so that if what follows it isn't an entry, the
+# whole run is skipped at once rather than being scanned again for each of
+# its lines.
+_line_comments_re = re.compile(r'\s*((?://[^%(lb)s]*(?![^%(lb)s])\s*)+)'
+                               % { 'lb': _lb })
+_entry_re = re.compile(r'\s*()(?:/\*([^*]*\*+(?:[^/*][^*]*\*+)*)/'
+                       r'(?:\s*//[^%(lb)s]*(?![^%(lb)s]))*\s*)?'
+                       % { 'lb': _lb } + _pair, re.DOTALL)
+_pair_re = re.compile(r'\s*()()' + _pair, re.DOTALL)
+_line_comment_re = re.compile(r'//([^%s]*)' % _lb)
+_ws_re = re.compile(r'\s*')
+_string_re = re.compile(_string, re.DOTALL)
+_line_re = re.compile(r'[^%s]*' % _lb)
+_rx_equals_re = re.compile(r'[^\S%s]*=' % _lb)
+_rx_semi_re = re.compile(r'[^\S%s]*;' % _lb)
+_hspace_re = re.compile(r'[^\S%s]*' % _lb)
+_newline_re = re.compile(r'\r\n|[%s]' % _lb)
+_unescape_re = re.compile(r'\\(?:([^xuU0-7])|x([A-Fa-f0-9]+)'
+                          r'|u([A-Fa-f0-9]{4})|U([A-Fa-f0-9]{8})|([0-7]{1,3})'
+                          r'|.)', re.DOTALL)
+
+def _unescape_match(m):
+    ch = m.group(1)
+    if ch is not None:
+        return _c_escapes.get(ch, ch)
+    hexits = m.group(2) or m.group(3) or m.group(4)
+    if hexits:
+        cp = int(hexits, 16)
+        if cp >= 0xd800 and cp <= 0xdfff or cp > 0x10ffff:
+            raise ValueError('Bad Unicode escape')
+        return uchr(cp)
+    elif m.group(5):
+        return uchr(int(m.group(5), 8))
+    # A \x, \u or \U without enough digits; the state machine does this too
+    return 'x'
+
+def _unescape(s):
+    if '\\' not in s:
+        return s
+    return _unescape_re.sub(_unescape_match, s)
+
+# Size of the blocks that are decoded at a time by iterparse(), and the
+# amount of decoded text the regex engine keeps ahead of its position.
+_CHUNK_SIZE = 65536
+_LOOKAHEAD = 65536
+
+# Number of characters StringTable.write_iter() formats before encoding them
+_WRITE_CHUNK = 65536
+
+# Objects that StringTable.read() treats as file contents rather than names
+if six.PY2:
+    _buffer_types = (bytearray, memoryview)
+else:
+    _buffer_types = (bytes, bytearray, memoryview)
+
+# Number of bytes at the start of a file that _sniff_encoding() looks at
+_SNIFF_SIZE = 512
+
+_boms = ((b'\xef\xbb\xbf', 'utf_8'),
+         (b'\xfe\xff', 'utf_16_be'),
+         (b'\xff\xfe', 'utf_16_le'))
+
+# Given the first _SNIFF_SIZE (or fewer) bytes of a file, returns the
+# encoding and the length of its byte order mark, if any.  Without a BOM, a
+# file is UTF-8 unless it contains NULs, which a UTF-8 .strings file never
+# does; then it's UTF-16 (as written by some older tools), big endian if
+# the NULs (mostly the high bytes of ASCII characters) are at even offsets
+# and little endian if they're at odd ones.
+#
+# If encoding is given, it's used instead, though a BOM for it is still
+# skipped; 'utf_16' picks the endianness as above, and 'utf_8_sig' is the
+# same as 'utf_8'.
+def _sniff_encoding(prefix, encoding=None):
+    if encoding is not None:
+        name = codecs.lookup(encoding).name
+        if name == 'utf-16':
+            encoding, bom_len = _sniff_encoding(prefix)
+            if encoding == 'utf_8':
+                return ('utf_16_le', 0)
+            return (encoding, bom_len)
+        elif name == 'utf-8-sig':
+            encoding = 'utf_8'
+        try:
+            bom = '\ufeff'.encode(encoding)
+        except UnicodeError:
+            return (encoding, 0)
+        return (encoding, len(bom) if prefix.startswith(bom) else 0)
+
+    for bom, encoding in _boms:
+        if prefix.startswith(bom):
+            return (encoding, len(bom))
+    if b'\x00' in prefix:
+        if prefix[0::2].count(b'\x00') > prefix[1::2].count(b'\x00'):
+            return ('utf_16_be', 0)
+        return ('utf_16_le', 0)
+    return ('utf_8', 0)
+
+def _join_comment(body):
+    lines = body.splitlines()
+    if len(lines) == 1:
+        return lines[0].strip()
+    return ' '.join([l.strip() for l in lines]).strip()
+
 class alsoconstruct(object):
     def __init__(self, method):
         self.method = method
@@ -70,12 +201,31 @@ class LocalizedString(object):
         
     def __repr__(self):
         return '%r' % self.target
-    
+
+    # Returns the format signatures of the source and target, as given by
+    # format_signature().  These are cached by string in formats.py, so
+    # they're only worked out once however often they're asked for.
+    def format_signatures(self):
+        return (_cached_signature(self.source),
+                _cached_signature(self.target))
+
+# The result of StringTable.diff(); sets of keys
+TableDiff = namedtuple('TableDiff', ['added', 'removed', 'changed'])
+
+# Policies for StringTable.merge()
+MERGE_POLICIES = ('store', 'replace', 'keep')
+
 class StringTable(object):
     def __init__(self, include_empty_comments=False):
         self.strings = {}
         self.include_empty_comments = include_empty_comments
 
+        # Set by read() if keep_layout is given; see layout.py
+        self.layout = None
+
+        # Built by search() and keys_with_prefix(); see search.py
+        self._index = None
+
     def __eq__(self, other):
         return self.strings == other.strings
 
@@ -88,14 +238,43 @@ class StringTable(object):
     def __setitem__(self, source, target):
         self.store(LocalizedString(source, target))
 
+    def __delitem__(self, source):
+        ls = self.strings[source]
+        del self.strings[source]
+        index = self._index
+        if index is not None:
+            if index.strings is self.strings:
+                index.update(source, (ls.target, ls.comment))
+            else:
+                self._index = None
+
     def __repr__(self):
         return '%r' % self.strings
 
+    # A table loaded lazily from a snapshot, or read by a LazyStringTable
+    # with use_mmap set, keeps the file mapped until this is called (or the
+    # table is garbage collected); entries that haven't been looked up by
+    # then can't be afterwards.  Tables can be used in a with statement,
+    # which calls this at the end.
+    def close(self):
+        close = getattr(self.strings, 'close', None)
+        if close is not None:
+            close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def lookup(self, source):
         return self.strings.get(source, None)
 
     def store(self, localized_string):
+        index = self._index
         cur = self.strings.get(localized_string.source, None)
+        if index is not None:
+            old = None if cur is None else (cur.target, cur.comment)
         if cur:
             if localized_string.comment:
                 if cur.comment:
@@ -105,11 +284,409 @@ class StringTable(object):
             cur.target = localized_string.target
         else:
             self.strings[localized_string.source] = localized_string
+        if index is not None:
+            if index.strings is self.strings:
+                index.update(localized_string.source, old)
+            else:
+                self._index = None
+
+    def _search_index(self):
+        index = self._index
+        if index is None or index.strings is not self.strings \
+           or len(index.keys) != len(self.strings):
+            from .search import SearchIndex
+            self._index = SearchIndex(self.strings)
+        return self._index
+
+    # Returns the keys that start with prefix, in sorted order
+    def keys_with_prefix(self, prefix):
+        return self._search_index().prefix(prefix)
+
+    # Returns the keys whose targets (or, if comments is set, comments)
+    # contain text, in sorted order.
+    #
+    # The first call to this or keys_with_prefix() builds an index, which
+    # store(), __setitem__() and __delitem__() keep up to date, and the
+    # table's other methods cause to be built again next time.  Adding or
+    # removing keys in self.strings directly is only noticed if it changes
+    # the number of keys (checking the keys themselves on every search would
+    # cost as much as not having an index), and changing a LocalizedString's
+    # target or comment directly isn't noticed at all, so use the table's
+    # methods for those.
+    def search(self, text, comments=True, ignore_case=True):
+        return self._search_index().search(text, comments, ignore_case)
+
+    # Stores a batch of LocalizedString objects, or (source, target) or
+    # (source, target, comment) tuples, with the same result as calling
+    # store() on each of them in turn.
+    def update_many(self, iterable):
+        items = [ls if isinstance(ls, LocalizedString)
+                 else LocalizedString(*ls) for ls in iterable]
+        strings = self.strings
+        self._index = None
+
+        # Keys we don't have yet, and that only appear once, can just be
+        # added; the rest need merging in order.
+        fresh = {}
+        rest = []
+        for ls in items:
+            source = ls.source
+            if source in strings or source in fresh:
+                rest.append(ls)
+            else:
+                fresh[source] = ls
+        strings.update(fresh)
+        for ls in rest:
+            self.store(ls)
+
+    # Compares this table with other, returning a TableDiff giving the keys
+    # that are only in other (added), only in this table (removed), and in
+    # both but with a different target or comment (changed).
+    def diff(self, other):
+        mine = self.strings
+        theirs = other.strings
+        my_keys = six.viewkeys(mine)
+        their_keys = six.viewkeys(theirs)
+        changed = set()
+        for key in my_keys & their_keys:
+            a = mine[key]
+            b = theirs[key]
+            if a.target != b.target or a.comment != b.comment:
+                changed.add(key)
+        return TableDiff(set(their_keys - my_keys), set(my_keys - their_keys),
+                         changed)
+
+    # Checks that the target of each entry has the same format specifiers
+    # as its source, returning a list of FormatMismatch tuples for those
+    # that don't, sorted by key.
+    def check_format_consistency(self):
+        mismatches = []
+        for key, ls in six.iteritems(self.strings):
+            if '%' not in ls.source and '%' not in ls.target:
+                continue
+            source_signature, target_signature = ls.format_signatures()
+            if source_signature != target_signature:
+                mismatches.append(FormatMismatch(key, source_signature,
+                                                 target_signature))
+        mismatches.sort()
+        return mismatches
+
+    # Merges the entries of other into this table.  Keys that are only in
+    # other are always added; for keys that are in both, policy says what
+    # to do:
+    #
+    #   'store'    as store(): take other's target and append its comment
+    #   'replace'  take other's target and comment
+    #   'keep'     leave this table's entry alone
+    #
+    # Entries are copied, so the tables don't share LocalizedString objects.
+    def merge(self, other, policy='store'):
+        if policy not in MERGE_POLICIES:
+            raise ValueError('Unknown merge policy %r' % policy)
+
+        strings = self.strings
+        self._index = None
+        theirs = other.strings
+        if policy == 'replace':
+            added = list(six.itervalues(theirs))
+        elif policy == 'keep':
+            added = [theirs[key] for key in
+                     six.viewkeys(theirs) - six.viewkeys(strings)]
+        else:
+            # A LazyStringTable needs telling about changed entries
+            pin = not isinstance(strings, dict)
+            get = strings.get
+            added = []
+            for ls in six.itervalues(theirs):
+                cur = get(ls.source)
+                if cur is None:
+                    added.append(ls)
+                    continue
+                if ls.comment:
+                    if cur.comment:
+                        cur.comment += '\n' + ls.comment
+                    else:
+                        cur.comment = ls.comment
+                cur.target = ls.target
+                if pin:
+                    strings[ls.source] = cur
+
+        strings.update((ls.source, LocalizedString(ls.source, ls.target,
+                                                   ls.comment))
+                       for ls in added)
+        return self
 
     # If called as StringTable.read(), will construct a new object and read
     # the strings into that.  Otherwise reads into the stringtable "self".
+    #
+    # file_or_name may be a filename, a file object, or a bytes-like object
+    # holding the contents of a .strings file.  If use_mmap is set and a
+    # filename is given, the file is memory mapped rather than read.
+    #
+    # cache may be a ParseCache, or the name of a directory to use as one, in
+    # which case previously parsed tables are loaded from there and newly
+    # parsed ones are added to it.
+    #
+    # If keep_layout is set, the table must be empty, and the text of the
+    # file and the position of each entry in it are kept in self.layout, so
+    # that the table can be updated cheaply when the file is edited; see
+    # apply_edit() and reread().
+    #
+    # If stats is a ParseStats object, it's filled in with the number of
+    # entries, escapes and so on, and the time taken by each phase of
+    # reading the file; see stats.py.
+    #
+    # If diagnostics is a list, problems with the file don't raise an
+    # exception; instead, a Diagnostic giving the position of each one is
+    # added to the list, and the rest of the file is read as usual (see
+    # recover.py).  This always uses the regex engine.
+    #
+    # The encoding is normally worked out from the file's BOM, or the lack
+    # of one (see _sniff_encoding()); if encoding is given, the file is
+    # decoded with that instead.
+    @alsoconstruct
+    def read(self, file_or_name, process_escapes=True, engine='regex',
+             use_mmap=False, cache=None, keep_layout=False, stats=None,
+             diagnostics=None, encoding=None):
+        if engine not in ENGINES:
+            raise ValueError('Unknown parser engine %r' % engine)
+        self._index = None
+
+        if diagnostics is not None:
+            if cache is not None or keep_layout or stats is not None:
+                raise ValueError('Cannot collect diagnostics with a cache, '
+                                 'keep_layout or stats')
+            from .recover import read_tolerant
+            return read_tolerant(self, file_or_name, process_escapes,
+                                 use_mmap, diagnostics, encoding)
+
+        if stats is not None:
+            if cache is not None or keep_layout:
+                raise ValueError('Cannot collect stats with a cache or '
+                                 'keep_layout')
+            from .stats import read_with_stats
+            return read_with_stats(self, file_or_name, process_escapes,
+                                   engine, use_mmap, stats, encoding)
+
+        if keep_layout:
+            if cache is not None:
+                raise ValueError('Cannot use a cache with keep_layout')
+            if self.strings:
+                raise ValueError('keep_layout needs an empty table')
+            from .layout import read_with_layout
+            return read_with_layout(self, file_or_name, process_escapes,
+                                    use_mmap, encoding)
+
+        if cache is not None:
+            from .cache import ParseCache
+            if not isinstance(cache, ParseCache):
+                cache = ParseCache(cache)
+            return cache.read_into(self, file_or_name, process_escapes, engine,
+                                   encoding, use_mmap)
+
+        for ls in _iterparse(file_or_name, process_escapes, engine,
+                             use_mmap, False, None, encoding):
+            self.store(ls)
+
+        return self
+
+    # Replaces the characters from start to end of the text the table was
+    # read from with replacement, and updates the entries that the edit
+    # affects.  Only the entries around the edit are parsed again, so this
+    # is much faster than reading the whole file for small edits.  Returns
+    # the set of keys whose entries were changed.
+    def apply_edit(self, start, end, replacement):
+        if self.layout is None:
+            raise ValueError('Table was not read with keep_layout')
+        from .layout import apply_edit
+        self._index = None
+        return apply_edit(self, start, end, replacement)
+
+    # Given the new contents of the file the table was read from (as for
+    # read()), finds the part that has changed and calls apply_edit().
+    def reread(self, file_or_name, use_mmap=False):
+        if self.layout is None:
+            raise ValueError('Table was not read with keep_layout')
+        from .layout import reread
+        self._index = None
+        return reread(self, file_or_name, use_mmap)
+
+    # Writes the table to a file, keeping the layout of the file it was read
+    # from (which must have been read with keep_layout) and only changing
+    # the entries that need to be changed; see layout.write_changes().
+    # The file is written in the encoding it was read in.  Returns the set
+    # of keys whose entries were written or removed.
+    def write_changes(self, file_or_name, escape_strings=True):
+        if self.layout is None:
+            raise ValueError('Table was not read with keep_layout')
+        from .layout import write_changes
+        return write_changes(self, file_or_name, escape_strings)
+
+    # Coroutine versions of read() and write() for use with asyncio, which
+    # do their file I/O in the event loop's executor and let other tasks
+    # run while parsing; see aio.py.  Needs Python 3.6 or later.
     @alsoconstruct
-    def read(self, file_or_name, process_escapes=True):
+    def aread(self, file_or_name, process_escapes=True, engine='regex',
+              encoding=None):
+        if engine not in ENGINES:
+            raise ValueError('Unknown parser engine %r' % engine)
+        from .aio import aread
+        return aread(self, file_or_name, process_escapes, engine, encoding)
+
+    def awrite(self, file_or_name, encoding='utf_16', escape_strings=True):
+        from .aio import awrite
+        return awrite(self, file_or_name, encoding, escape_strings)
+
+    # Writes the table in the binary snapshot format (see snapshot.py), which
+    # loads much faster than a .strings file.
+    def dump_snapshot(self, file_or_name):
+        from .snapshot import dump_snapshot
+        if isinstance(file_or_name, six.string_types):
+            with io.open(file_or_name, 'wb') as f:
+                dump_snapshot(self, f)
+        else:
+            dump_snapshot(self, file_or_name)
+
+    # Like read(), but for files written by dump_snapshot().  If lazy is set
+    # and a filename is given, the file is memory mapped and LocalizedString
+    # objects are only created as they're looked up; see close().
+    @alsoconstruct
+    def load_snapshot(self, file_or_name, lazy=False):
+        from .snapshot import load_snapshot
+        self._index = None
+        return load_snapshot(self, file_or_name, lazy)
+
+    # If stats is a ParseStats object, it's filled in as for read()
+    def write(self, file_or_name, encoding='utf_16', escape_strings=True,
+              stats=None):
+        if stats is not None:
+            from .stats import write_with_stats
+            return write_with_stats(self, file_or_name, encoding,
+                                    escape_strings, stats)
+
+        if isinstance(file_or_name, six.string_types):
+            with io.open(file_or_name, 'wb') as f:
+                self.write(f, encoding, escape_strings)
+            return
+
+        for block in self.write_iter(encoding, escape_strings):
+            file_or_name.write(block)
+
+    # Returns the encoded contents of the table as a single bytes object
+    def dumps_bytes(self, encoding='utf_16', escape_strings=True):
+        return b''.join(self.write_iter(encoding, escape_strings))
+
+    # Yields the encoded contents of the table in blocks of roughly
+    # _WRITE_CHUNK characters, using a single incremental encoder.
+    def write_iter(self, encoding='utf_16', escape_strings=True):
+        keys = self.strings.keys()
+        if not isinstance(keys, list):
+            keys = list(keys)
+        keys.sort()
+
+        strings = self.strings
+        return _write_entries((strings[k] for k in keys), encoding,
+                              escape_strings, self.include_empty_comments)
+
+# Returns the text of a single entry, without a trailing newline; source and
+# target should already be escaped if need be
+def _format_entry(source, target, comment, include_empty_comments):
+    if comment:
+        head = '/* %s */\n' % comment
+    elif include_empty_comments:
+        head = '/* No description */\n'
+    else:
+        head = ''
+    return '%s"%s" = "%s";' % (head, source, target)
+
+# Yields the encoded .strings file holding the given LocalizedString objects,
+# in the order given, in blocks of roughly _WRITE_CHUNK characters.
+def _write_entries(entries, encoding, escape_strings, include_empty_comments):
+    encoder = codecs.getincrementalencoder(encoding)()
+
+    pieces = []
+    size = 0
+
+    # In the two endian specific formats, we need to explicitly write
+    # the BOM.
+    if encoding in ('utf_16_be', 'utf_16_le'):
+        pieces.append('\ufeff')
+
+    if escape_strings:
+        escape = escape_string
+    else:
+        escape = lambda s: s
+
+    first = True
+    for ls in entries:
+        piece = _format_entry(escape(ls.source), escape(ls.target),
+                              ls.comment, include_empty_comments) + '\n'
+        if first:
+            first = False
+        else:
+            piece = '\n' + piece
+
+        pieces.append(piece)
+        size += len(piece)
+        if size >= _WRITE_CHUNK:
+            yield encoder.encode(''.join(pieces))
+            pieces = []
+            size = 0
+
+    # No entries produce an empty file, apart from the BOM in the endian
+    # specific formats
+    if pieces:
+        yield encoder.encode(''.join(pieces), True)
+
+# Yields the LocalizedString objects in a .strings file one at a time, in
+# file order, without building a StringTable.  The arguments are as for
+# StringTable.read().  If positions is set, yields tuples of
+#
+#   (localized_string, line, offset)
+#
+# instead, where line is the (1-based) line number and offset the (0-based)
+# character offset in the decoded text at which the entry's key starts.
+#
+# The input is decoded and parsed in blocks, so memory use doesn't depend on
+# the size of the file.
+def iterparse(file_or_name, process_escapes=True, engine='regex',
+              use_mmap=False, positions=False, encoding=None):
+    if engine not in ENGINES:
+        raise ValueError('Unknown parser engine %r' % engine)
+
+    return _iterparse(file_or_name, process_escapes, engine, use_mmap,
+                      positions, _CHUNK_SIZE, encoding)
+
+# Maps the whole of the open file f, or returns None if it's empty (you
+# can't map an empty file).  On Python 2, mmap objects don't support
+# memoryview, so the file is just read instead.
+def _map_file(f):
+    if not os.fstat(f.fileno()).st_size:
+        return None
+    if six.PY2:
+        return f.read()
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+# If chunk_size is None, the input is decoded in one go
+def _iterparse(file_or_name, process_escapes, engine, use_mmap, positions,
+               chunk_size, encoding=None):
+    if isinstance(file_or_name, _buffer_types):
+        for item in _parse_buffer(file_or_name, process_escapes, engine,
+                                  positions, chunk_size, encoding):
+            yield item
+    elif use_mmap and isinstance(file_or_name, six.string_types):
+        with io.open(file_or_name, 'rb') as f:
+            mapped = _map_file(f)
+        if mapped is None:
+            return
+        try:
+            for item in _parse_buffer(mapped, process_escapes, engine,
+                                      positions, chunk_size, encoding):
+                yield item
+        finally:
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+    else:
         if isinstance(file_or_name, six.string_types):
             buffered = io.open(file_or_name, 'rb')
         elif getattr(file_or_name, 'peek', None):
@@ -118,216 +695,536 @@ class StringTable(object):
             buffered = io.open(file_or_name.fileno(), 'rb')
         else:
             buffered = io.BufferedReader(file_or_name)
-        
-        maybe_bom = buffered.peek(2)[:2]
-
-        if maybe_bom == b'\xfe\xff':
-            encoding = 'utf_16_be'
-            buffered.read(2)
-        elif maybe_bom == b'\xff\xfe':
-            encoding = 'utf_16_le'
-            buffered.read(2)
-        elif maybe_bom == b'\xef\xbb':
-            encoding = 'utf_8'
-            buffered.read(3)
-        else:
-            encoding = 'utf_8'
 
-        reader_factory = codecs.getreader(encoding)
+        try:
+            encoding, bom_len = _sniff_encoding(
+                buffered.peek(_SNIFF_SIZE)[:_SNIFF_SIZE], encoding)
+            buffered.read(bom_len)
+
+            chunks = _decode_stream(buffered, encoding, chunk_size)
+            if engine == 'regex':
+                items = _parse_regex(chunks, process_escapes, positions)
+            else:
+                items = _parse_state(_split_lines(chunks), process_escapes,
+                                     positions)
+
+            for item in items:
+                yield item
+        finally:
+            if isinstance(file_or_name, six.string_types):
+                buffered.close()
+
+# Memory views can only be released (and used in a with statement) on Python
+# 3; on Python 2 the buffer is let go of when the view is garbage collected
+def _release(view):
+    if not six.PY2:
+        view.release()
+
+def _parse_buffer(data, process_escapes, engine, positions, chunk_size,
+                  encoding=None):
+    view = memoryview(data)
+    try:
+        encoding, bom_len = _sniff_encoding(view[:_SNIFF_SIZE].tobytes(),
+                                            encoding)
+        chunks = _decode_view(view, bom_len, encoding, chunk_size)
+        try:
+            if engine == 'regex':
+                items = _parse_regex(chunks, process_escapes, positions)
+            else:
+                items = _parse_state(_split_lines(chunks), process_escapes,
+                                     positions)
+            for item in items:
+                yield item
+        finally:
+            # Make sure the generator lets go of the buffer
+            chunks.close()
+    finally:
+        _release(view)
+
+def _decode_view(view, start, encoding, chunk_size):
+    if chunk_size is None:
+        yield codecs.decode(view[start:], encoding)
+        return
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for pos in range(start, len(view), chunk_size):
+        yield decoder.decode(view[pos:pos + chunk_size])
+    yield decoder.decode(b'', True)
+
+def _decode_stream(stream, encoding, chunk_size):
+    if chunk_size is None:
+        yield codecs.decode(stream.read(), encoding)
+        return
+    decoder = codecs.getincrementaldecoder(encoding)()
+    while True:
+        data = stream.read(chunk_size)
+        if not data:
+            break
+        yield decoder.decode(data)
+    yield decoder.decode(b'', True)
+
+# Returns the contents of a file as a buffer; if it's an mmap, the caller
+# should close it once it has finished with it
+def _read_data(file_or_name, use_mmap=False):
+    if isinstance(file_or_name, _buffer_types):
+        return file_or_name
+    elif isinstance(file_or_name, six.string_types):
+        with io.open(file_or_name, 'rb') as f:
+            data = _map_file(f) if use_mmap else None
+            if data is None:
+                data = f.read()
+            return data
+    return file_or_name.read()
+
+# Decodes a buffer returned by _read_data(), returning
+#
+#   (text, encoding, bom_len)
+def _decode_data(data, encoding=None):
+    view = memoryview(data)
+    try:
+        encoding, bom_len = _sniff_encoding(view[:_SNIFF_SIZE].tobytes(),
+                                            encoding)
+        return (codecs.decode(view[bom_len:], encoding), encoding, bom_len)
+    finally:
+        _release(view)
 
-        reader = reader_factory(buffered)
+# Reads and decodes the whole of a file, returning
+#
+#   (text, encoding, bom_len)
+def _read_text(file_or_name, use_mmap=False, encoding=None):
+    data = _read_data(file_or_name, use_mmap)
+    try:
+        return _decode_data(data, encoding)
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
 
-        state = EXPECTING_ITEM
-        comment = None
-        key = None
-        target = None
-        skip_nl = True
-        chunks = []
+# Turns decoded blocks of text into lines for the state machine
+def _split_lines(chunks):
+    partial = ''
+    for chunk in chunks:
+        lines = (partial + chunk).splitlines(True)
+        if not lines:
+            continue
+        # The last line might be incomplete, or might be a '\r' that has a
+        # '\n' in the next block, so hold it back
+        partial = lines.pop()
+        for line in lines:
+            yield line
+    if partial:
+        yield partial
 
-        def handle_string(m, pos, state, next_state):
-            skip_nl = False
+# Tokenizes the document using regular expressions; the common case of a
+# key/value pair (with or without a comment) is matched in one go by
+# _entry_re.  The text arrives in blocks, and whenever a token might run off
+# the end of the buffered text, more is read before trying again.
+#
+# If spans is set, yields (localized_string, start, end) tuples instead, where
+# text[start:end] is the entry, including any comments and whitespace that
+# precede it; parsing that on its own gives the same LocalizedString.
+def _parse_regex(chunks, process_escapes, positions=False, spans=False):
+    if process_escapes:
+        decode = _unescape
+    else:
+        decode = lambda s: s
+
+    chunks = iter(chunks)
+    text = ''
+    base = 0
+    pos = 0
+    end = 0
+    eof = False
+    more = True
+    line = 1
+    line_pos = 0
+
+    state = EXPECTING_ITEM
+    comment = None
+    key = None
+    target = None
+    key_line = None
+    key_offset = None
+    item_start = 0
+
+    while True:
+        if not eof and (more or end - pos < _LOOKAHEAD):
+            # Discard what we've consumed and read some more text; don't
+            # split '\r\n' if we're counting lines
+            cut = pos
+            if positions:
+                if cut and text[cut - 1] == '\r':
+                    cut -= 1
+                line += len(_newline_re.findall(text, line_pos, cut))
+                line_pos = 0
+            pieces = [text[cut:]]
+            avail = end - pos
+            added = False
+            while avail < _LOOKAHEAD or (more and not added):
+                chunk = next(chunks, None)
+                if chunk is None:
+                    eof = True
+                    break
+                if chunk:
+                    pieces.append(chunk)
+                    avail += len(chunk)
+                    added = True
+            text = ''.join(pieces)
+            base += cut
+            pos -= cut
+            end = len(text)
+            more = False
+
+        if state == EXPECTING_ITEM or state == EXPECTING_KEY:
+            lines = None
+            if state == EXPECTING_ITEM:
+                m = _line_comments_re.match(text, pos)
+                if m:
+                    if not eof and m.end(0) == end:
+                        more = True
+                        continue
+                    lines = m.group(1)
+                    m = _entry_re.match(text, m.end(0))
+                else:
+                    m = _entry_re.match(text, pos)
+            else:
+                m = _pair_re.match(text, pos)
+            if lines and not m:
+                # Not followed by an entry; take the comments and carry on
+                # from after them
+                for body in _line_comment_re.findall(lines):
+                    if comment is None:
+                        comment = body.strip()
+                    else:
+                        comment += ' ' + body.strip()
+                pos = _line_comments_re.match(text, pos).end(0)
+                continue
             if m:
-                chunks.append(line[pos:m.start(0)])
-                if m.group(0) == '"':
-                    state = next_state
-                    pos = m.end(0)
-                    return (state, pos, skip_nl, ''.join(chunks))
-                elif m.group(0) == '\\':
-                    pos = m.end(0)
-                    ch = line[pos]
-                    if not process_escapes:
-                        chunks.append('\\')
-                        chunks.append(ch)
-                        pos += 1
-                    elif pos == end:
-                        skip_nl = True
-                    elif ch in _c_escapes:
-                        chunks.append(_c_escapes[ch])
-                        pos += 1
-                    elif ch in ('x', 'u', 'U'):
-                        pos += 1
-                        if ch == 'x':
-                            hm = _hex_re.match(line, pos)
-                        elif ch == 'u':
-                            hm = _u4_re.match(line, pos)
-                        elif ch == 'U':
-                            hm = _u8_re.match(line, pos)
-                        if hm:
-                            cp = int(hm.group(0), 16)
-                            if cp >= 0xd800 and cp <= 0xdfff or cp > 0x10ffff:
-                                raise ValueError('Bad Unicode escape')
-                            chunks.append(uchr(cp))
-                            pos = hm.end(0)
+                block, quoted_key, raw_key, target = m.group(2, 3, 4, 5)
+                if block:
+                    comment = _join_comment(block[:-1])
+                elif lines:
+                    for body in _line_comment_re.findall(lines):
+                        if comment is None:
+                            comment = body.strip()
                         else:
-                            chunks.append('x')
-                    elif ch >= '0' and ch < '8':
-                        hm = _oct_re.match(line, pos)
-                        cp = int(hm.group(0), 8)
-                        chunks.append(uchr(cp))
-                        pos = hm.end(0)
-                    else:
-                        chunks.append(ch)
-                        pos += 1
+                            comment += ' ' + body.strip()
+                if raw_key is None:
+                    key = decode(quoted_key)
+                    start = m.start(3) - 1
+                else:
+                    key = raw_key
+                    start = m.start(4)
+                ls = LocalizedString(key, decode(target), comment)
+                state = EXPECTING_ITEM
+                comment = None
+                pos = m.end(0)
+                if spans:
+                    yield (ls, item_start, base + pos)
+                    item_start = base + pos
+                elif positions:
+                    line += len(_newline_re.findall(text, line_pos, start))
+                    line_pos = start
+                    yield (ls, line, base + start)
+                else:
+                    yield ls
+                continue
+
+        if state == EXPECTING_EQUALS:
+            m = _rx_equals_re.match(text, pos)
+            if m:
+                state = EXPECTING_TARGET
+                pos = m.end(0)
+                continue
+            elif not eof and _hspace_re.match(text, pos).end(0) == end:
+                more = True
+                continue
+            elif pos == end:
+                break
+            elif not eof and _ws_re.match(text, pos).end(0) == end:
+                # The error is at whatever follows the whitespace, which
+                # might not have been read yet
+                more = True
+                continue
+            raise ParseError('Missing equals',
+                             base + _ws_re.match(text, pos).end(0), state)
+        elif state == EXPECTING_SEMICOLON:
+            m = _rx_semi_re.match(text, pos)
+            if m:
+                ls = LocalizedString(key, target, comment)
+                state = EXPECTING_ITEM
+                comment = None
+                pos = m.end(0)
+                if spans:
+                    yield (ls, item_start, base + pos)
+                    item_start = base + pos
+                elif positions:
+                    yield (ls, key_line, key_offset)
+                else:
+                    yield ls
+                continue
+            elif not eof and _hspace_re.match(text, pos).end(0) == end:
+                more = True
+                continue
+            elif pos == end:
+                break
+            elif not eof and _ws_re.match(text, pos).end(0) == end:
+                # The error is at whatever follows the whitespace, which
+                # might not have been read yet
+                more = True
+                continue
+            raise ParseError('Missing semicolon',
+                             base + _ws_re.match(text, pos).end(0), state)
+
+        pos = _ws_re.match(text, pos).end(0)
+        if not eof and end - pos < 2:
+            more = True
+            continue
+        if pos == end:
+            break
+
+        ch = text[pos]
+        if state == EXPECTING_ITEM:
+            if text.startswith('/*', pos):
+                cend = text.find('*/', pos + 2)
+                if cend < 0:
+                    if eof:
+                        break
+                    more = True
+                    continue
+                comment = _join_comment(text[pos + 2:cend])
+                state = EXPECTING_KEY
+                pos = cend + 2
+                continue
+            elif text.startswith('//', pos):
+                m = _line_re.match(text, pos + 2)
+                if not eof and m.end(0) == end:
+                    more = True
+                    continue
+                if comment is None:
+                    comment = m.group(0).strip()
+                else:
+                    comment += ' ' + m.group(0).strip()
+                pos = m.end(0)
+                continue
+        elif state == EXPECTING_TARGET:
+            if ch == '"':
+                m = _string_re.match(text, pos)
+                if not m:
+                    if eof:
+                        break
+                    more = True
+                    continue
+                target = decode(m.group(1))
+                state = EXPECTING_SEMICOLON
             else:
-                chunks.append(line[pos:])
-                pos = end            
+                m = _line_re.match(text, pos)
+                if not eof and m.end(0) == end:
+                    more = True
+                    continue
+            pos = m.end(0)
+            continue
 
-            return (state, pos, skip_nl, None)
-        
-        for line in reader:
-            end = len(line)
-            pos = 0
-            if not skip_nl:
-                chunks.append('\n')
-                skip_nl = False
-            while pos < end:
+        # We're expecting a key
+        if ch == '"':
+            m = _string_re.match(text, pos)
+            if not m:
+                if eof:
+                    break
+                more = True
+                continue
+            key = decode(m.group(1))
+        else:
+            m = _raw_key_re.match(text, pos)
+            if not m:
                 if state == EXPECTING_ITEM:
-                    m = _start_re.match(line, pos)
-                    if m:
-                        if m.group(0) == '/*':
-                            state = IN_COMMENT
-                            chunks = []
-                            pos = m.end(0)
-                            skip_nl = True
-                        elif m.group(0) == '//':
-                            comment_content = line[m.end(0):].strip()
-                            if comment is None:
-                                comment = comment_content
-                            else:
-                                comment += ' ' + comment_content
-                            pos = end
-                        elif m.group(0) == '"':
-                            state = IN_KEY
-                            chunks = []
-                            pos = m.end(0)
+                    raise ParseError('Unexpected garbage in input',
+                                     base + pos, state)
+                m = _line_re.match(text, pos)
+                if not eof and m.end(0) == end:
+                    more = True
+                    continue
+                pos = m.end(0)
+                continue
+            elif not eof and m.end(0) == end:
+                more = True
+                continue
+            key = m.group(1)
+
+        if positions:
+            line += len(_newline_re.findall(text, line_pos, pos))
+            line_pos = pos
+            key_line = line
+            key_offset = base + pos
+        state = EXPECTING_EQUALS
+        pos = m.end(0)
+
+    if state != EXPECTING_ITEM or pos != end:
+        raise ParseError('Bad strings file', base + pos, state)
+
+# The original line-by-line state machine.  This is slower than the
+# regex engine, but is kept as the reference implementation.
+def _parse_state(lines, process_escapes, positions=False):
+    state = EXPECTING_ITEM
+    comment = None
+    key = None
+    target = None
+    chunks = []
+    line_no = 0
+    offset = 0
+    end = 0
+    key_line = None
+    key_offset = None
+
+    def handle_string(m, pos, state, next_state):
+        if m:
+            chunks.append(line[pos:m.start(0)])
+            if m.group(0) == '"':
+                state = next_state
+                pos = m.end(0)
+                return (state, pos, ''.join(chunks))
+            elif m.group(0) == '\\':
+                pos = m.end(0)
+                ch = line[pos]
+                if not process_escapes:
+                    chunks.append('\\')
+                    chunks.append(ch)
+                    pos += 1
+                elif ch in _c_escapes:
+                    chunks.append(_c_escapes[ch])
+                    pos += 1
+                elif ch in ('x', 'u', 'U'):
+                    pos += 1
+                    if ch == 'x':
+                        hm = _hex_re.match(line, pos)
+                    elif ch == 'u':
+                        hm = _u4_re.match(line, pos)
+                    elif ch == 'U':
+                        hm = _u8_re.match(line, pos)
+                    if hm:
+                        cp = int(hm.group(0), 16)
+                        if cp >= 0xd800 and cp <= 0xdfff or cp > 0x10ffff:
+                            raise ValueError('Bad Unicode escape')
+                        chunks.append(uchr(cp))
+                        pos = hm.end(0)
                     else:
-                        m = _raw_key_re.match(line, pos)
-                        if m:
-                            state = EXPECTING_EQUALS
-                            key = m.group(1)
-                            pos = m.end(1)
-                        elif line.strip() != '':
-                            raise ValueError('Unexpected garbage in input')
-                        else:
-                            pos = end
-                elif state == IN_COMMENT:
-                    m = _comment_re.search(line, pos)
-                    if m:
-                        state = EXPECTING_KEY
-                        chunks.append(line[pos:m.start(0)].strip())
-                        comment = ' '.join(chunks).strip()
-                        skip_nl = False
+                        chunks.append('x')
+                elif ch >= '0' and ch < '8':
+                    hm = _oct_re.match(line, pos)
+                    cp = int(hm.group(0), 8)
+                    chunks.append(uchr(cp))
+                    pos = hm.end(0)
+                else:
+                    chunks.append(ch)
+                    pos += 1
+        else:
+            chunks.append(line[pos:])
+            pos = end            
+
+        return (state, pos, None)
+
+    for line in lines:
+        line_no += 1
+        offset += end
+        end = len(line)
+        pos = 0
+        while pos < end:
+            if state == EXPECTING_ITEM:
+                m = _start_re.match(line, pos)
+                if m:
+                    if m.group(0) == '/*':
+                        state = IN_COMMENT
+                        chunks = []
                         pos = m.end(0)
-                    else:
-                        chunks.append(line[pos:].strip())
+                    elif m.group(0) == '//':
+                        comment_content = line[m.end(0):].strip()
+                        if comment is None:
+                            comment = comment_content
+                        else:
+                            comment += ' ' + comment_content
                         pos = end
-                elif state == EXPECTING_KEY:
-                    m = _exp_key_re.match(line, pos)
-                    if m:
+                    elif m.group(0) == '"':
                         state = IN_KEY
                         chunks = []
                         pos = m.end(0)
-                    else:
-                        m = _raw_key_re.match(line, pos)
-                        if m:
-                            state = EXPECTING_EQUALS
-                            key = m.group(1)
-                            pos = m.end(1)
-                        else:
-                            pos = end
-                elif state == IN_KEY:
-                    state, pos, skip_nl, key \
-                      = handle_string(_key_re.search(line, pos),
-                                      pos, state, EXPECTING_EQUALS)
-                elif state == EXPECTING_EQUALS:
-                    m = _equals_re.match(line, pos)
+                        key_line = line_no
+                        key_offset = offset + pos - 1
+                else:
+                    m = _raw_key_re.match(line, pos)
                     if m:
-                        state = EXPECTING_TARGET
-                        pos = m.end(0)
+                        state = EXPECTING_EQUALS
+                        key = m.group(1)
+                        pos = m.end(1)
+                        key_line = line_no
+                        key_offset = offset + m.start(1)
                     elif line.strip() != '':
-                        raise ValueError('Missing equals')
-                elif state == EXPECTING_TARGET:
-                    m = _exp_key_re.match(line, pos)
-                    if m:
-                        state = IN_TARGET
-                        chunks = []
-                        pos = m.end(0)
+                        raise ValueError('Unexpected garbage in input')
                     else:
                         pos = end
-                elif state == IN_TARGET:
-                    state, pos, skip_nl, target \
-                      = handle_string(_key_re.search(line, pos),
-                                      pos, state, EXPECTING_SEMICOLON)
-                elif state == EXPECTING_SEMICOLON:
-                    m = _semi_re.match(line, pos)
+            elif state == IN_COMMENT:
+                m = _comment_re.search(line, pos)
+                if m:
+                    state = EXPECTING_KEY
+                    chunks.append(line[pos:m.start(0)].strip())
+                    comment = ' '.join(chunks).strip()
+                    pos = m.end(0)
+                else:
+                    chunks.append(line[pos:].strip())
+                    pos = end
+            elif state == EXPECTING_KEY:
+                m = _exp_key_re.match(line, pos)
+                if m:
+                    state = IN_KEY
+                    chunks = []
+                    pos = m.end(0)
+                    key_line = line_no
+                    key_offset = offset + pos - 1
+                else:
+                    m = _raw_key_re.match(line, pos)
                     if m:
-                        state = EXPECTING_ITEM
-                        self.store(LocalizedString(key, target, comment))
-                        pos = m.end(0)
-                        key = None
-                        target = None
-                        comment = None
-                    elif line.strip() != '':
-                        raise ValueError('Missing semicolon')
-                    
-        if state != EXPECTING_ITEM:
-            raise ValueError('Bad strings file')
-
-        return self;
-        
-    def write(self, file_or_name, encoding='utf_16', escape_strings=True):
-        if isinstance(file_or_name, six.string_types):
-            file_or_name = io.open(file_or_name, 'wb')
-
-        writer_factory = codecs.getwriter(encoding)
-
-        writer = writer_factory(file_or_name)
-
-        # In the two endian specific formats, we need to explicitly write
-        # the BOM.
-        if encoding in ('utf_16_be', 'utf_16_le'):
-            writer.write('\ufeff')
-        
-        keys = self.strings.keys()
-        if not isinstance(keys, list):
-            keys = list(keys)
-        keys.sort()
+                        state = EXPECTING_EQUALS
+                        key = m.group(1)
+                        pos = m.end(1)
+                        key_line = line_no
+                        key_offset = offset + m.start(1)
+                    else:
+                        pos = end
+            elif state == IN_KEY:
+                state, pos, key \
+                  = handle_string(_key_re.search(line, pos),
+                                  pos, state, EXPECTING_EQUALS)
+            elif state == EXPECTING_EQUALS:
+                m = _equals_re.match(line, pos)
+                if m:
+                    state = EXPECTING_TARGET
+                    pos = m.end(0)
+                elif line.strip() != '':
+                    raise ValueError('Missing equals')
+            elif state == EXPECTING_TARGET:
+                m = _exp_key_re.match(line, pos)
+                if m:
+                    state = IN_TARGET
+                    chunks = []
+                    pos = m.end(0)
+                else:
+                    pos = end
+            elif state == IN_TARGET:
+                state, pos, target \
+                  = handle_string(_key_re.search(line, pos),
+                                  pos, state, EXPECTING_SEMICOLON)
+            elif state == EXPECTING_SEMICOLON:
+                m = _semi_re.match(line, pos)
+                if m:
+                    state = EXPECTING_ITEM
+                    ls = LocalizedString(key, target, comment)
+                    pos = m.end(0)
+                    key = None
+                    target = None
+                    comment = None
+                    if positions:
+                        yield (ls, key_line, key_offset)
+                    else:
+                        yield ls
+                elif line.strip() != '':
+                    raise ValueError('Missing semicolon')
 
-        first = True
-        for k in keys:
-            if first:
-                first = False
-            else:
-                writer.write('\n')
-            ls = self.strings[k]
-            if ls.comment:
-                writer.write('/* %s */\n' % ls.comment)
-            elif self.include_empty_comments:
-                writer.write('/* No description */\n')
-
-            if escape_strings:
-                writer.write('"%s" = "%s";\n'
-                             % (escape_string(ls.source),
-                                escape_string(ls.target)))
-            else:
-                writer.write('"%s" = "%s";\n' % (ls.source, ls.target))
+    if state != EXPECTING_ITEM:
+        raise ValueError('Bad strings file')
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import multiprocessing
+import os
+
+from .store import StringTable, LocalizedString, ENGINES
+
+# Below this many files, load_tree() doesn't bother starting a process pool
+_MIN_PARALLEL_FILES = 16
+
+# The result of load_tree(); maps (locale, table) to StringTable.  Files that
+# couldn't be loaded are listed in the errors dictionary, which maps their
+# paths to the exceptions that were raised.  paths maps (locale, table) to
+# the list of files the table was loaded from; if there's more than one
+# (e.g. because of a nested bundle), they're merged in that order, as
+# StringTable.store() does.
+class LoadedTree(dict):
+    def __init__(self):
+        super(LoadedTree, self).__init__()
+        self.errors = {}
+        self.paths = {}
+
+# Finds the .strings files under root, returning a sorted list of
+#
+#   (locale, table, path)
+#
+# where locale is the name of the .lproj directory without its extension,
+# and table the name of the .strings file without its extension.
+def find_strings_files(root):
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        base = os.path.basename(dirpath)
+        if not base.endswith('.lproj'):
+            continue
+        locale = base[:-6]
+        for filename in filenames:
+            if filename.endswith('.strings'):
+                found.append((locale, filename[:-8],
+                              os.path.join(dirpath, filename)))
+    found.sort()
+    return found
+
+def _load_file(path, process_escapes, engine):
+    try:
+        return (True, StringTable.read(path, process_escapes=process_escapes,
+                                       engine=engine))
+    except Exception as e:
+        return (False, e)
+
+# Runs in the worker processes; returns plain tuples because they're much
+# cheaper to pickle than LocalizedString objects.
+def _load_file_remote(args):
+    ok, value = _load_file(*args)
+    if ok:
+        value = [(ls.source, ls.target, ls.comment)
+                 for ls in value.strings.values()]
+    return (ok, value)
+
+def _make_table(entries):
+    st = StringTable()
+    st.strings = dict((source, LocalizedString(source, target, comment))
+                      for source, target, comment in entries)
+    return st
+
+# Loads every *.lproj/*.strings file under root.  If workers is None, uses
+# one worker process per CPU; if it is 1 or less, or there are only a few
+# files, loads them in this process instead.
+def load_tree(root, workers=None, process_escapes=True, engine='regex'):
+    if engine not in ENGINES:
+        raise ValueError('Unknown parser engine %r' % engine)
+
+    files = find_strings_files(root)
+    result = LoadedTree()
+
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    workers = min(workers, len(files))
+
+    try:
+        from concurrent.futures import ProcessPoolExecutor
+    except ImportError:
+        # Python 2 without the futures backport
+        workers = 1
+
+    jobs = [(path, process_escapes, engine) for locale, table, path in files]
+    if workers <= 1 or len(files) < _MIN_PARALLEL_FILES:
+        results = [_load_file(*job) for job in jobs]
+    else:
+        chunksize = max(1, len(jobs) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = [(ok, _make_table(value) if ok else value)
+                       for ok, value in executor.map(_load_file_remote, jobs,
+                                                     chunksize=chunksize)]
+
+    for (locale, table, path), (ok, value) in zip(files, results):
+        if not ok:
+            result.errors[path] = value
+            continue
+        key = (locale, table)
+        st = result.get(key)
+        if st is None:
+            result[key] = value
+            result.paths[key] = [path]
+        else:
+            for ls in value.strings.values():
+                st.store(ls)
+            result.paths[key].append(path)
+
+    return result
@@ -52,7 +52,30 @@ if narrow:
     _esc_re = re.compile('([\x00-\x1f\x7f-\x9f\u200e\u200f\u2028-\u202e\ufe00-\ufe0f"\\\\]|\udb40[\udd00-\uddef])')
 else:
     _esc_re = re.compile('[\x00-\x1f\x7f-\x9f\u200e\u200f\u2028-\u202e\ufe00-\ufe0f\U000e0100-\U000e01ef"\\\\]')
-def escape_string(s):
+
+def _escape_char(cp):
+    if cp in _c_escapes:
+        return '\\%s' % _c_escapes[cp]
+    elif cp <= 0xff:
+        return '\\x%02x' % cp
+    elif cp <= 0xffff:
+        return '\\u%04x' % cp
+    else:
+        return '\\U%08x' % cp
+
+# Table for str.translate(), covering the same characters as _esc_re; this
+# isn't usable on narrow builds, where the variation selectors in plane 14
+# are surrogate pairs.  The rest of Latin-1 maps to itself, which saves
+# str.translate() a failed lookup for each of those characters.
+_esc_table = dict((_cp, uchr(_cp)) for _cp in range(0x100))
+for _first, _last in [(0x00, 0x1f), (0x7f, 0x9f), (0x200e, 0x200f),
+                      (0x2028, 0x202e), (0xfe00, 0xfe0f), (0x22, 0x22),
+                      (0x5c, 0x5c), (0xe0100, 0xe01ef)]:
+    for _cp in range(_first, _last + 1):
+        _esc_table[_cp] = _escape_char(_cp)
+del _first, _last, _cp
+
+def _escape_string_slow(s):
     result = []
     pos = 0
     end = len(s)
@@ -63,16 +86,24 @@ def escape_string(s):
             ch = m.group(0)
             cp = ord_skip(ch, 0)[0]
             pos = m.end(0)
-
-            if cp in _c_escapes:
-                result.append('\\%s' % _c_escapes[cp])
-            elif cp <= 0xff:
-                result.append('\\x%02x' % cp)
-            elif cp <= 0xffff:
-                result.append('\\u%04x' % cp)
-            else:
-                result.append('\\U%08x' % cp)
+            result.append(_escape_char(cp))
         else:
             result.append(s[pos:])
             pos = end
     return ''.join(result)
+
+_esc_search = _esc_re.search
+_has_isascii = hasattr('', 'isascii')
+
+def escape_string(s):
+    # Most strings don't need escaping at all; for ASCII strings we can check
+    # that without a regex search.  Either way, this check is most of the
+    # cost of escaping such a string (see benchmarks/bench_escape.py).
+    if _has_isascii and s.isascii():
+        if s.isprintable() and '"' not in s and '\\' not in s:
+            return s
+    elif not _esc_search(s):
+        return s
+    if narrow:
+        return _escape_string_slow(s)
+    return s.translate(_esc_table)
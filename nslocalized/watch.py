@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import hashlib
+import io
+import os
+import threading
+
+import six
+
+from .store import StringTable, LocalizedString, ENGINES
+from .shared import ConcurrentStringTable
+
+# A ConcurrentStringTable holding the entries of one or more .strings files,
+# merged in order as if they had all been read into the same table, which
+# is kept up to date as the files change.
+#
+# Call check() to look for changes now, or start() to poll the files every
+# interval seconds on a background thread.  A file is only read again if
+# its modification time or size has changed, and only parsed again if its
+# contents have; only the keys from files that have changed are merged
+# again.  Files that don't exist (yet) count as empty.
+#
+# Functions passed to subscribe() are called, on the thread doing the
+# check, with the set of keys whose entries have changed (including ones
+# that have been added or removed).
+#
+# Use it like this:
+#
+#   table = WatchedStringTable(['/path/to/Localizable.strings'])
+#   table.subscribe(lambda keys: print('Changed', keys))
+#   table.start()
+#   ...
+#   table.stop()
+class WatchedStringTable(ConcurrentStringTable):
+    def __init__(self, paths, interval=1.0, process_escapes=True,
+                 engine='regex'):
+        if engine not in ENGINES:
+            raise ValueError('Unknown parser engine %r' % engine)
+        super(WatchedStringTable, self).__init__()
+        if isinstance(paths, six.string_types):
+            paths = [paths]
+        self.paths = list(paths)
+        self.interval = interval
+        self.process_escapes = process_escapes
+        self.engine = engine
+
+        # The exception raised by the last attempt to read each file, if it
+        # failed; the file's previous entries are kept until it can be read
+        self.errors = {}
+
+        # The last exception raised by check() on the background thread
+        self.last_error = None
+
+        self._tables = [StringTable() for path in self.paths]
+        self._stamps = [None] * len(self.paths)
+        self._hashes = [None] * len(self.paths)
+        self._subscribers = []
+        self._check_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+        self.check()
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self._subscribers.remove(callback)
+
+    def _stamp(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        return (getattr(st, 'st_mtime_ns', st.st_mtime), st.st_size)
+
+    # Returns the new table for file n, or None if it hasn't changed
+    def _reload(self, n):
+        path = self.paths[n]
+        stamp = self._stamp(path)
+        if stamp == self._stamps[n]:
+            return None
+        self._stamps[n] = stamp
+
+        if stamp is False:
+            data = None
+            digest = None
+        else:
+            try:
+                with io.open(path, 'rb') as f:
+                    data = f.read()
+            except (IOError, OSError) as e:
+                # Try again next time
+                self._stamps[n] = None
+                self.errors[path] = e
+                return None
+            digest = hashlib.sha1(data).digest()
+        if digest == self._hashes[n]:
+            return None
+
+        st = StringTable()
+        if data is not None:
+            try:
+                # On Python 2, data is a str, which read() would take for a
+                # file name
+                st.read(memoryview(data), self.process_escapes, self.engine)
+            except ValueError as e:
+                # Probably half written; keep the old entries for now
+                self.errors[path] = e
+                return None
+        self.errors.pop(path, None)
+        self._hashes[n] = digest
+        return st
+
+    # Merges the entries for key from all of the files
+    def _merge(self, key):
+        merged = None
+        for st in self._tables:
+            ls = st.strings.get(key)
+            if ls is None:
+                continue
+            if merged is None:
+                merged = LocalizedString(ls.source, ls.target, ls.comment)
+            else:
+                if ls.comment:
+                    if merged.comment:
+                        merged.comment += '\n' + ls.comment
+                    else:
+                        merged.comment = ls.comment
+                merged.target = ls.target
+        return merged
+
+    # Looks for changes to the files now, updating the table and notifying
+    # subscribers if there are any.  Returns the set of keys that changed.
+    def check(self):
+        with self._check_lock:
+            touched = set()
+            for n in range(len(self.paths)):
+                st = self._reload(n)
+                if st is not None:
+                    diff = self._tables[n].diff(st)
+                    touched.update(diff.added, diff.removed, diff.changed)
+                    self._tables[n] = st
+            if not touched:
+                return set()
+
+            changed = set()
+            with self._lock:
+                strings = dict(self._strings)
+                for key in touched:
+                    old = strings.get(key)
+                    new = self._merge(key)
+                    if new is None:
+                        if old is not None:
+                            del strings[key]
+                            changed.add(key)
+                    elif old is None or old.target != new.target \
+                         or old.comment != new.comment:
+                        strings[key] = new
+                        changed.add(key)
+                if changed:
+                    self._publish(strings)
+
+            if changed:
+                for callback in list(self._subscribers):
+                    callback(changed)
+            return changed
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                self.last_error = e
+
+    # Starts polling the files on a background (daemon) thread
+    def start(self):
+        if self._thread is not None:
+            raise ValueError('Already watching')
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name='WatchedStringTable')
+        self._thread.daemon = True
+        self._thread.start()
+
+    # Stops the background thread, waiting for it to finish
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import re
 import sys
 from setuptools import setup
 from setuptools.command.test import test as TestCommand
@@ -16,10 +17,15 @@ class PyTest(TestCommand):
 
 with open('README.rst', 'rb') as f:
     long_desc = f.read().decode('utf-8')
+
+# The version lives in nslocalized/__init__.py (which ParseCache also uses)
+with open('nslocalized/__init__.py', 'rb') as f:
+    version = re.search(br"^__version__ = '([^']*)'", f.read(),
+                        re.M).group(1).decode('ascii')
         
 setup(
     name='nslocalized',
-    version='0.2.0',
+    version=version,
     description='Reads and writes Mac OS X .strings files',
     long_description=long_desc,
     author='Alastair Houghton',
@@ -38,7 +44,13 @@ setup(
         },
     install_requires=[
         'six>=1.5.0',
+        'futures; python_version < "3"',
         ],
+    entry_points={
+        'console_scripts': [
+            'nslocalized = nslocalized.cli:main',
+            ],
+        },
     provides=['nslocalized']
     )
     
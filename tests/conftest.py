@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+import sys
+
+# The asyncio API uses syntax that older Pythons can't parse
+collect_ignore = []
+if sys.version_info < (3, 6):
+    collect_ignore.append('test_aio.py')
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import asyncio
+import io
+import pytest
+import nslocalized.aio
+from nslocalized import *
+
+text = '''\
+/* First */
+"A" = "Alpha";
+"B\\tB" = "Beta";
+"A" = "Again";
+'''
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro) \
+        if not hasattr(asyncio, 'run') else asyncio.run(coro)
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_aread(tmpdir, engine, monkeypatch):
+    """Test that aread() gives the same table as read()."""
+    monkeypatch.setattr(nslocalized.aio, '_BATCH_SIZE', 1)
+    path = tmpdir.join('Localizable.strings')
+    path.write_binary(text.encode('utf_16'))
+    expected = StringTable.read(str(path))
+    for source in [str(path), io.BytesIO(path.read_binary()),
+                   path.read_binary()]:
+        st = run(StringTable.aread(source, engine=engine))
+        assert st == expected
+        assert st.lookup('A').comment == 'First'
+
+def test_aiterparse():
+    """Test iterating over entries asynchronously."""
+    async def collect():
+        return [(ls.source, line, offset) async for ls, line, offset
+                in aiterparse(text.encode('utf_8'), positions=True)]
+    assert run(collect()) == [('A', 2, 12), ('B\tB', 3, 27), ('A', 4, 44)]
+
+def test_awrite(tmpdir):
+    """Test that awrite() writes the same bytes as write()."""
+    st = StringTable.read(text.encode('utf_8'))
+    path = tmpdir.join('Localizable.strings')
+    run(st.awrite(str(path), encoding='utf_8'))
+    assert path.read_binary() == st.dumps_bytes(encoding='utf_8')
+    f = io.BytesIO()
+    run(st.awrite(f))
+    assert f.getvalue() == st.dumps_bytes()
+
+@pytest.mark.skipif(not hasattr(asyncio, 'get_running_loop'),
+                    reason='needs asyncio.get_running_loop()')
+def test_running_loop(tmpdir, monkeypatch):
+    """Test that the deprecated get_event_loop() isn't used."""
+    def get_event_loop():
+        raise AssertionError('get_event_loop() called')
+    monkeypatch.setattr(asyncio, 'get_event_loop', get_event_loop)
+    path = str(tmpdir.join('Localizable.strings'))
+    st = StringTable.read(text.encode('utf_8'))
+    run(st.awrite(path))
+    assert run(StringTable.aread(path)) == st
+
+def test_aread_many(tmpdir):
+    """Test loading several files with a concurrency limit."""
+    paths = []
+    for n in range(5):
+        path = tmpdir.join('%d.strings' % n)
+        path.write_binary(('"N" = "%d";' % n).encode('utf_8'))
+        paths.append(str(path))
+    paths.append(str(tmpdir.join('missing.strings')))
+
+    tables = run(aread_many(paths, limit=2, return_exceptions=True))
+    assert [st['N'] for st in tables[:5]] == ['0', '1', '2', '3', '4']
+    assert isinstance(tables[5], (IOError, OSError))
+    with pytest.raises((IOError, OSError)):
+        run(aread_many(paths, limit=2))
+
+def test_aread_bad_engine():
+    """Test that an unknown engine is rejected straight away."""
+    with pytest.raises(ValueError):
+        StringTable.aread(b'', engine='magic')
@@ -2,6 +2,7 @@
 from __future__ import unicode_literals
 import io
 from nslocalized import *
+from nslocalized.utils import uchr
 
 def test_read_utf8_no_bom():
     """Test that we can read UTF-8 strings files."""
@@ -31,6 +32,49 @@ def test_read_encodings():
         assert st['åéîøü'] == 'ÅÉÎØÜ'
         assert st.lookup('åéîøü').comment == 'Test string'
 
+def test_read_utf16_no_bom(tmpdir):
+    """Test that we can read UTF-16 strings files without a BOM."""
+    text = '''\
+/* Test string */
+"åéîøü" = "ÅÉÎØÜ";
+"中文" = "日本語";
+'''
+    for encoding in ['utf_16_be', 'utf_16_le']:
+        data = text.encode(encoding)
+        path = str(tmpdir.join('%s.strings' % encoding))
+        with open(path, 'wb') as f:
+            f.write(data)
+
+        for engine in ENGINES:
+            for st in [StringTable.read(data, engine=engine),
+                       StringTable.read(path, engine=engine),
+                       StringTable.read(io.BytesIO(data), engine=engine)]:
+                assert st['åéîøü'] == 'ÅÉÎØÜ'
+                assert st['中文'] == '日本語'
+                assert st.lookup('åéîøü').comment == 'Test string'
+
+def test_read_explicit_encoding():
+    """Test that we can say which encoding to use."""
+    text = '''\
+/* Test string */
+"åéîøü" = "ÅÉÎØÜ";
+'''
+    for encoding, given in [('mac_roman', 'mac_roman'),
+                            ('utf_16', 'utf_16'),
+                            ('utf_16_be', 'utf_16'),
+                            ('utf_16_le', 'utf_16_le'),
+                            ('utf_8_sig', 'utf_8'),
+                            ('utf_8_sig', 'utf_8_sig'),
+                            ('utf_8', 'utf_8_sig')]:
+        data = text.encode(encoding)
+        for engine in ENGINES:
+            for st in [StringTable.read(data, engine=engine,
+                                        encoding=given),
+                       StringTable.read(io.BytesIO(data), engine=engine,
+                                        encoding=given)]:
+                assert st['åéîøü'] == 'ÅÉÎØÜ'
+                assert st.lookup('åéîøü').comment == 'Test string'
+
 def test_escapes():
     """Test that we can read escaped strings properly."""
     text = '''\
@@ -173,3 +217,103 @@ def test_comments():
     assert st.lookup('E').comment == 'This C++-style comment goes over multiple lines'
     assert st['ThisHasNoComment'] == 'NoComment'
     assert st.lookup('ThisHasNoComment').comment is None
+
+def test_read_buffers(tmpdir):
+    """Test that we can read from bytes, memoryviews and mapped files."""
+    text = '''\ufeff\
+/* Test string */
+"åéîøü" = "ÅÉÎØÜ";
+'''
+    for encoding in ['utf_8', 'utf_16_be', 'utf_16_le']:
+        data = text.encode(encoding)
+        path = str(tmpdir.join('%s.strings' % encoding))
+        with open(path, 'wb') as f:
+            f.write(data)
+
+        for engine in ENGINES:
+            for st in [StringTable.read(data, engine=engine),
+                       StringTable.read(bytearray(data), engine=engine),
+                       StringTable.read(memoryview(data), engine=engine),
+                       StringTable.read(path, engine=engine, use_mmap=True)]:
+                assert st['åéîøü'] == 'ÅÉÎØÜ'
+                assert st.lookup('åéîøü').comment == 'Test string'
+
+def test_read_empty_mapped_file(tmpdir):
+    """Test that memory mapping an empty file works."""
+    path = tmpdir.join('empty.strings')
+    path.write('')
+    st = StringTable.read(str(path), use_mmap=True)
+    assert st.strings == {}
+
+def test_read_mapped_files(tmpdir):
+    """Test that every way of reading a file can memory map it."""
+    text = '''\ufeff\
+/* Test string */
+"åéîøü" = "ÅÉÎØÜ";
+'''
+    for encoding in ['utf_8', 'utf_16_be', 'utf_16_le']:
+        path = tmpdir.join('%s.strings' % encoding)
+        path.write_binary(text.encode(encoding))
+        path = str(path)
+
+        tables = [StringTable.read(path, engine=engine, use_mmap=True)
+                  for engine in ENGINES]
+        tables.append(StringTable.read(path, use_mmap=True,
+                                       keep_layout=True))
+        tables.append(StringTable.read(path, use_mmap=True,
+                                       stats=ParseStats()))
+        tables.append(StringTable.read(path, use_mmap=True, diagnostics=[]))
+        tables.append(LazyStringTable.read(path, use_mmap=True))
+        for st in tables:
+            assert st['åéîøü'] == 'ÅÉÎØÜ'
+            assert st.lookup('åéîøü').comment == 'Test string'
+
+def test_write_blocks(tmpdir, monkeypatch):
+    """Test that write_iter(), dumps_bytes() and write() agree."""
+    import nslocalized.store
+    monkeypatch.setattr(nslocalized.store, '_WRITE_CHUNK', 100)
+
+    st = StringTable()
+    for n in range(50):
+        st.store(LocalizedString('Key %d' % n, 'Value "%d"' % n,
+                                 'Comment %d' % n))
+
+    for encoding in ['utf_8', 'utf_16', 'utf_16_be', 'utf_16_le']:
+        blocks = list(st.write_iter(encoding=encoding))
+        assert len(blocks) > 1
+
+        data = st.dumps_bytes(encoding=encoding)
+        assert b''.join(blocks) == data
+
+        path = str(tmpdir.join('%s.strings' % encoding))
+        st.write(path, encoding=encoding)
+        with open(path, 'rb') as f:
+            assert f.read() == data
+
+        assert StringTable.read(data) == st
+
+def test_write_empty_table():
+    """Test that an empty table produces an empty file."""
+    assert StringTable().dumps_bytes() == b''
+    assert StringTable().dumps_bytes(encoding='utf_8') == b''
+
+    # The endian specific formats still get a BOM, as they always have
+    assert StringTable().dumps_bytes(encoding='utf_16_be') == b'\xfe\xff'
+    assert StringTable().dumps_bytes(encoding='utf_16_le') == b'\xff\xfe'
+    with io.BytesIO() as f:
+        StringTable().write(f, encoding='utf_16_le', stats=ParseStats())
+        assert f.getvalue() == b'\xff\xfe'
+
+def test_escape_string():
+    """Test that the fast paths in escape_string() match the general one."""
+    from nslocalized.utils import escape_string, _escape_string_slow
+    ranges = [(0x00, 0x300), (0x2000, 0x2100), (0xfdf0, 0xfe20),
+              (0xe00f0, 0xe0200), (0x1f600, 0x1f610)]
+    for first, last in ranges:
+        for cp in range(first, last):
+            for s in [uchr(cp), 'plain %s text' % uchr(cp)]:
+                assert escape_string(s) == _escape_string_slow(s)
+
+    assert escape_string('Plain text') == 'Plain text'
+    assert escape_string('Très "important"\n') == 'Très \\"important\\"\\n'
+    assert escape_string('\u200e\U000e0101') == '\\u200e\\U000e0101'
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import pytest
+from nslocalized import *
+
+def make_table(entries):
+    st = StringTable()
+    for entry in entries:
+        st.store(LocalizedString(*entry))
+    return st
+
+base = [('A', 'Alpha', 'First'), ('B', 'Beta'), ('C', 'Gamma', 'Third')]
+other = [('A', 'Alpha', 'First'), ('B', 'Bravo', 'Second'), ('D', 'Delta')]
+
+def entries(st):
+    return sorted((k, ls.target, ls.comment) for k, ls in st.strings.items())
+
+def test_diff():
+    """Test comparing two tables."""
+    diff = make_table(base).diff(make_table(other))
+    assert diff.added == set(['D'])
+    assert diff.removed == set(['C'])
+    assert diff.changed == set(['B'])
+    assert make_table(base).diff(make_table(base)) == (set(), set(), set())
+
+@pytest.mark.parametrize('policy,expected', [
+    ('store', [('A', 'Alpha', 'First\nFirst'), ('B', 'Bravo', 'Second'),
+               ('C', 'Gamma', 'Third'), ('D', 'Delta', None)]),
+    ('replace', [('A', 'Alpha', 'First'), ('B', 'Bravo', 'Second'),
+                 ('C', 'Gamma', 'Third'), ('D', 'Delta', None)]),
+    ('keep', [('A', 'Alpha', 'First'), ('B', 'Beta', None),
+              ('C', 'Gamma', 'Third'), ('D', 'Delta', None)]),
+])
+def test_merge(policy, expected):
+    """Test merging one table into another."""
+    st = make_table(base)
+    theirs = make_table(other)
+    assert st.merge(theirs, policy=policy) is st
+    assert entries(st) == expected
+    assert all(st.lookup(k) is not theirs.lookup(k) for k in theirs.strings)
+
+def test_merge_store_matches_store():
+    """Test that the default policy does what store() does."""
+    st = make_table(base)
+    st.merge(make_table(other))
+    expected = make_table(base)
+    for entry in other:
+        expected.store(LocalizedString(*entry))
+    assert entries(st) == entries(expected)
+
+def test_merge_bad_policy():
+    """Test that unknown merge policies are rejected."""
+    with pytest.raises(ValueError):
+        StringTable().merge(StringTable(), policy='magic')
+
+def test_update_many():
+    """Test that update_many() is the same as repeated store() calls."""
+    items = other + [LocalizedString('A', 'Again', 'Extra'), ('E', 'Echo'),
+                     ('D', 'Delta again', 'Note')]
+    st = make_table(base)
+    st.update_many(items)
+    expected = make_table(base)
+    for item in items:
+        if not isinstance(item, LocalizedString):
+            item = LocalizedString(*item)
+        expected.store(item)
+    assert entries(st) == entries(expected)
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import os
+import pytest
+import nslocalized.cache
+from nslocalized import *
+
+text = '''\
+/* First */
+"A" = "Alpha";
+"B\\tB" = "Beta \\"quoted\\"";
+// Second
+"A" = "Again";
+'''
+
+def no_parsing(*args, **kwargs):
+    raise AssertionError('Should have used the cache')
+
+def test_cache(tmpdir, monkeypatch):
+    """Test that a warm cache gives the same results without parsing."""
+    path = tmpdir.join('Localizable.strings')
+    path.write_binary(text.encode('utf_16'))
+    cache = ParseCache(str(tmpdir.join('cache')))
+
+    expected = StringTable.read(str(path))
+    st = StringTable.read(str(path), cache=cache)
+    assert st == expected
+    assert st.lookup('A').comment == 'First\nSecond'
+
+    monkeypatch.setattr(nslocalized.cache, '_iterparse', no_parsing)
+    st = StringTable.read(str(path), cache=cache)
+    assert st == expected
+    assert st.lookup('A').comment == 'First\nSecond'
+
+    # Reading into an existing table merges as usual
+    st = StringTable()
+    st.store(LocalizedString('A', 'Old', 'Zeroth'))
+    st.read(str(path), cache=str(tmpdir.join('cache')))
+    assert st['A'] == 'Again'
+    assert st.lookup('A').comment == 'Zeroth\nFirst\nSecond'
+
+def test_cache_keys(tmpdir):
+    """Test that the cache distinguishes contents and process_escapes."""
+    cache = ParseCache(str(tmpdir))
+    data = text.encode('utf_8')
+    raw = StringTable.read(data, process_escapes=False, cache=cache)
+    assert raw['B\\tB'] == 'Beta \\"quoted\\"'
+    st = StringTable.read(data, cache=cache)
+    assert st['B\tB'] == 'Beta "quoted"'
+    st = StringTable.read(data.replace(b'Alpha', b'Alpha2'), cache=cache)
+    assert len(os.listdir(str(tmpdir))) == 3
+
+def test_cache_eviction(tmpdir):
+    """Test that least recently used entries are evicted."""
+    cache = ParseCache(str(tmpdir), max_size=1)
+    for n in range(3):
+        StringTable.read(('"A" = "%d";' % n).encode('utf_8'), cache=cache)
+    assert len(os.listdir(str(tmpdir))) == 0
+
+    cache.max_size = 1000
+    for n in range(3):
+        StringTable.read(('"A" = "%d";' % n).encode('utf_8'), cache=cache)
+    assert len(os.listdir(str(tmpdir))) == 3
+    cache.clear()
+    assert len(os.listdir(str(tmpdir))) == 0
+
+def test_cache_corruption(tmpdir):
+    """Test that a damaged cache entry is treated as a miss."""
+    cache = ParseCache(str(tmpdir))
+    data = text.encode('utf_8')
+    StringTable.read(data, cache=cache)
+    for name in os.listdir(str(tmpdir)):
+        tmpdir.join(name).write_binary(b'garbage')
+    assert StringTable.read(data, cache=cache)['A'] == 'Again'
+
+def test_cache_write_failure(tmpdir, monkeypatch):
+    """Test that failing to write to the cache just parses the file."""
+    def fail(src, dst):
+        raise OSError(28, 'No space left on device')
+    monkeypatch.setattr(nslocalized.cache, '_replace', fail)
+    cache = ParseCache(str(tmpdir))
+    st = StringTable.read(text.encode('utf_8'), cache=cache)
+    assert st['A'] == 'Again'
+    assert os.listdir(str(tmpdir)) == []
+
+def test_cache_scans(tmpdir, monkeypatch):
+    """Test that misses don't look at the whole directory every time."""
+    scans = []
+    scan = ParseCache._scan
+    def counting_scan(self):
+        scans.append(1)
+        return scan(self)
+    monkeypatch.setattr(ParseCache, '_scan', counting_scan)
+    cache = ParseCache(str(tmpdir))
+    for n in range(20):
+        StringTable.read(('"A" = "%d";' % n).encode('utf_8'), cache=cache)
+    assert len(scans) == 1
+    assert len(os.listdir(str(tmpdir))) == 20
+
+@pytest.mark.parametrize('use_mmap', [False, True])
+def test_cache_file_by_name(tmpdir, use_mmap):
+    """Test that files given by name can be cached, mapped or not."""
+    path = tmpdir.join('Localizable.strings')
+    path.write_binary(text.encode('utf_16'))
+    cache = ParseCache(str(tmpdir.join('cache')))
+    for n in range(2):
+        st = StringTable.read(str(path), use_mmap=use_mmap, cache=cache)
+        assert st == StringTable.read(str(path))
+    assert len(tmpdir.join('cache').listdir()) == 1
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import pytest
+from nslocalized import *
+
+en = '''\
+/* Greeting */
+"Hello" = "Hello";
+/* Farewell */
+"Goodbye" = "Goodbye";
+"OK" = "OK";
+'''
+
+fr = '''\
+/* Greeting */
+"Hello" = "Bonjour";
+"Cancel" = "Annuler";
+'''
+
+def make_catalog():
+    return StringCatalog.from_tables({
+        'en': StringTable.read(en.encode('utf_8')),
+        'fr': StringTable.read(fr.encode('utf_8')),
+    })
+
+def test_catalog_lookup():
+    """Test looking strings up in a catalog."""
+    catalog = make_catalog()
+    assert catalog.locales() == ['en', 'fr']
+    assert 'fr' in catalog
+    assert catalog['fr']['Hello'] == 'Bonjour'
+    assert catalog['fr'].lookup('Hello').comment == 'Greeting'
+    assert catalog['en'].lookup('OK').comment is None
+    assert 'Goodbye' not in catalog['fr']
+    assert catalog['fr'].lookup('Goodbye') is None
+    with pytest.raises(KeyError):
+        catalog['fr']['Goodbye']
+    with pytest.raises(KeyError):
+        catalog['de']
+    assert sorted(catalog['fr']) == ['Cancel', 'Hello']
+    assert len(catalog['en']) == 3
+
+def test_catalog_shares_keys():
+    """Test that keys and comments are only stored once."""
+    catalog = make_catalog()
+    assert sorted(catalog.keys) == ['Cancel', 'Goodbye', 'Hello', 'OK']
+    assert catalog['en'].lookup('Hello').source \
+        is catalog['fr'].lookup('Hello').source
+    assert catalog['en'].lookup('Hello').comment \
+        is catalog['fr'].lookup('Hello').comment
+
+def test_catalog_missing():
+    """Test finding the keys a locale doesn't have."""
+    catalog = make_catalog()
+    assert catalog.missing('fr') == ['Goodbye', 'OK']
+    assert catalog.missing('en') == ['Cancel']
+    assert catalog.missing('fr', base='en') == ['Goodbye', 'OK']
+
+def test_catalog_tables():
+    """Test converting to and from StringTable."""
+    catalog = make_catalog()
+    for locale, text in [('en', en), ('fr', fr)]:
+        expected = StringTable.read(text.encode('utf_8'))
+        st = catalog[locale].to_table()
+        assert st == expected
+        for k in expected.strings:
+            assert st.lookup(k).comment == expected.lookup(k).comment
+
+    update = StringTable()
+    update.store(LocalizedString('Goodbye', 'Au revoir', 'Farewell'))
+    catalog.add_table('fr', update)
+    assert catalog['fr']['Goodbye'] == 'Au revoir'
+    assert catalog['fr']['Hello'] == 'Bonjour'
+    catalog.remove_locale('en')
+    assert catalog.locales() == ['fr']
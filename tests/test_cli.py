@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import json
+import sys
+from nslocalized import *
+from nslocalized.cli import main
+
+text = '''\
+/* First */
+"B" = "Beta";
+"%d files" = "%@ fichiers";
+"A" = "Alpha";
+'''
+
+def make_tree(tmpdir):
+    for locale in ['en', 'fr']:
+        tmpdir.ensure_dir(locale + '.lproj').join('Localizable.strings') \
+              .write_binary(text.encode('utf_8'))
+    tmpdir.join('fr.lproj', 'Broken.strings').write_binary(b'"A" = "B"')
+    return str(tmpdir)
+
+def test_check(tmpdir, capsys):
+    """Test checking files."""
+    root = make_tree(tmpdir)
+    assert main(['check', '-j', '1', root]) == 1
+    out = capsys.readouterr().out
+    assert 'Broken.strings:1:10: error: Unexpected end of file' in out
+    assert 'en.lproj/Localizable.strings: ok, 3 entries' in out
+    assert 'Checked 3 files, 1 failed' in out
+
+    good = str(tmpdir.join('en.lproj', 'Localizable.strings'))
+    assert main(['check', good]) == 0
+    capsys.readouterr()
+    assert main(['check', '--formats', '-q', good]) == 1
+    out = capsys.readouterr().out
+    assert "format mismatch for '%d files'" in out
+    assert ': ok' not in out
+
+def test_normalize(tmpdir, capsys):
+    """Test normalizing files."""
+    path = tmpdir.join('Localizable.strings')
+    path.write_binary(text.encode('utf_8'))
+    assert main(['normalize', '--check', str(path)]) == 1
+    assert path.read_binary() == text.encode('utf_8')
+
+    assert main(['normalize', '--encoding', 'utf_8', str(path)]) == 0
+    expected = StringTable.read(text.encode('utf_8'))
+    assert path.read_binary() == expected.dumps_bytes('utf_8')
+    assert main(['normalize', '--check', '--encoding', 'utf_8',
+                 str(path)]) == 0
+    assert 'unchanged' in capsys.readouterr().out
+
+def test_normalize_utf16(tmpdir, monkeypatch):
+    """Test normalizing UTF-16 files, with and without a process pool."""
+    paths = []
+    for n in range(40):
+        path = tmpdir.join('%d.strings' % n)
+        path.write_binary(text.encode('utf_16'))
+        paths.append(str(path))
+    expected = StringTable.read(paths[0]).dumps_bytes('utf_8')
+    assert main(['normalize', '-j', '2', '--encoding', 'utf_8']
+                + paths[:20]) == 0
+
+    # Without concurrent.futures, the files are done one at a time
+    monkeypatch.setitem(sys.modules, 'concurrent.futures', None)
+    assert main(['normalize', '-j', '2', '--encoding', 'utf_8']
+                + paths[20:]) == 0
+
+    for path in paths:
+        with open(path, 'rb') as f:
+            assert f.read() == expected
+
+def test_stats(tmpdir, capsys):
+    """Test reporting statistics."""
+    root = make_tree(tmpdir)
+    assert main(['stats', '--json', root]) == 1
+    lines = [json.loads(line)
+             for line in capsys.readouterr().out.splitlines()]
+    assert [line['name'].endswith('Broken.strings') for line in lines] \
+        == [False, True, False]
+    assert lines[0]['entries'] == 3
+    assert 'parse' in lines[0]['times']
+
+    good = str(tmpdir.join('en.lproj'))
+    assert main(['stats', good]) == 0
+    assert capsys.readouterr().out.splitlines()[-1].split()[:3] \
+        == ['total', str(len(text)), '3']
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import pytest
+from nslocalized import *
+
+text = '''\
+/* First */
+"A" = "Alpha";
+"B\\tB" = "Beta \\"quoted\\"";
+/* No description */
+Gamma = "Gamma";
+/* No description */
+"Multi
+line" = "Delta"; "E" = "Epsilon"; // Trailing
+"A" = "Again";
+'''
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_compact_table(engine):
+    """Test that a compact table holds the same entries as a normal one."""
+    data = text.encode('utf_16')
+    expected = StringTable.read(data, engine=engine)
+    st = CompactStringTable.read(data, engine=engine)
+    assert isinstance(st, CompactStringTable)
+    assert len(st.strings) == len(expected.strings)
+    assert st == expected
+    for k in expected.strings:
+        assert st.lookup(k) == expected.lookup(k)
+    assert st.lookup('Z') is None
+    assert st.dumps_bytes() == expected.dumps_bytes()
+
+def test_compact_table_shares():
+    """Test that keys and repeated comments are only stored once."""
+    data = text.encode('utf_8')
+    first = CompactStringTable.read(data)
+    second = CompactStringTable.read(data)
+    comments = first.strings.comments
+    assert comments['Gamma'] is comments['Multi\nline']
+    for a, b in zip(sorted(first.strings), sorted(second.strings)):
+        assert a is b
+
+def test_compact_table_changes():
+    """Test storing, merging and deleting entries."""
+    st = CompactStringTable()
+    st.store(LocalizedString('A', 'Old', 'Zeroth'))
+    st.read(text.encode('utf_8'))
+    assert st['A'] == 'Again'
+    assert st.lookup('A').comment == 'Zeroth\nFirst\nTrailing'
+
+    # Changing a looked up entry doesn't change the table
+    st.lookup('E').target = 'Ignored'
+    assert st['E'] == 'Epsilon'
+
+    st['E'] = 'Changed'
+    st.merge(StringTable.read(b'/* Merged */ "F" = "New"; "A" = "Merged";'))
+    assert st['E'] == 'Changed'
+    assert st['F'] == 'New'
+    assert st.lookup('A').comment == 'Zeroth\nFirst\nTrailing'
+    assert st['A'] == 'Merged'
+    assert st.search('merged') == ['A', 'F']
+    st.store(LocalizedString('Gamma', 'Merged too'))
+    assert st.search('merged') == ['A', 'F', 'Gamma']
+
+    del st.strings['F']
+    assert 'F' not in st.strings
+    assert st.lookup('F') is None
+    assert len(st.strings) == 5
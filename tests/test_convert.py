@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import io
+import json
+import sys
+import timeit
+import pytest
+import nslocalized.convert
+from nslocalized import *
+from nslocalized.convert import *
+from nslocalized.cli import main
+
+text = '''\
+/* First */
+"A" = "Alpha";
+"B\\tB" = "Beta \\"quoted\\" <&>";
+"Multi
+line" = "Delta\\r\\n\\U0001f600";
+Gamma = "";
+'''
+
+def entries():
+    st = StringTable.read(text.encode('utf_8'))
+    return [st.lookup(k) for k in sorted(st.strings)]
+
+def same(a, b):
+    return sorted((ls.source, ls.target, ls.comment) for ls in a) \
+        == sorted((ls.source, ls.target, ls.comment) for ls in b)
+
+@pytest.mark.parametrize('fmt', ['strings', 'json', 'xliff'])
+def test_round_trip(fmt, monkeypatch):
+    """Test writing entries in each format and reading them back."""
+    monkeypatch.setattr(nslocalized.convert, '_CHUNK_SIZE', 5)
+    f = io.BytesIO()
+    write_entries(entries(), f, fmt)
+    f.seek(0)
+    assert same(read_entries(f, fmt), entries())
+
+def test_json():
+    """Test the JSON format."""
+    f = io.BytesIO()
+    write_entries(entries(), f, 'json', comments=False)
+    data = json.loads(f.getvalue().decode('utf_8'))
+    assert data['B\tB'] == 'Beta "quoted" <&>'
+
+    f = io.BytesIO(b'\xef\xbb\xbf { "A" : "Alpha" , '
+                   b'"B": {"target": "Beta", "comment": "Hi"}}\n')
+    assert same(read_entries(f, 'json'), [LocalizedString('A', 'Alpha'),
+                                          LocalizedString('B', 'Beta', 'Hi')])
+    assert list(read_entries(io.BytesIO(b'{}'), 'json')) == []
+
+    f = io.BytesIO()
+    write_entries([], f, 'json')
+    assert json.loads(f.getvalue().decode('utf_8')) == {}
+
+@pytest.mark.parametrize('data', [b'', b'[]', b'{"A": "B"', b'{"A": 1}',
+                                  b'{"A": "B",}', b'{"A": "B"} x',
+                                  b'{"A" "B"}'])
+def test_bad_json(data):
+    """Test that broken JSON files are rejected."""
+    with pytest.raises(ValueError):
+        list(read_entries(io.BytesIO(data), 'json'))
+
+def test_json_chunks(monkeypatch):
+    """Test that values split across reads decode properly, and quickly."""
+    monkeypatch.setattr(nslocalized.convert, '_CHUNK_SIZE', 7)
+    value = {'target': 'Quote \\"} {\\\\', 'comment': 'A \\u00e9 "comment"',
+             'extra': {'nested': ['{', '}']}}
+    data = json.dumps({'A': 'Alpha \\ "x"', 'B': value}).encode('utf_8')
+    assert same(read_entries(io.BytesIO(data), 'json'),
+                [LocalizedString('A', 'Alpha \\ "x"'),
+                 LocalizedString('B', value['target'], value['comment'])])
+    for n in range(1, len(data)):
+        with pytest.raises(ValueError):
+            list(read_entries(io.BytesIO(data[:n]), 'json'))
+
+    # Long values used to be decoded again after every read
+    monkeypatch.setattr(nslocalized.convert, '_CHUNK_SIZE', 1024)
+    start = timeit.default_timer()
+    data = json.dumps({'A': 'x\\"' * 200000}).encode('utf_8')
+    assert len(list(read_entries(io.BytesIO(data), 'json'))[0].target) \
+        == 600000
+    with pytest.raises(ValueError):
+        list(read_entries(io.BytesIO(data[:-2]), 'json'))
+    assert timeit.default_timer() - start < 5
+
+def test_xliff():
+    """Test reading XLIFF like that exported by Xcode."""
+    data = '''<?xml version="1.0" encoding="UTF-8"?>
+<xliff xmlns="urn:oasis:names:tc:xliff:document:1.2" version="1.2">
+  <file original="en.lproj/Localizable.strings" source-language="en"
+        target-language="fr" datatype="plaintext">
+    <body>
+      <trans-unit id="Cancel">
+        <source>Cancel</source>
+        <target>Annuler</target>
+        <note>Button title</note>
+      </trans-unit>
+      <trans-unit id="Untranslated">
+        <source>Untranslated</source>
+      </trans-unit>
+      <trans-unit>
+        <source>No id</source>
+        <target>Pas d'id</target>
+      </trans-unit>
+    </body>
+  </file>
+</xliff>
+'''.encode('utf_8')
+    assert same(read_entries(io.BytesIO(data), 'xliff'),
+                [LocalizedString('Cancel', 'Annuler', 'Button title'),
+                 LocalizedString('No id', "Pas d'id")])
+
+    f = io.BytesIO()
+    write_entries(entries(), f, 'xliff', target_language='fr')
+    assert b'target-language="fr"' in f.getvalue()
+    with pytest.raises(ValueError):
+        write_entries([LocalizedString('A', '\x01')], io.BytesIO(), 'xliff')
+
+def test_stringsdict():
+    """Test converting .stringsdict files."""
+    flat = [
+        LocalizedString('%d files', '%#@files@'),
+        LocalizedString('%d files|files|NSStringFormatSpecTypeKey',
+                        'NSStringPluralRuleType'),
+        LocalizedString('%d files|files|NSStringFormatValueTypeKey', 'd'),
+        LocalizedString('%d files|files|one', '%d fichier'),
+        LocalizedString('%d files|files|other', '%d fichiers'),
+    ]
+    f = io.BytesIO()
+    write_entries(flat, f, 'stringsdict')
+    assert b'<key>NSStringLocalizedFormatKey</key>' in f.getvalue()
+    f.seek(0)
+    assert same(read_entries(f, 'stringsdict'), flat)
+
+def test_stringsdict_conflicts():
+    """Test that entries that would replace a dictionary are rejected."""
+    flat = [
+        LocalizedString('%d files', '%#@files@'),
+        LocalizedString('%d files|NSStringLocalizedFormatKey|one', 'Oops'),
+    ]
+    for entries in [flat, flat[::-1]]:
+        with pytest.raises(ValueError):
+            write_entries(entries, io.BytesIO(), 'stringsdict')
+
+def test_convert_tree(tmpdir):
+    """Test converting a directory of files."""
+    src = tmpdir.join('src')
+    for locale in ['en', 'fr']:
+        src.ensure_dir(locale + '.lproj').join('Localizable.strings') \
+           .write_binary(text.encode('utf_16'))
+    src.join('fr.lproj', 'Broken.strings').write_binary(b'"A" = ')
+    dst = tmpdir.join('dst')
+
+    result = convert_tree(str(src), str(dst), 'json', workers=1)
+    path = str(dst.join('en.lproj', 'Localizable.json'))
+    assert result[path] == 4 and len(result) == 2
+    assert list(result.errors) == [str(src.join('fr.lproj',
+                                                'Broken.strings'))]
+    assert same(read_entries(path, 'json'), entries())
+
+    assert convert(path, str(tmpdir.join('en.xliff'))) == 4
+    assert same(read_entries(str(tmpdir.join('en.xliff')), 'xliff'),
+                entries())
+
+def test_cli(tmpdir, capsys):
+    """Test the convert command."""
+    src = tmpdir.join('Localizable.strings')
+    src.write_binary(text.encode('utf_8'))
+    assert main(['convert', str(src), str(tmpdir.join('out.json'))]) == 0
+    assert main(['convert', '--to', 'xliff', '--target-language', 'fr',
+                 str(src), str(tmpdir)]) == 0
+    assert same(read_entries(str(tmpdir.join('Localizable.xliff')), 'xliff'),
+                entries())
+    assert main(['convert', str(tmpdir.join('out.json')),
+                 str(tmpdir.join('back.strings')), '--encoding', 'utf_8']) == 0
+    assert StringTable.read(str(tmpdir.join('back.strings'))) \
+        == StringTable.read(text.encode('utf_8'))
+    assert 'Converted 4 entries' in capsys.readouterr().out
+
+    assert main(['convert', str(tmpdir), str(tmpdir.join('json'))]) == 2
+    assert main(['convert', '--to', 'json', str(tmpdir),
+                 str(tmpdir.join('json'))]) == 0
+    assert tmpdir.join('json', 'back.json').check()
+
+def test_convert_tree_without_futures(tmpdir, monkeypatch):
+    """Test that trees convert one file at a time without concurrent.futures."""
+    monkeypatch.setattr(nslocalized.convert, '_MIN_PARALLEL_FILES', 0)
+    monkeypatch.setitem(sys.modules, 'concurrent.futures', None)
+    src = tmpdir.join('src')
+    for locale in ['en', 'fr']:
+        src.ensure_dir(locale + '.lproj').join('Localizable.strings') \
+           .write_binary(text.encode('utf_16'))
+    result = convert_tree(str(src), str(tmpdir.join('dst')), 'json',
+                          workers=2)
+    assert sorted(result.values()) == [4, 4]
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import io
+import timeit
+import pytest
+from nslocalized import *
+
+samples = [
+    '''\
+/* Test string */
+"åéîøü" = "ÅÉÎØÜ";
+''',
+    '''\
+/* C escapes */
+"\\a\\b\\f\\n\\r\\t\\v" = "abfnrtv";
+"\\101" = "\\x42 \\u2030 \\U0001f600 \\u12 \\q";
+"This is \\"quoted\\" text." = "This \\\\ is a backslash.";
+''',
+    '''\
+/* This is a C-style comment which goes over
+
+   multiple lines */
+"A" = "A";
+
+/* A comment
+"NotAKey" = "NotAValue";
+*/
+"C" = "C";
+
+// This C++-style comment goes over
+// multiple lines
+"E" = "E";"F"="F"; /* Same line */ G = "G";
+CFBundleDisplayName = "My Cool App";
+''',
+    '''\
+/* First */
+/* Second, which is ignored */
+"A" = "A";
+// Ignored
+"B" =
+   junk "C"
+"D";
+"A" = "B"; // Merged comment
+''',
+    '''\
+// Line comments
+//   are joined
+"A" = "A"; // Trailing
+/* Block */ // Ignored
+// Also ignored
+"B" = "B";
+// Replaced
+/* By this */
+"C" = "C"; // "D" = "D";
+''',
+    '''\
+"Multi
+line" = "Multi\\
+line\r\nstring\u2028here";
+''',
+]
+
+@pytest.mark.parametrize('text', samples)
+@pytest.mark.parametrize('process_escapes', [True, False])
+def test_engines_agree(text, process_escapes):
+    """Test that the regex engine produces the same results as the state
+    machine."""
+    data = text.encode('utf_8')
+    tables = [StringTable.read(io.BytesIO(data), engine=engine,
+                               process_escapes=process_escapes)
+              for engine in ENGINES]
+    for st in tables[1:]:
+        assert st == tables[0]
+        for k in st.strings:
+            assert st.lookup(k).comment == tables[0].lookup(k).comment
+
+@pytest.mark.parametrize('text,message', [
+    ('"A" "B";', 'Missing equals'),
+    ('"A" = "B"\n;', 'Missing semicolon'),
+    ('"A" = "B"; @', 'Unexpected garbage in input'),
+    ('"A" = "B', 'Bad strings file'),
+    ('/* Trailing comment */', 'Bad strings file'),
+    ('"\\ud800" = "A";', 'Bad Unicode escape'),
+])
+def test_engine_errors(text, message):
+    """Test that both engines reject the same bad input."""
+    for engine in ENGINES:
+        with pytest.raises(ValueError) as excinfo:
+            StringTable.read(io.BytesIO(text.encode('utf_8')), engine=engine)
+        assert str(excinfo.value) == message
+
+def test_long_line_comment_runs():
+    """Test that long runs of // comments don't make the regex engine slow."""
+    start = timeit.default_timer()
+    text = '"a" = "b";\n' + '// "x" = "y";\n' * 8000
+    tables = [StringTable.read(text.encode('utf_8'), engine=engine)
+              for engine in ENGINES]
+    assert tables[0] == tables[1]
+    assert list(tables[0].strings) == ['a']
+
+    text = '// c\n' * 4000 + '/* x */ "a" "b";'
+    for engine in ENGINES:
+        with pytest.raises(ValueError) as excinfo:
+            StringTable.read(text.encode('utf_8'), engine=engine)
+        assert str(excinfo.value) == 'Missing equals'
+
+    # This used to take over a minute
+    assert timeit.default_timer() - start < 5
+
+def test_multiline_strings():
+    """Test that line breaks inside strings are preserved as-is."""
+    text = '"A\nB" = "C\\\nD";\n'
+    for engine in ENGINES:
+        st = StringTable.read(io.BytesIO(text.encode('utf_8')), engine=engine)
+        assert st['A\nB'] == 'C\nD'
+
+def test_unknown_engine():
+    """Test that asking for a non-existent engine fails."""
+    with pytest.raises(ValueError):
+        StringTable.read(io.BytesIO(b''), engine='magic')
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import pytest
+from nslocalized import *
+
+@pytest.mark.parametrize('s,signature', [
+    ('No formats', ()),
+    ('100%% sure', ()),
+    ('%d items', ((1, 'd'),)),
+    ('%i or %x', ((1, 'd'), (2, 'd'))),
+    ('%1$@ and %2$ld', ((1, '@'), (2, 'ld'))),
+    ('%2$ld and %1$@', ((1, '@'), (2, 'ld'))),
+    ('%1$@ then %1$@', ((1, '@'),)),
+    ('%-*.*f', ((1, 'd'), (2, 'd'), (3, 'f'))),
+    ('%2$*1$d', ((1, 'd'), (2, 'd'))),
+    ('%s %S %C %p %lld %zu %.2e', ((1, 's'), (2, 'S'), (3, 'C'), (4, 'p'),
+                                   (5, 'lld'), (6, 'zd'), (7, 'f'))),
+])
+def test_format_signature(s, signature):
+    """Test extracting format specifiers."""
+    assert format_signature(s) == signature
+
+def test_check_format_consistency():
+    """Test finding targets whose format specifiers don't match."""
+    st = StringTable()
+    st['%d files'] = '%d fichiers'
+    st['%1$@ of %2$@'] = '%2$@ de %1$@'
+    st['%@ deleted'] = '%@ supprimé'
+    st['%d%%'] = '%d %%'
+    st['Plain'] = 'Simple'
+    st['%ld bytes'] = '%d octets'
+    st['%@ and %@'] = '%@'
+    assert st.check_format_consistency() == [
+        ('%@ and %@', ((1, '@'), (2, '@')), ((1, '@'),)),
+        ('%ld bytes', ((1, 'ld'),), ((1, 'd'),)),
+    ]
+
+    # Changing the target invalidates the cached signature
+    ls = st.lookup('%@ deleted')
+    assert ls.format_signatures() == (((1, '@'),), ((1, '@'),))
+    ls.target = 'supprimé'
+    assert ls.format_signatures() == (((1, '@'),), ())
+    st['%ld bytes'] = '%ld octets'
+    mismatches = st.check_format_consistency()
+    assert [m.source for m in mismatches] == ['%@ and %@', '%@ deleted']
+
+def test_format_signature_cache(monkeypatch):
+    """Test that signatures are cached by string, not in the entries."""
+    import nslocalized.formats
+    monkeypatch.setattr(nslocalized.formats, '_signatures', {})
+    monkeypatch.setattr(nslocalized.formats, '_MAX_SIGNATURES', 3)
+    assert not hasattr(LocalizedString('a', 'b'), '__dict__')
+
+    ls = LocalizedString('%d files', '%d fichiers')
+    assert ls.format_signatures() == (((1, 'd'),), ((1, 'd'),))
+    assert sorted(nslocalized.formats._signatures) == ['%d fichiers',
+                                                       '%d files']
+    assert LocalizedString('Plain', 'Simple').format_signatures() == ((), ())
+    assert len(nslocalized.formats._signatures) == 2
+
+    # The cache is emptied when it's full
+    for n in range(5):
+        assert LocalizedString('%%@ %d' % n, '').format_signatures()[0] \
+            == ((1, '@'),)
+    assert len(nslocalized.formats._signatures) <= 3
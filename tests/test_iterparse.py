@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import io
+import pytest
+import nslocalized.store
+from nslocalized import *
+
+text = '''\
+/* First */
+"A" = "Alpha";
+
+// Second
+"B\\nB" = "Beta";
+  Gamma = "Gamma";
+"Multi
+line" = "Delta"; "E" = "Epsilon";
+"A" = "Again";
+'''
+
+expected = [
+    ('A', 'Alpha', 'First', 2, 12),
+    ('B\nB', 'Beta', 'Second', 5, 38),
+    ('Gamma', 'Gamma', None, 6, 57),
+    ('Multi\nline', 'Delta', None, 7, 74),
+    ('E', 'Epsilon', None, 8, 98),
+    ('A', 'Again', None, 9, 115),
+]
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_iterparse(engine):
+    """Test that iterparse yields every entry in file order."""
+    data = text.encode('utf_8')
+    items = [(ls.source, ls.target, ls.comment)
+             for ls in iterparse(io.BytesIO(data), engine=engine)]
+    assert items == [e[:3] for e in expected]
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('encoding', ['utf_8', 'utf_16_be', 'utf_16_le'])
+def test_iterparse_positions(engine, encoding):
+    """Test that iterparse reports where each entry's key starts."""
+    data = ('\ufeff' + text).encode(encoding)
+    for source in [io.BytesIO(data), data]:
+        items = [(ls.source, ls.target, ls.comment, line, offset)
+                 for ls, line, offset in iterparse(source, engine=engine,
+                                                   positions=True)]
+        assert items == expected
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_iterparse_small_blocks(engine, monkeypatch):
+    """Test that parsing works when tokens span block boundaries."""
+    monkeypatch.setattr(nslocalized.store, '_CHUNK_SIZE', 3)
+    monkeypatch.setattr(nslocalized.store, '_LOOKAHEAD', 2)
+    data = text.encode('utf_8')
+    items = [(ls.source, ls.target, ls.comment, line, offset)
+             for ls, line, offset in iterparse(io.BytesIO(data), engine=engine,
+                                               positions=True)]
+    assert items == expected
+
+def test_iterparse_is_lazy():
+    """Test that entries are yielded before a later error is found."""
+    data = '"A" = "A";\n"B" = "B"\n@'.encode('utf_8')
+    items = iterparse(io.BytesIO(data))
+    assert next(items).source == 'A'
+    with pytest.raises(ValueError):
+        next(items)
+
+def test_read_merges_duplicates():
+    """Test that StringTable.read() still merges repeated keys."""
+    st = StringTable.read(text.encode('utf_8'))
+    assert st['A'] == 'Again'
+    assert st.lookup('A').comment == 'First'
+    assert len(st.strings) == 5
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import io
+import pytest
+from nslocalized import *
+
+text = '''\
+/* First */
+"A" = "Alpha";
+"B" = "Beta";
+// Second
+Gamma = "Gamma";
+"A" = "Again";
+'''
+
+def entries(st):
+    return sorted((k, ls.target, ls.comment) for k, ls in st.strings.items())
+
+def check_edit(st, start, end, replacement):
+    new_text = st.layout.text[:start] + replacement + st.layout.text[end:]
+    changed = st.apply_edit(start, end, replacement)
+    expected = StringTable.read(io.BytesIO(new_text.encode('utf_8')))
+    assert entries(st) == entries(expected)
+    assert st.layout.text == new_text
+    return changed
+
+def test_apply_edit():
+    """Test that edits only re-parse the entries they touch."""
+    st = StringTable.read(text.encode('utf_16'), keep_layout=True)
+    pos = text.index('Beta')
+    assert check_edit(st, pos, pos + 4, 'Bravo') == set(['B'])
+    assert st['B'] == 'Bravo'
+
+    # Add an entry between two others
+    pos = st.layout.text.index('// Second')
+    changed = check_edit(st, pos, pos, '"C" = "Charlie";\n')
+    assert changed == set(['C', 'Gamma'])
+
+    # Remove one of the two entries for A
+    pos = st.layout.text.index('"A" = "Again"')
+    assert check_edit(st, pos, pos + 15, '') == set(['A'])
+    assert st['A'] == 'Alpha'
+    assert st.lookup('A').comment == 'First'
+
+    # Edit the comment on the remaining one
+    pos = st.layout.text.index('First')
+    check_edit(st, pos, pos + 5, 'Changed')
+    assert st.lookup('A').comment == 'Changed'
+
+    # Rename a key
+    pos = st.layout.text.index('Gamma =')
+    assert check_edit(st, pos, pos + 5, 'Delta') == set(['Gamma', 'Delta'])
+    assert st.lookup('Gamma') is None
+
+    # Add an entry at the end
+    check_edit(st, len(st.layout.text), len(st.layout.text), '"E" = "E";')
+    assert st['E'] == 'E'
+
+def test_apply_edit_errors():
+    """Test that a bad edit leaves the table alone."""
+    st = StringTable.read(text.encode('utf_8'), keep_layout=True)
+    before = entries(st)
+    pos = text.index('"Beta";')
+    with pytest.raises(ValueError):
+        st.apply_edit(pos, pos + 7, '"Beta"')
+    assert entries(st) == before
+    assert st.layout.text == text
+    with pytest.raises(ValueError):
+        st.apply_edit(5, 2, '')
+    with pytest.raises(ValueError):
+        StringTable().apply_edit(0, 0, '')
+
+def test_apply_edit_blocks(monkeypatch):
+    """Test edits that touch and merge several blocks of entries."""
+    import nslocalized.layout
+    monkeypatch.setattr(nslocalized.layout, '_BLOCK_SIZE', 4)
+    monkeypatch.setattr(nslocalized.layout, '_EDIT_CHUNK', 16)
+    big = ''.join('/* %d */\n"K%d" = "V%d";\n' % (n, n % 30, n)
+                  for n in range(100))
+    st = StringTable.read(io.BytesIO(big.encode('utf_8')), keep_layout=True)
+    assert len(st.layout.blocks) == 25
+
+    pos = st.layout.text.index('V87')
+    check_edit(st, pos, pos + 3, 'Changed')
+    assert st['K27'] == 'Changed'
+
+    # Delete entries across several blocks, then put some back
+    start = st.layout.text.index('/* 10 */')
+    end = st.layout.text.index('/* 90 */')
+    check_edit(st, start, end, '')
+    assert len(st.layout) == 20
+    check_edit(st, start, start, big[big.index('/* 40 */'):
+                                     big.index('/* 50 */')])
+    assert len(st.layout) == 30
+    for n in range(len(st.layout)):
+        span = st.layout.span(n)
+        assert st.layout.parse(n).source \
+            == st.layout.text[span[0]:span[1]].split('"')[1]
+
+    # Comment out an entry, so that the next one parses differently too,
+    # then put it back
+    pos = st.layout.text.index('"K15"')
+    assert check_edit(st, pos, pos, '/* ') == set(['K15', 'K16'])
+    assert check_edit(st, pos, pos + 3, '') == set(['K15', 'K16'])
+    with pytest.raises(ValueError):
+        st.apply_edit(pos, pos, '"')
+    assert st.layout.text == big[:start] + big[big.index('/* 40 */'):
+                                               big.index('/* 50 */')] \
+        + big[big.index('/* 90 */'):]
+
+def test_reread(tmpdir):
+    """Test that rereading a file updates the table."""
+    path = tmpdir.join('Localizable.strings')
+    path.write_binary(text.encode('utf_16'))
+    st = StringTable.read(str(path), keep_layout=True)
+    new_text = text.replace('Beta', 'Bravo').replace('// Second\n', '')
+    path.write_binary(new_text.encode('utf_16'))
+    assert st.reread(str(path)) == set(['B', 'Gamma'])
+    assert entries(st) == entries(StringTable.read(str(path)))
+    assert st.reread(str(path)) == set()
+
+def test_reread_explicit_encoding(tmpdir):
+    """Test that rereading uses the encoding given to read()."""
+    path = tmpdir.join('Localizable.strings')
+    path.write_binary(text.replace('Beta', 'Bêta').encode('mac_roman'))
+    st = StringTable.read(str(path), keep_layout=True, encoding='mac_roman')
+    new_text = text.replace('Beta', 'Bëta')
+    path.write_binary(new_text.encode('mac_roman'))
+    assert st.reread(str(path)) == set(['B'])
+    assert st['B'] == 'Bëta'
+    assert st.layout.encoding == 'mac_roman'
+
+def test_keep_layout_needs_empty_table():
+    """Test that keep_layout can't be used when merging tables."""
+    st = StringTable()
+    st['A'] = 'A'
+    with pytest.raises(ValueError):
+        st.read(text.encode('utf_8'), keep_layout=True)
+
+def test_write_changes(tmpdir):
+    """Test that only changed entries are rewritten."""
+    path = tmpdir.join('Localizable.strings')
+    path.write_binary(text.encode('utf_16'))
+    st = StringTable.read(str(path), keep_layout=True)
+
+    assert st.write_changes(str(path)) == set()
+    assert path.read_binary() == text.encode('utf_16')
+
+    st['Gamma'] = 'Changed'
+    st.lookup('B').comment = 'New comment'
+    st['C'] = 'Charlie'
+    assert st.write_changes(str(path)) == set(['Gamma', 'B', 'C'])
+    expected = text.replace('"B" = "Beta";',
+                            '/* New comment */\n"B" = "Beta";') \
+                   .replace('Gamma = "Gamma"', 'Gamma = "Changed"') \
+                   + '\n"C" = "Charlie";\n'
+    assert path.read_binary().decode('utf_16') == expected
+
+    # Duplicates are collapsed into one entry when they change
+    st['A'] = 'Alpha'
+    del st.strings['Gamma']
+    assert st.write_changes(str(path)) == set(['A', 'Gamma'])
+    written = path.read_binary().decode('utf_16')
+    assert written.count('"A"') == 1
+    assert 'Gamma' not in written
+    assert entries(StringTable.read(str(path))) == entries(st)
+
+def test_write_changes_file_object():
+    """Test writing the changes to a file object in the original
+    encoding."""
+    st = StringTable.read(('\ufeff' + text).encode('utf_16_be'),
+                          keep_layout=True)
+    st['B'] = 'Bravo "quoted"'
+    f = io.BytesIO()
+    st.write_changes(f)
+    expected = '\ufeff' + text.replace('"Beta"', '"Bravo \\"quoted\\""')
+    assert f.getvalue() == expected.encode('utf_16_be')
+
+def test_write_changes_trailing_comment():
+    """Test that new entries go before a comment at the end of the
+    file."""
+    for before, after in [('"A" = "a";\n// Trailing\n',
+                           '"A" = "a";\n\n"B" = "b";\n// Trailing\n'),
+                          ('// Trailing', '"B" = "b";\n// Trailing')]:
+        st = StringTable.read(io.BytesIO(before.encode('utf_8')),
+                              keep_layout=True)
+        st['B'] = 'b'
+        f = io.BytesIO()
+        st.write_changes(f)
+        assert f.getvalue().decode('utf_8') == after
+        assert st.layout.text == after
+        assert st.layout.tail == after[after.index('"b";') + 4:]
+        f.seek(0)
+        assert entries(StringTable.read(f)) == entries(st)
+
+def test_write_changes_other_file(tmpdir, monkeypatch):
+    """Test that only the file the table was read from is partly
+    rewritten, and only if it hasn't changed."""
+    import nslocalized.layout
+    modes = []
+    real_open = io.open
+    def recording_open(name, mode='r', *args, **kwargs):
+        if mode != 'rb':
+            modes.append(mode)
+        return real_open(name, mode, *args, **kwargs)
+    monkeypatch.setattr(nslocalized.layout.io, 'open', recording_open)
+
+    path = tmpdir.join('Localizable.strings')
+    other = tmpdir.join('Other.strings')
+    path.write_binary(b'"A"="one";"B"="two";')
+    other.write_binary(b'"X"="aaa";"Y"="bbb";')
+    st = StringTable.read(str(path), keep_layout=True)
+
+    # Nothing has changed, but the other file must still be written
+    st.write_changes(str(other))
+    assert modes == ['wb']
+    assert other.read_binary() == b'"A"="one";"B"="two";'
+
+    st['B'] = 'TWO'
+    st.write_changes(str(other))
+    assert modes == ['wb', 'r+b']
+    assert entries(StringTable.read(str(other))) == entries(st)
+
+    # Once the file has been changed behind our back, it's rewritten
+    other.write_binary(b'"X"="aaa";"Y"="bbb";\n')
+    st['A'] = 'ONE'
+    st.write_changes(str(other))
+    assert modes == ['wb', 'r+b', 'wb']
+    assert entries(StringTable.read(str(other))) == entries(st)
+    assert path.read_binary() == b'"A"="one";"B"="two";'
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import io
+import pytest
+from nslocalized import *
+
+text = '''\
+/* First */
+"A" = "Alpha";
+"B\\tB" = "Beta \\"quoted\\"";
+/* Ignored */ // Second
+Gamma = "Gamma";
+"Multi
+line" = "Delta"; "E" = "Epsilon"; // Trailing
+"A" = "Again";
+'''
+
+@pytest.mark.parametrize('process_escapes', [True, False])
+def test_lazy_table(process_escapes):
+    """Test that a lazy table holds the same entries as a normal one."""
+    data = text.encode('utf_16')
+    expected = StringTable.read(data, process_escapes=process_escapes)
+    st = LazyStringTable.read(data, process_escapes=process_escapes)
+    assert isinstance(st, LazyStringTable)
+    assert len(st.strings) == len(expected.strings)
+    assert st == expected
+    for k in expected.strings:
+        assert st.lookup(k).comment == expected.lookup(k).comment
+    assert st.lookup('Z') is None
+
+def test_lazy_table_cache():
+    """Test that a bounded cache doesn't lose stored changes."""
+    st = LazyStringTable(cache_size=1).read(text.encode('utf_8'))
+    assert st['Gamma'] == 'Gamma'
+    assert st.lookup('A').comment == 'First\nTrailing'
+    st.store(LocalizedString('A', 'Changed', 'More'))
+    st['E'] = 'Changed too'
+    st['F'] = 'New'
+    for k in ['Gamma', 'B\tB', 'Multi\nline']:
+        assert st.lookup(k) is not None
+    assert st['A'] == 'Changed'
+    assert st.lookup('A').comment == 'First\nTrailing\nMore'
+    assert st['E'] == 'Changed too'
+    assert st['F'] == 'New'
+    assert len(st.strings) == 6
+
+def test_lazy_table_merges():
+    """Test that reading into a table that isn't empty merges as usual."""
+    st = LazyStringTable()
+    st.store(LocalizedString('A', 'Old', 'Zeroth'))
+    st.read(text.encode('utf_8'))
+    assert st['A'] == 'Again'
+    assert st.lookup('A').comment == 'Zeroth\nFirst\nTrailing'
+
+@pytest.mark.parametrize('encoding', ['utf_8', 'utf_16_le', 'utf_16',
+                                      'mac_roman'])
+def test_lazy_table_encodings(tmpdir, encoding):
+    """Test that entries are found in files whose characters aren't all
+    the same size."""
+    accented = text.replace('Alpha', 'Álpha').replace('Beta', 'Bêta')
+    texts = [text, accented]
+    if encoding != 'mac_roman':
+        texts.append(accented.replace('Again', 'Again \U0001f600'))
+    for t in texts:
+        data = t.encode(encoding)
+        path = tmpdir.join('Localizable.strings')
+        path.write_binary(data)
+        expected = StringTable.read(io.BytesIO(data), encoding=encoding)
+        buf = bytearray(data)
+        tables = [LazyStringTable.read(buf, encoding=encoding),
+                  LazyStringTable.read(str(path), encoding=encoding),
+                  LazyStringTable.read(str(path), encoding=encoding,
+                                       use_mmap=True)]
+
+        # The table doesn't depend on the buffer it was read from
+        buf[:] = b'\x00' * len(buf)
+        for st in tables:
+            assert st == expected
+            for k in expected.strings:
+                assert st.lookup(k).comment == expected.lookup(k).comment
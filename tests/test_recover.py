@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import io
+import pytest
+from nslocalized import *
+
+broken = '''/* A */
+"A" = "a";
+"B" = "b"
+"C" = "c";
+"D" "d";
+"E" = "\\uD800";
+"F" = "f";
+x
+"G" = "g";
+"H" = "h";
+"I" = "unterminated;
+'''
+
+expected = [
+    (4, 1, 'expecting a semicolon', 'Missing semicolon'),
+    (5, 5, 'expecting equals', 'Missing equals'),
+    (6, 1, None, 'Bad Unicode escape'),
+    (9, 1, 'expecting equals', 'Missing equals'),
+    (11, 7, 'in a string', 'Unterminated string'),
+]
+
+@pytest.mark.parametrize('encoding', ['utf-8', 'utf-8-sig', 'utf-16',
+                                      'utf-16-be'])
+def test_diagnostics(encoding):
+    """Test that reading with diagnostics reports every problem."""
+    data = broken.encode(encoding)
+    diagnostics = []
+    st = StringTable.read(data, diagnostics=diagnostics)
+    assert sorted(st.strings) == ['A', 'C', 'F', 'G', 'H']
+    assert st['A'] == 'a'
+    assert st.lookup('A').comment == 'A'
+    assert [(d.line, d.column, d.state, d.message)
+            for d in diagnostics] == expected
+
+    # Offsets are in bytes, and include the BOM
+    lines = broken.split('\n')
+    for d in diagnostics:
+        prefix = '\n'.join(lines[:d.line - 1]
+                           + [lines[d.line - 1][:d.column - 1]])
+        assert d.offset == len(prefix.encode(encoding))
+
+def test_unterminated_comment():
+    """Test that an unterminated comment is reported and skipped."""
+    diagnostics = []
+    st = StringTable.read(b'"A" = "a";\r\n/* oops\r\n"B" = "b";\r\n',
+                          diagnostics=diagnostics)
+    assert sorted(st.strings) == ['A', 'B']
+    assert diagnostics == [Diagnostic(2, 1, 12, 'in a comment',
+                                      'Unterminated comment')]
+
+    diagnostics = []
+    StringTable.read(b'"A" = "a"', diagnostics=diagnostics)
+    assert diagnostics == [Diagnostic(1, 10, 9, 'expecting a semicolon',
+                                      'Unexpected end of file')]
+
+def test_clean_file():
+    """Test that a file without problems reads as it normally does."""
+    data = broken.split('"B"')[0].encode('utf-8') + b'"B" = "b";\n'
+    diagnostics = []
+    st = StringTable.read(data, diagnostics=diagnostics)
+    assert diagnostics == []
+    assert st == StringTable.read(data)
+
+def test_parse_error():
+    """Test that errors without diagnostics say where the problem is."""
+    with pytest.raises(ParseError) as e:
+        StringTable.read(b'"A" = "a";\n"B" "b";\n')
+    assert e.value.offset == 15
+    assert str(e.value) == 'Missing equals'
+
+def test_parse_error_small_blocks(monkeypatch):
+    """Test that errors after whitespace that spans several blocks are
+    reported where they are."""
+    import nslocalized.store
+    import nslocalized.recover
+    monkeypatch.setattr(nslocalized.store, '_CHUNK_SIZE', 3)
+    monkeypatch.setattr(nslocalized.store, '_LOOKAHEAD', 2)
+    monkeypatch.setattr(nslocalized.recover, '_CHUNK_SIZE', 3)
+    data = b'"A" = "a";\n"B"\n\n      "b";\n"C" = "c"\n   \n  "D" = "d";\n'
+
+    with pytest.raises(ParseError) as e:
+        list(iterparse(io.BytesIO(data)))
+    assert e.value.offset == 22
+    assert str(e.value) == 'Missing equals'
+
+    diagnostics = []
+    StringTable.read(io.BytesIO(data), diagnostics=diagnostics)
+    assert [(d.line, d.column, d.offset, d.message)
+            for d in diagnostics] == [(4, 7, 22, 'Missing equals'),
+                                      (7, 3, 43, 'Missing semicolon')]
+
+def test_diagnostics_options():
+    """Test that diagnostics can't be combined with other options."""
+    with pytest.raises(ValueError):
+        StringTable.read(b'"A" = "a";', keep_layout=True, diagnostics=[])
+    with pytest.raises(ValueError):
+        StringTable.read(b'"A" = "a";', stats=ParseStats(), diagnostics=[])
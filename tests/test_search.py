@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import io
+import pytest
+from nslocalized import *
+
+text = '''\
+/* Title of the settings window */
+"Settings.Title" = "Réglages";
+"Settings.Privacy" = "Confidentialité";
+/* Shown when saving fails */
+"Errors.Save" = "Impossible d'enregistrer le document";
+"Errors.Open" = "Impossible d'ouvrir le document";
+"Settings" = "Préférences";
+'''
+
+def scan(st, query, comments=True):
+    query = query.lower()
+    return sorted(k for k, ls in st.strings.items()
+                  if query in ls.target.lower()
+                  or (comments and ls.comment
+                      and query in ls.comment.lower()))
+
+def test_prefix():
+    """Test finding keys by prefix."""
+    st = StringTable.read(text.encode('utf_8'))
+    assert st.keys_with_prefix('Settings.') == ['Settings.Privacy',
+                                                'Settings.Title']
+    assert st.keys_with_prefix('Settings') == ['Settings',
+                                               'Settings.Privacy',
+                                               'Settings.Title']
+    assert st.keys_with_prefix('Z') == []
+    st['Settings.About'] = 'À propos'
+    assert st.keys_with_prefix('Settings.')[0] == 'Settings.About'
+
+def test_search():
+    """Test searching targets and comments."""
+    st = StringTable.read(text.encode('utf_8'))
+    for query in ['document', 'IMPOSSIBLE', 'le doc', 'window', 'ré', 'x',
+                  'enregistrer le', 'nowhere', '']:
+        assert st.search(query) == scan(st, query)
+        assert st.search(query, comments=False) == scan(st, query, False)
+    assert st.search('Impossible', ignore_case=False) == ['Errors.Open',
+                                                         'Errors.Save']
+    assert st.search('impossible', ignore_case=False) == []
+
+def test_search_updates():
+    """Test that the index follows changes to the table."""
+    st = StringTable.read(text.encode('utf_8'))
+    assert st.search('fichier') == []
+    st['Errors.Save'] = "Impossible d'enregistrer le fichier"
+    st.store(LocalizedString('Errors.Open', 'Ouvrir', 'Fichier manquant'))
+    st['New'] = 'Nouveau fichier'
+    assert st.search('fichier') == ['Errors.Open', 'Errors.Save', 'New']
+    assert st.search('document') == []
+
+    # Bulk changes cause the index to be rebuilt
+    st.update_many([('Other', 'Un autre fichier')])
+    assert st.search('fichier') == ['Errors.Open', 'Errors.Save', 'New',
+                                    'Other']
+    st.merge(StringTable.read(text.encode('utf_8')), policy='replace')
+    assert st.search('fichier') == ['New', 'Other']
+    st.strings = {}
+    assert st.search('fichier') == []
+    assert st.keys_with_prefix('') == []
+
+def test_search_direct_changes():
+    """Test that the index copes with keys added or removed directly."""
+    st = StringTable.read(text.encode('utf_8'))
+    assert 'Errors.Open' in st.search('impossible')
+    del st.strings['Errors.Open']
+    assert st.search('impossible') == ['Errors.Save']
+    assert 'Errors.Open' not in st.keys_with_prefix('')
+
+    # Removing one key and adding another leaves the count the same
+    st.search('impossible')
+    del st.strings['Errors.Save']
+    st.strings['Errors.Other'] = LocalizedString('Errors.Other', 'Autre')
+    assert st.search('impossible') == []
+    assert 'Errors.Save' not in st.keys_with_prefix('Errors.')
+
+def test_search_delete_and_add():
+    """Test that deleting one key and adding another updates the index."""
+    st = StringTable.read(io.BytesIO(text.encode('utf_8')))
+    assert 'Errors.Open' in st.search('impossible')
+    del st['Errors.Open']
+    st['Errors.Other'] = 'Autre'
+    assert st.search('impossible') == ['Errors.Save']
+    assert st.search('autre') == ['Errors.Other']
+    assert 'Errors.Open' not in st.keys_with_prefix('Errors.')
+    assert 'Errors.Other' in st.keys_with_prefix('Errors.')
+    with pytest.raises(KeyError):
+        del st['Errors.Open']
+    assert st.search('autre') == ['Errors.Other']
+    assert 'Errors.Other' in st.keys_with_prefix('Errors.')
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import threading
+from nslocalized import *
+
+text = '''\
+/* First */
+"A" = "Alpha";
+"B" = "Beta";
+'''
+
+def test_concurrent_table():
+    """Test lookups and updates on a concurrent table."""
+    st = StringTable.read(text.encode('utf_8'))
+    ct = ConcurrentStringTable(st)
+    assert ct == st
+    assert ct['A'] == 'Alpha'
+    assert 'B' in ct and len(ct) == 2
+    assert ct.lookup('Z') is None
+
+    old = ct.lookup('A')
+    snap = ct.snapshot()
+    version = ct.version
+    ct.update_many([LocalizedString('A', 'Again', 'Second'),
+                    ('C', 'Gamma'), ('C', 'Gamma 2', 'Third')])
+    ct['D'] = 'Delta'
+    assert ct.version == version + 2
+
+    # Published entries are never modified
+    assert old.target == 'Alpha' and old.comment == 'First'
+    assert snap['A'] == 'Alpha' and 'C' not in snap and len(snap) == 2
+
+    expected = StringTable.read(text.encode('utf_8'))
+    expected.update_many([LocalizedString('A', 'Again', 'Second'),
+                          ('C', 'Gamma'), ('C', 'Gamma 2', 'Third')])
+    expected['D'] = 'Delta'
+    assert ct == expected
+    assert ct.lookup('A').comment == 'First\nSecond'
+    assert ct.lookup('C').comment == 'Third'
+
+    ct.remove_many(['A', 'Z'])
+    assert sorted(ct.snapshot()) == ['B', 'C', 'D']
+    table = ct.to_table()
+    table['B'] = 'Changed'
+    assert ct['B'] == 'Beta'
+
+    ct.reload(text.encode('utf_8'))
+    assert ct == st
+
+def test_concurrent_updates():
+    """Test that readers only ever see whole updates."""
+    ct = ConcurrentStringTable()
+    ct.update_many(('K%d' % n, '0') for n in range(100))
+    errors = []
+    done = threading.Event()
+
+    def reader():
+        while not done.is_set():
+            snap = ct.snapshot()
+            if len(set(snap.values())) != 1:
+                errors.append(sorted(set(snap.values())))
+
+    threads = [threading.Thread(target=reader) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    try:
+        for version in range(1, 50):
+            ct.update_many(('K%d' % n, str(version)) for n in range(100))
+    finally:
+        done.set()
+        for thread in threads:
+            thread.join()
+    assert not errors
+    assert ct['K99'] == '49'
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import io
+import pytest
+import six
+from nslocalized import *
+
+text = '''\
+/* First */
+"A" = "Alpha";
+"B\\tB" = "Beta \\"quoted\\"";
+// Shared
+"C" = "åéîøü \\U0001f600";
+// Shared
+"D" = "Alpha";
+"A" = "Again";
+'''
+
+def test_snapshot_roundtrip(tmpdir):
+    """Test that a table survives a trip through a snapshot."""
+    expected = StringTable.read(text.encode('utf_8'))
+    path = str(tmpdir.join('Localizable.snapshot'))
+    expected.dump_snapshot(path)
+
+    for st in [StringTable.load_snapshot(path),
+               StringTable.load_snapshot(path, lazy=True)]:
+        assert st == expected
+        for k in expected.strings:
+            assert st.lookup(k).comment == expected.lookup(k).comment
+
+def test_snapshot_dedups_strings():
+    """Test that repeated strings are only stored once."""
+    st = StringTable()
+    st.store(LocalizedString('A', 'Same', 'Note'))
+    st.store(LocalizedString('B', 'Same', 'Note'))
+    st.store(LocalizedString('Same', 'A'))
+    f = io.BytesIO()
+    st.dump_snapshot(f)
+    data = f.getvalue()
+    assert data.count(b'Same') == 1
+    assert data.count(b'Note') == 1
+    assert StringTable.load_snapshot(data) == st
+
+def test_lazy_snapshot(tmpdir):
+    """Test that a lazily loaded snapshot behaves like a normal table."""
+    path = str(tmpdir.join('Localizable.snapshot'))
+    st = StringTable.read(text.encode('utf_8'))
+    st.include_empty_comments = True
+    st.dump_snapshot(path)
+
+    lazy = StringTable.load_snapshot(path, lazy=True)
+    assert lazy.include_empty_comments
+    assert len(lazy.strings) == 4
+    assert 'C' in lazy.strings
+    assert lazy.lookup('Z') is None
+
+    lazy['A'] = 'Changed'
+    lazy['E'] = 'Epsilon'
+    del lazy.strings['B\tB']
+    assert lazy['A'] == 'Changed'
+    assert lazy.lookup('A').comment == 'First'
+    assert sorted(lazy.strings) == ['A', 'C', 'D', 'E']
+    assert lazy.dumps_bytes('utf_8').startswith(b'/* First */\n"A" = "Changed";')
+
+def test_load_snapshot_merges():
+    """Test that loading into an existing table merges as usual."""
+    f = io.BytesIO()
+    StringTable.read(text.encode('utf_8')).dump_snapshot(f)
+    st = StringTable()
+    st.store(LocalizedString('A', 'Old', 'Zeroth'))
+    st.load_snapshot(f.getvalue())
+    assert st['A'] == 'Again'
+    assert st.lookup('A').comment == 'Zeroth\nFirst'
+
+def test_bad_snapshot():
+    """Test that things that aren't snapshots are rejected."""
+    for data in [b'', b'NSLS', text.encode('utf_8')]:
+        with pytest.raises(ValueError):
+            StringTable.load_snapshot(data)
+
+def test_bad_snapshot_offsets(tmpdir):
+    """Test that strings outside the file are rejected."""
+    import struct
+    f = io.BytesIO()
+    StringTable.read(io.BytesIO(text.encode('utf_8'))).dump_snapshot(f)
+    good = f.getvalue()
+    index_offset, entries_offset = struct.unpack_from(str('<II'), good, 16)
+
+    def patch(offset, value):
+        return good[:offset] + struct.pack(str('<I'), value) \
+            + good[offset + 4:]
+
+    path = tmpdir.join('Bad.snapshot')
+    for data in [patch(index_offset, len(good) - 2),
+                 patch(index_offset + 4, len(good)),
+                 patch(index_offset, 3),
+                 patch(entries_offset + 4, 1000),
+                 patch(entries_offset + 8, 1000)]:
+        path.write_binary(data)
+        for lazy in [False, True]:
+            with pytest.raises(ValueError) as e:
+                StringTable.load_snapshot(str(path), lazy=lazy)
+            assert str(e.value) == 'Bad snapshot file'
+
+def test_close_lazy_tables(tmpdir):
+    """Test that closing a lazily loaded table lets go of the file."""
+    path = str(tmpdir.join('Localizable.snapshot'))
+    StringTable.read(io.BytesIO(text.encode('utf_8'))).dump_snapshot(path)
+    with StringTable.load_snapshot(path, lazy=True) as st:
+        assert st['A'] == 'Again'
+    assert st['A'] == 'Again'
+    with pytest.raises(ValueError):
+        st.lookup('C')
+    st.close()
+
+    strings_path = str(tmpdir.join('Localizable.strings'))
+    with io.open(strings_path, 'wb') as f:
+        f.write(text.encode('utf_8'))
+    with LazyStringTable.read(strings_path, use_mmap=True) as st:
+        assert st['D'] == 'Alpha'
+    assert st['D'] == 'Alpha'
+    if not six.PY2:
+        # Python 2 reads the file instead of mapping it
+        with pytest.raises(ValueError):
+            st.lookup('C')
+
+    # Closing other tables does nothing
+    with StringTable.read(strings_path) as st:
+        pass
+    assert st['C'] == 'åéîøü \U0001f600'
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import io
+import pytest
+from nslocalized import *
+
+text = '''\
+/* First */
+"A" = "Alpha";
+"B\\tB" = "Beta \\"quoted\\"";
+Gamma = "Gamma";
+/* Second */
+"A" = "Again";
+"A" = "Once more";
+'''
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('process_escapes', [True, False])
+def test_read_stats(engine, process_escapes):
+    """Test that reading with stats gives the same table, and counts."""
+    data = text.encode('utf_16')
+    expected = StringTable.read(data, engine=engine,
+                                process_escapes=process_escapes)
+    stats = ParseStats()
+    st = StringTable.read(data, engine=engine,
+                          process_escapes=process_escapes, stats=stats)
+    assert st == expected
+    assert st.lookup('A').comment == 'First\nSecond'
+
+    assert stats.operation == 'read'
+    assert stats.encoding == 'utf_16_le'
+    assert stats.bytes == len(data)
+    assert stats.chars == len(text)
+    assert stats.lines == 7
+    assert stats.entries == 5
+    assert stats.duplicates == 2
+    assert stats.comments_merged == 1
+    assert stats.escapes == 3
+    assert set(stats.times) == set(['read', 'decode', 'parse', 'unescape',
+                                    'store'])
+    assert stats.total_time == sum(stats.times.values())
+    assert stats.as_dict()['entries'] == 5
+
+def test_write_stats(tmpdir):
+    """Test that writing with stats writes the same bytes."""
+    st = StringTable.read(text.encode('utf_8'))
+    calls = []
+    stats = ParseStats(callback=calls.append)
+    path = tmpdir.join('Localizable.strings')
+    st.write(str(path), encoding='utf_16_be', stats=stats)
+    assert path.read_binary() == st.dumps_bytes(encoding='utf_16_be')
+    assert calls == [stats]
+    assert stats.operation == 'write'
+    assert stats.name == str(path)
+    assert stats.bytes == len(path.read_binary())
+    assert stats.entries == 3
+    assert stats.escapes == 3
+    assert set(stats.times) == set(['sort', 'escape', 'format', 'encode',
+                                    'write'])
+
+    f = io.BytesIO()
+    StringTable().write(f, stats=stats)
+    assert f.getvalue() == b''
+    assert stats.entries == 0
+
+def test_stats_errors():
+    """Test that stats can't be combined with a cache or keep_layout."""
+    with pytest.raises(ValueError):
+        StringTable.read(b'', stats=ParseStats(), keep_layout=True)
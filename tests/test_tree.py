@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import sys
+import pytest
+import nslocalized.tree
+from nslocalized import *
+
+def make_tree(tmpdir):
+    for locale, word in [('en', 'Hello'), ('fr', 'Bonjour'), ('de', 'Hallo')]:
+        lproj = tmpdir.join('App', 'Resources', '%s.lproj' % locale)
+        lproj.ensure(dir=True)
+        lproj.join('Localizable.strings').write_binary(
+            ('"Hello" = "%s";\n' % word).encode('utf_16'))
+        lproj.join('InfoPlist.strings').write_binary(
+            'CFBundleName = "%s App";\n'.encode('utf_8') % word.encode('utf_8'))
+    tmpdir.join('App', 'Resources', 'fr.lproj', 'Broken.strings').write('"A" "B";')
+    tmpdir.join('App', 'Resources', 'Other.strings').write('"A" = "B";')
+    tmpdir.join('App', 'Plugin', 'en.lproj').ensure(dir=True)
+    tmpdir.join('App', 'Plugin', 'en.lproj', 'InfoPlist.strings').write('A = "B";')
+
+def test_find_strings_files(tmpdir):
+    """Test that we find .strings files in .lproj directories."""
+    make_tree(tmpdir)
+    found = find_strings_files(str(tmpdir))
+    assert [(locale, table) for locale, table, path in found] == [
+        ('de', 'InfoPlist'), ('de', 'Localizable'),
+        ('en', 'InfoPlist'), ('en', 'InfoPlist'), ('en', 'Localizable'),
+        ('fr', 'Broken'), ('fr', 'InfoPlist'), ('fr', 'Localizable')]
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_load_tree(tmpdir, monkeypatch, workers):
+    """Test that we can load a whole tree, serially or in parallel."""
+    monkeypatch.setattr(nslocalized.tree, '_MIN_PARALLEL_FILES', 0)
+    make_tree(tmpdir)
+    tables = load_tree(str(tmpdir), workers=workers)
+
+    assert sorted(tables.keys()) == [
+        ('de', 'InfoPlist'), ('de', 'Localizable'),
+        ('en', 'InfoPlist'), ('en', 'Localizable'),
+        ('fr', 'InfoPlist'), ('fr', 'Localizable')]
+    assert tables[('fr', 'Localizable')]['Hello'] == 'Bonjour'
+    assert tables[('de', 'InfoPlist')]['CFBundleName'] == 'Hallo App'
+
+    # The broken file is reported, not raised
+    resources = tmpdir.join('App', 'Resources')
+    assert sorted(tables.errors.keys()) == [
+        str(resources.join('fr.lproj', 'Broken.strings'))]
+
+    # The second en InfoPlist table is merged into the first
+    assert tables[('en', 'InfoPlist')]['A'] == 'B'
+    assert tables[('en', 'InfoPlist')]['CFBundleName'] == 'Hello App'
+    assert tables.paths[('en', 'InfoPlist')] == [
+        str(tmpdir.join('App', 'Plugin', 'en.lproj', 'InfoPlist.strings')),
+        str(resources.join('en.lproj', 'InfoPlist.strings'))]
+    assert tables.paths[('fr', 'Localizable')] == [
+        str(resources.join('fr.lproj', 'Localizable.strings'))]
+    broken = str(resources.join('fr.lproj', 'Broken.strings'))
+    assert str(tables.errors[broken]) == 'Missing equals'
+
+def test_load_tree_without_futures(tmpdir, monkeypatch):
+    """Test that trees load one file at a time without concurrent.futures."""
+    monkeypatch.setattr(nslocalized.tree, '_MIN_PARALLEL_FILES', 0)
+    monkeypatch.setitem(sys.modules, 'concurrent.futures', None)
+    make_tree(tmpdir)
+    tables = load_tree(str(tmpdir), workers=2)
+    assert tables[('fr', 'Localizable')]['Hello'] == 'Bonjour'
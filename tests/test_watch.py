@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import os
+import threading
+import pytest
+from nslocalized import *
+
+def write(path, text, mtime):
+    path.write_binary(text.encode('utf_8'))
+    os.utime(str(path), (mtime, mtime))
+
+def test_watched_table(tmpdir):
+    """Test that a watched table follows changes to its files."""
+    a = tmpdir.join('a.strings')
+    b = tmpdir.join('b.strings')
+    write(a, '/* First */\n"A" = "Alpha";\n"B" = "Beta";\n', 1000)
+
+    table = WatchedStringTable([str(a), str(b)])
+    assert table['A'] == 'Alpha' and len(table) == 2
+    calls = []
+    table.subscribe(calls.append)
+    assert table.check() == set()
+
+    # Touching a file without changing it does nothing
+    write(a, '/* First */\n"A" = "Alpha";\n"B" = "Beta";\n', 1001)
+    assert table.check() == set()
+
+    # Later files are merged over earlier ones
+    write(b, '/* Second */\n"A" = "Again";\n"C" = "Gamma";\n', 1000)
+    assert table.check() == set(['A', 'C'])
+    assert table['A'] == 'Again'
+    assert table.lookup('A').comment == 'First\nSecond'
+
+    write(a, '"A" = "Alpha";\n"D" = "Delta";\n', 1002)
+    assert table.check() == set(['A', 'B', 'D'])
+    assert table.lookup('A').comment == 'Second'
+    assert sorted(table.snapshot()) == ['A', 'C', 'D']
+    assert calls == [set(['A', 'C']), set(['A', 'B', 'D'])]
+
+    # A broken file keeps its old entries
+    write(a, '"A" = "Broken', 1003)
+    assert table.check() == set()
+    assert str(a) in table.errors
+    assert table['D'] == 'Delta'
+
+    b.remove()
+    assert table.check() == set(['A', 'C'])
+    assert str(a) in table.errors
+    assert table['D'] == 'Delta' and 'C' not in table
+
+def test_watched_table_thread(tmpdir):
+    """Test polling for changes on a background thread."""
+    path = tmpdir.join('Localizable.strings')
+    write(path, '"A" = "Alpha";\n', 1000)
+    changed = threading.Event()
+    with WatchedStringTable(str(path), interval=0.01) as table:
+        table.subscribe(lambda keys: changed.set())
+        with pytest.raises(ValueError):
+            table.start()
+        write(path, '"A" = "Again";\n', 1001)
+        assert changed.wait(5)
+    assert table['A'] == 'Again'
+    assert table.last_error is None
+
+def test_watched_table_utf16(tmpdir):
+    """Test that a watched table can load UTF-16 files."""
+    a = tmpdir.join('a.strings')
+    a.write_binary('"A" = "Alpha";\n'.encode('utf_16'))
+    table = WatchedStringTable([str(a)])
+    assert table['A'] == 'Alpha'
+    assert table.errors == {}